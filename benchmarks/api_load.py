@@ -0,0 +1,108 @@
+"""
+Load test of the scoring service: many concurrent clients each send single
+credits over keep-alive connections, and the throughput is compared with one
+batch call of run_assignment on the same credits.
+
+    python -m benchmarks.api_load --clients 64 --requests 20000
+
+The service is started in a subprocess, so clients and server do not share
+the interpreter.
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from processing.api import HOST
+from processing.pipeline import run_assignment
+from processing.preprocessing import FEATURES
+
+
+INPUT_PATH = "processing/2025Test.parquet"
+CATALOG_PATH = "data/EmisoraBancoPrecios.csv"
+
+
+async def _request(reader, writer, method: str, path: str, payload=None) -> dict:
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {HOST}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    await reader.readline()
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return json.loads(await reader.readexactly(length))
+
+
+async def _client(port: int, credits: list, latencies: list) -> None:
+    reader, writer = await asyncio.open_connection(HOST, port)
+    for credit in credits:
+        start = time.perf_counter()
+        await _request(reader, writer, "POST", "/score", credit)
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def _wait_ready(port: int, timeout: float = 120) -> None:
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(HOST, port)
+            await _request(reader, writer, "GET", "/health")
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def load_test(credits: list, clients: int, port: int) -> dict:
+    await _wait_ready(port)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(port, credits[i::clients], latencies) for i in range(clients)))
+    seconds = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(HOST, port)
+    stats = await _request(reader, writer, "GET", "/stats")
+    writer.close()
+    return {"seconds": seconds, "credits_per_sec": len(credits) / seconds, "client_latencies": latencies, "server": stats}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the micro-batching scoring service.")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    df = pd.read_parquet(INPUT_PATH, columns=FEATURES + ["idCredito"]).dropna()
+    df = pd.concat([df] * (args.requests // len(df) + 1), ignore_index=True).head(args.requests)
+    credits = df.to_dict("records")
+
+    start = time.perf_counter()
+    run_assignment(df, pd.read_csv(CATALOG_PATH))
+    batch_rate = len(df) / (time.perf_counter() - start)
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "processing.api", "--port", str(args.port), "--max-wait-ms", str(args.max_wait_ms)],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        result = asyncio.run(load_test(credits, args.clients, args.port))
+    finally:
+        server.terminate()
+        server.wait()
+
+    server_stats = result["server"]
+    print(f"{len(credits):,} single-credit requests from {args.clients} clients in {result['seconds']:.2f} s")
+    print(f"  service: {result['credits_per_sec']:,.0f} credits/s, one batch call: {batch_rate:,.0f} credits/s")
+    print(f"  server latency p50 {server_stats['latency_ms']['p50']:.1f} ms, p99 {server_stats['latency_ms']['p99']:.1f} ms")
+    print(f"  batch size p50 {server_stats['batch_size']['p50']:.0f}, mean {server_stats['batch_size']['mean']:.0f}, max {server_stats['batch_size']['max']:.0f}")
@@ -0,0 +1,166 @@
+"""
+Per-stage benchmark of the assignment pipeline on synthetic portfolios.
+
+    python -m benchmarks.run --sizes 10000 100000 1000000
+    python -m benchmarks.run --compare
+
+Each run appends one JSON line to benchmarks/results.jsonl with the wall time
+and the peak traced memory of every stage, for every size. --compare checks
+the last run against the one before it and exits with 1 on a regression.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_catalog, synthetic_credits
+from processing.pipeline import client_probabilities, preprocess
+from processing.preprocessing import load_preprocessing
+from processing.process import best_emisora_index, cost_vectors, eligibility_mask, expected_profits, hit_cost_matrices
+from processing.registry import get_stack
+from processing.scorer import predict_proba
+from processing.store import write_store
+
+
+RESULTS_PATH = "benchmarks/results.jsonl"
+STAGES = ("preprocess", "score", "mask", "hit_costs", "profits", "argmax", "serialize")
+
+
+class StageTimer:
+    """
+    Times consecutive stages and records the peak memory traced in each one.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, func, *args):
+        tracemalloc.start()
+        start = time.perf_counter()
+        output = func(*args)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stages[name] = {"seconds": seconds, "peak_mb": peak / 2 ** 20}
+        return output
+
+
+def benchmark_size(n_rows: int, seed: int = 0) -> dict:
+    """
+    Runs every stage once on a synthetic batch of n_rows credits.
+    """
+    catalog = synthetic_catalog(seed=seed)
+    df = synthetic_credits(n_rows, catalog, seed=seed)
+    artifact = load_preprocessing()
+    stack = get_stack(artifact["feature_names"])
+    timer = StageTimer()
+
+    rows, X = timer.run("preprocess", preprocess, df, artifact)
+    probabilities = timer.run("score", lambda: client_probabilities(stack, predict_proba(stack, X)))
+    del X
+
+    emisora_ids = stack["emisora_ids"]
+    banks = rows["IdBanco_Credito"].to_numpy()
+    payments = rows["montoCobrar"].to_numpy(dtype=float)
+    probabilities = timer.run("mask", lambda: np.where(eligibility_mask(catalog, banks, emisora_ids), probabilities, 0.0))
+
+    def hit_costs():
+        chm, chw, _ = cost_vectors(catalog, emisora_ids)
+        return hit_cost_matrices(probabilities, chm, chw)
+    hit_miss, hit_win = timer.run("hit_costs", hit_costs)
+    profits = timer.run("profits", expected_profits, probabilities, payments, hit_miss, hit_win)
+    best = timer.run("argmax", best_emisora_index, profits)
+
+    result = {
+        "emisora_ids": emisora_ids,
+        "probabilities": probabilities,
+        "costo_hit_miss": hit_miss,
+        "costo_hit_win": hit_win,
+        "profits": profits,
+        "best": best,
+        "best_emisora": np.asarray(emisora_ids, dtype=object)[best],
+    }
+    with tempfile.TemporaryDirectory() as store_dir:
+        timer.run("serialize", write_store, rows, result, catalog, store_dir)
+
+    total = sum(stage["seconds"] for stage in timer.stages.values())
+    return {
+        "rows": n_rows,
+        "stages": timer.stages,
+        "total_seconds": total,
+        "rows_per_sec": n_rows / total,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous: dict, latest: dict, tolerance: float) -> list:
+    """
+    Stages of latest slower than previous by more than tolerance (0.2 = 20%).
+
+    Returns:
+        list: (rows, stage, previous seconds, latest seconds) of each regression.
+    """
+    before = {entry["rows"]: entry for entry in previous["results"]}
+    regressions = []
+    for entry in latest["results"]:
+        if entry["rows"] not in before:
+            continue
+        for stage, stats in entry["stages"].items():
+            old = before[entry["rows"]]["stages"].get(stage)
+            if old and stats["seconds"] > old["seconds"] * (1 + tolerance):
+                regressions.append((entry["rows"], stage, old["seconds"], stats["seconds"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the assignment pipeline stage by stage.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--compare", action="store_true", help="compare the last two runs in --output")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.output) as f:
+            runs = [json.loads(line) for line in f if line.strip()]
+        if len(runs) < 2:
+            sys.exit("Need at least two runs to compare")
+        regressions = compare(runs[-2], runs[-1], args.tolerance)
+        for n_rows, stage, old, new in regressions:
+            print(f"{n_rows:>9,} rows  {stage:<10} {old:.3f} s -> {new:.3f} s")
+        print(f"{len(regressions)} regressions between {runs[-2]['commit']} and {runs[-1]['commit']}")
+        sys.exit(1 if regressions else 0)
+
+    run = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": [],
+    }
+    for n_rows in args.sizes:
+        entry = benchmark_size(n_rows, args.seed)
+        run["results"].append(entry)
+        print(f"{n_rows:,} rows: {entry['total_seconds']:.2f} s ({entry['rows_per_sec']:,.0f} rows/s)")
+        for stage, stats in entry["stages"].items():
+            print(f"    {stage:<10} {stats['seconds']:8.3f} s  {stats['peak_mb']:8.1f} MB")
+
+    with open(args.output, "a") as f:
+        f.write(json.dumps(run) + "\n")
@@ -0,0 +1,79 @@
+"""
+Cold-start benchmark: how long each entry module takes to import in a fresh
+interpreter, which heavy libraries the import drags in, and the wall time of
+the assign command from process start to the written file.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 5 --modules processing.pipeline
+
+Every measurement runs in its own subprocess, so nothing is warm except the
+OS file cache; the best of --repeat runs is reported.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+MODULES = ("processing.process", "processing.pipeline", "processing.jobs", "processing.api", "processing.preprocess_data")
+# Libraries only some commands need; importing a module should not load them
+HEAVY = ("sklearn", "scipy", "joblib", "plotly")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def import_time(module: str, repeat: int = 3) -> dict:
+    """
+    Returns:
+        dict: {'seconds': best import time, 'loaded': heavy libraries the
+            import loaded}
+    """
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+    return min(runs, key=lambda run: run["seconds"])
+
+
+def command_time(args: list, repeat: int = 3) -> float:
+    """
+    Returns:
+        float: Best wall time of the command, process start to exit.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(args, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import and cold-start times.")
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-command", action="store_true", help="only measure the imports")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        run = import_time(module, args.repeat)
+        print(f"import {module:<30} {run['seconds'] * 1000:7.0f} ms  {', '.join(run['loaded']) or '-'}")
+
+    if not args.skip_command:
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "assign.parquet")
+            command = [sys.executable, "-m", "processing.preprocess_data", "--format", "parquet", "--output", output]
+            seconds = command_time(command, args.repeat)
+        print(f"assign command, cold start to written file  {seconds:7.2f} s")
@@ -0,0 +1,129 @@
+"""
+Synthetic credit batches and emisora catalogs with the real column schemas.
+
+    python -m benchmarks.synthetic --rows 100000 --output /tmp/credits.parquet
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+# Column order of processing/2025Test.parquet
+PARQUET_COLUMNS = [
+    "idCredito", "idListaCobro", "consecutivoCobro", "montoCobrar", "montoCobrado",
+    "fechaCobroBanco", "IdBanco_Credito", "idEmisora", "IdBanco_Emisora", "TipoEnvio",
+    "IdRespuestaBanco", "Descripcion", "Status", "idBanco", "fechaEnvioCobro",
+    "transCount", "transSuccess", "transResidual", "pagoAnterior", "ratio_cobrado_cobrar",
+    "residual_cobrar", "Costo", "residualAnterior", "ratioAnterior",
+]
+# Column order of the data/uploads CSVs
+CSV_COLUMNS = ["idListaCobro", "idCredito"] + [c for c in PARQUET_COLUMNS if c not in ("idCredito", "idListaCobro")]
+
+# Banks of the credits and their share in 2025Test.parquet
+CREDIT_BANKS = {2: 0.14, 12: 0.38, 14: 0.23, 21: 0.013, 30: 0.001, 36: 0.001, 44: 0.002, 62: 0.002, 72: 0.23, 127: 0.004, 137: 0.001}
+CATALOG_BANKS = {2: "BANAMEX", 12: "BBVA MEXICO", 14: "SANTANDER", 72: "BANORTE"}
+TIPOS_ENVIO = ["TRADICIONAL", "CUENTA", "TARJETA", "INTERBANCARIO", "EN LINEA", "MATUTINO", "PARCIAL", "REINTENTO"]
+RESPUESTAS = [("00", "Domiciliacion Exitosa"), ("04", "Cuenta Insuficiencia Fondos"), ("26", "Bajo Pago")]
+
+
+def synthetic_catalog(n_emisoras: int = 57, seed: int = 0) -> pd.DataFrame:
+    """
+    Emisora catalog with the columns of EmisoraBancoPrecios.csv. idEmisora
+    runs from 1, so the first 25 line up with the models in modelOut.
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, n_emisoras + 1)
+    banks = rng.choice(list(CATALOG_BANKS), n_emisoras)
+    tipos = rng.choice(TIPOS_ENVIO, n_emisoras)
+    hit_miss = rng.choice([0.0, 1.42, 1.75, 2.37, 2.5, 2.58, 4.5], n_emisoras)
+    # Half of the emisoras charge the same on a hit and a miss
+    hit_win = np.where(rng.random(n_emisoras) < 0.5, hit_miss, hit_miss + rng.choice([0.05, 0.45, 1.91, 4.0, 8.0], n_emisoras))
+    return pd.DataFrame({
+        "idEmisora": ids,
+        "NombreEmisora": [f"{CATALOG_BANKS[b]} {t} {i}" for i, b, t in zip(ids, banks, tipos)],
+        "IdBanco": banks,
+        "Emisora": rng.choice(["NoAplica", "REINTENTO", "623", "496", "7167"], n_emisoras),
+        "TipoEnvio": tipos,
+        "Nombre": [CATALOG_BANKS[b] for b in banks],
+        "Costo_Hit_Miss": hit_miss,
+        "Costo_Hit_Win": hit_win,
+    })
+
+
+def synthetic_credits(n_rows: int, catalog: pd.DataFrame = None, seed: int = 0, layout: str = "parquet") -> pd.DataFrame:
+    """
+    Credit batch with the schema of 2025Test.parquet ('parquet' layout) or of
+    the upload CSVs ('csv' layout).
+
+    Parameters:
+        n_rows (int): Rows to generate.
+        catalog (pd.DataFrame): Emisoras to send through, synthetic_catalog() if None.
+        seed (int): Random seed, the same seed gives the same batch.
+        layout (str): 'parquet' or 'csv'.
+
+    Returns:
+        pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    catalog = catalog if catalog is not None else synthetic_catalog(seed=seed)
+
+    banks = rng.choice(list(CREDIT_BANKS), n_rows, p=np.array(list(CREDIT_BANKS.values())) / sum(CREDIT_BANKS.values()))
+    emisora_rows = catalog.iloc[rng.integers(0, len(catalog), n_rows)]
+    monto_cobrar = np.round(np.exp(rng.normal(6.4, 0.9, n_rows)), 2)
+    success = rng.random(n_rows) < 0.18
+    monto_cobrado = np.where(success, np.round(monto_cobrar * rng.uniform(0.3, 1.0, n_rows), 2), 0.0)
+    trans_count = np.maximum(1, rng.lognormal(3.2, 1.6, n_rows).astype(np.int64))
+    trans_success = np.minimum(trans_count, rng.poisson(3.5, n_rows)).astype(float)
+    has_previous = rng.random(n_rows) < 0.3
+    pago_anterior = np.where(has_previous, np.round(monto_cobrar * rng.uniform(0.1, 1.0, n_rows), 2), 0.0)
+    respuesta = rng.integers(0, len(RESPUESTAS), n_rows)
+    fecha_envio = pd.Timestamp("2025-12-05")
+
+    df = pd.DataFrame({
+        "idCredito": 1 + rng.choice(max(10 * n_rows, 800_000), n_rows, replace=False),
+        "idListaCobro": rng.integers(161_700, 161_800, n_rows),
+        "consecutivoCobro": 44_000_000 + np.arange(n_rows),
+        "montoCobrar": monto_cobrar,
+        "montoCobrado": monto_cobrado,
+        "fechaCobroBanco": np.where(success, "2025-12-05", None),
+        "IdBanco_Credito": banks,
+        "idEmisora": emisora_rows["idEmisora"].to_numpy(),
+        "IdBanco_Emisora": emisora_rows["IdBanco"].to_numpy(),
+        "TipoEnvio": emisora_rows["TipoEnvio"].to_numpy(),
+        "IdRespuestaBanco": np.array([code for code, _ in RESPUESTAS])[respuesta],
+        "Descripcion": np.array([text for _, text in RESPUESTAS])[respuesta],
+        "Status": "reintento",
+        "idBanco": emisora_rows["IdBanco"].to_numpy(),
+        "fechaEnvioCobro": fecha_envio,
+        "transCount": trans_count,
+        "transSuccess": trans_success,
+        "transResidual": trans_count - trans_success,
+        "pagoAnterior": pago_anterior,
+        "ratio_cobrado_cobrar": monto_cobrado / monto_cobrar,
+        "residual_cobrar": monto_cobrar - monto_cobrado,
+        "Costo": emisora_rows["Costo_Hit_Miss"].to_numpy(),
+        "residualAnterior": pago_anterior,
+        "ratioAnterior": np.where(has_previous, pago_anterior / monto_cobrar, 0.0),
+    })
+    if layout == "csv":
+        df["IdRespuestaBanco"] = df["IdRespuestaBanco"].astype(int)
+        df["fechaEnvioCobro"] = df["fechaEnvioCobro"].dt.strftime("%Y-%m-%d")
+        return df[CSV_COLUMNS]
+    if layout != "parquet":
+        raise ValueError(f"layout must be 'parquet' or 'csv', got {layout!r}")
+    return df[PARQUET_COLUMNS]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic credit batch.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True, help="a .parquet or .csv path")
+    args = parser.parse_args()
+
+    if args.output.endswith(".csv"):
+        synthetic_credits(args.rows, seed=args.seed, layout="csv").to_csv(args.output, index=False)
+    else:
+        synthetic_credits(args.rows, seed=args.seed).to_parquet(args.output, index=False)
+    print(f"Wrote {args.rows:,} rows to {args.output}")
@@ -1,6 +1,18 @@
 import streamlit as st
 from PIL import Image
 import base64
+import json
+import os
+import sqlite3
+import urllib.request
+from datetime import datetime
+
+import pandas as pd
+
+from processing.api import HOST, PORT
+from processing.sql_source import CHUNK_SIZE, TABLE, sql_assignment
+
+SQL_OUTPUT_DIR = "optimizer/sql"
 
 st.set_page_config(page_title="Conectar fuentes", layout="wide")
 
@@ -46,8 +58,8 @@ def get_base64_image(image_path):
 # Crear botón HTML con imagen dentro
 def data_card(label, image_path, key):
     button_html = f"""
-        <form action="" method="post">
-            <button class="image-button" name="{key}" type="submit">
+        <form action="" method="get">
+            <button class="image-button" name="clicked" value="{key}" type="submit">
                 <img src="{get_base64_image(image_path)}" alt="{label}" />
                 <span>{label}</span>
             </button>
@@ -58,7 +70,8 @@ def data_card(label, image_path, key):
         st.session_state["selected_data_source"] = label
 
 # Manejar clic usando query params o fallback
-clicked_key = st.query_params.get("clicked", [None])[0]
+# st.query_params.get returns the value itself, not a list
+clicked_key = st.query_params.get("clicked")
 if clicked_key:
     st.session_state["clicked"] = clicked_key
 
@@ -80,3 +93,87 @@ with col4:
 # Acción cuando se selecciona alguna fuente
 if "selected_data_source" in st.session_state:
     st.success(f"Has seleccionado: {st.session_state['selected_data_source']}")
+
+# ------------------ Base de datos SQL ------------------
+if st.session_state.get("selected_data_source") == "Base de datos SQL":
+    st.markdown("### Base de datos SQL")
+    st.markdown("""
+    Lee filas con el formato de ListaCobroDetalle por bloques y asigna cada bloque en cuanto llega,
+    sin cargar toda la consulta en memoria. Las fechas y los bancos se filtran dentro de la consulta;
+    al filtrar por fecha, las filas sin fechaEnvioCobro se omiten salvo que se marque la casilla.
+    """)
+    with st.form("sql_source"):
+        database = st.text_input("Archivo SQLite", "data/cobros.db")
+        table = st.text_input("Tabla", TABLE)
+        col1, col2 = st.columns(2)
+        since = col1.date_input("Desde (fechaEnvioCobro)", value=None)
+        until = col2.date_input("Hasta (fechaEnvioCobro)", value=None)
+        include_undated = st.checkbox("Incluir filas sin fechaEnvioCobro al filtrar por fecha", value=False)
+        banks_text = st.text_input("Bancos (IdBanco_Credito separados por coma, vacío para todos)")
+        chunk_size = st.number_input("Filas por bloque", min_value=1_000, max_value=1_000_000, value=CHUNK_SIZE, step=10_000)
+        submitted = st.form_submit_button("Leer y asignar", use_container_width=True)
+
+    if submitted:
+        if not os.path.exists(database):
+            st.error(f"❌ No existe el archivo {database}")
+            st.stop()
+        try:
+            banks = [int(bank) for bank in banks_text.replace(" ", "").split(",") if bank] or None
+        except ValueError:
+            st.error("❌ Los bancos deben ser números separados por coma.")
+            st.stop()
+
+        os.makedirs(SQL_OUTPUT_DIR, exist_ok=True)
+        output_path = os.path.join(SQL_OUTPUT_DIR, f"{datetime.now():%Y%m%d_%H%M%S}.parquet")
+        connection = sqlite3.connect(database)
+        try:
+            with st.spinner("Leyendo y asignando por bloques..."):
+                stats = sql_assignment(
+                    connection,
+                    output_path,
+                    since.isoformat() if since else None,
+                    until.isoformat() if until else None,
+                    banks,
+                    int(chunk_size),
+                    detail=False,
+                    table=table,
+                    include_undated=include_undated,
+                )
+        except (ValueError, sqlite3.Error) as e:
+            st.error(f"❌ No se pudo leer la tabla: {e}")
+            st.stop()
+        finally:
+            connection.close()
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Filas leídas", f"{stats['rows_in']:,}")
+        col2.metric("Bloques", f"{stats['chunks']:,}")
+        col3.metric("Lectura", f"{stats['fetch_rows_per_sec']:,.0f} filas/s")
+        col4.metric("Total", f"{stats['rows_per_sec']:,.0f} filas/s")
+        # Without rows the sink never creates the file
+        if stats["rows_out"] == 0:
+            st.info("Ninguna fila coincide con los filtros o tiene los datos para asignarse; no se guardó ninguna asignación.")
+        else:
+            st.caption(f"Asignación guardada en {output_path}")
+            st.dataframe(pd.read_parquet(output_path).head(100), hide_index=True)
+
+# ------------------ API REST ------------------
+if st.session_state.get("selected_data_source") == "API REST":
+    st.markdown("### API REST de scoring")
+    st.markdown("""
+    Servicio local que mantiene cargados los modelos y el catálogo. Recibe un crédito o una lista
+    (`POST /score`) y responde las probabilidades por emisora y la mejor emisora. Las peticiones
+    concurrentes se agrupan en micro-lotes.
+    """)
+    st.code(f"python -m processing.api --port {PORT}", language="bash")
+    try:
+        with urllib.request.urlopen(f"http://{HOST}:{PORT}/stats", timeout=0.5) as response:
+            stats = json.load(response)
+    except OSError:
+        st.info(f"El servicio no está corriendo en http://{HOST}:{PORT}.")
+    else:
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Peticiones", f"{stats['requests']:,}")
+        col2.metric("Latencia p50", f"{stats['latency_ms']['p50'] or 0:.1f} ms")
+        col3.metric("Latencia p99", f"{stats['latency_ms']['p99'] or 0:.1f} ms")
+        col4.metric("Tamaño medio de lote", f"{stats['batch_size']['mean'] or 0:.0f}")
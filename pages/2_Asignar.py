@@ -1,105 +1,93 @@
+import time
+
 import streamlit as st
 import pandas as pd
-import pickle
-import plotly.express as px
 import numpy as np
-import plotly.graph_objects as go
+
+from processing.process import reprice
+from processing.cube import sketch_quantile
+from processing.history import read_history
+from processing.jobs import latest_run, load_result, read_run_table, read_status, submit
+from processing.schema import HISTORY_DTYPES, compact, read_csv
 
 # ------------------ Loaders ------------------
 @st.cache_data
-def load_data_2025():
-    return pd.read_csv("data/History/ListaCobroDetalle2025.csv")
+def load_data_2025(columns=None):
+    # Only the 2025 partitions of the history are read
+    return compact(read_history(columns=columns, years=[2025]), HISTORY_DTYPES)
 
 @st.cache_data
 def load_cobrables():
-    return pd.read_csv("data/credits.csv")
+    # The unnamed first column is a saved index
+    return read_csv("data/credits.csv", "credits", usecols=["idCredito", "cobrables"])
 
 @st.cache_data
 def load_emisora_cat():
-    return pd.read_csv("data/EmisoraBancoPrecios.csv")
-
-@st.cache_data
-def extract_dfs(clients):
-    records = []
-    hit_costs_records = []
-    probabilities_records = []
-    profits_records = []
-
-    for client_id, data in clients.items():
-        records.append({
-            "client_id": client_id,
-            "bank": data['bank'],
-            "payment": data['payment'],
-            "best_emisora": data['best_emisora']
-        })
-        for emisora, val in data['hit_costs'].items():
-            hit_costs_records.append({
-                "client_id": client_id,
-                "emisora": emisora,
-                **val
-            })
-        for emisora, prob in data['probabilities'].items():
-            probabilities_records.append({
-                "client_id": client_id,
-                "emisora": emisora,
-                "probability": prob
-            })
-        for emisora, profit in data['profits'].items():
-            profits_records.append({
-                "client_id": client_id,
-                "emisora": emisora,
-                "profit": profit
-            })
-
-    base_df = pd.DataFrame(records)
-    hit_costs_df = pd.DataFrame(hit_costs_records)
-    probabilities_df = pd.DataFrame(probabilities_records)
-    profits_df = pd.DataFrame(profits_records)
+    return read_csv("data/EmisoraBancoPrecios.csv", "catalog")
 
-    return base_df, hit_costs_df, probabilities_df, profits_df
+@st.cache_resource(max_entries=2)
+def load_run(run_id):
+    # A finished run never changes, so every session shares one copy of it.
+    # The charts read the (bank, emisora) cube; only the detail table needs rows
+    tables = {name: read_run_table(run_id, name) for name in ("assignments", "cube_cells", "cube_sketches")}
+    return tables, load_result(run_id)
 
 # ------------------ Botón de carga ------------------
-if "data_loaded" not in st.session_state:
-    st.session_state["data_loaded"] = False
-
+# The run goes to the background job runner; a run of the same inputs is reused
 if st.button("Crear Asignación", use_container_width=True):
-    with open("optimizer/clients.pkl", "rb") as f:
-        credits = pickle.load(f)
+    st.session_state["run_id"] = submit()
 
-    base_df, hit_costs_df, probabilities_df, profits_df = extract_dfs(credits)
-    emisora_df = load_emisora_cat()
+@st.fragment(run_every=1)
+def show_progress(run_id):
+    status = read_status(run_id)
+    if status["state"] == "running":
+        st.progress(status["progress"], text=f"Creando asignación: {status['stage']}")
+        return
+    del st.session_state["run_id"]
+    if status["state"] == "failed":
+        st.session_state["run_error"] = status["error"]
+    st.rerun()
 
-    st.session_state["probabilities_df"] = pd.merge(probabilities_df, emisora_df, left_on="emisora", right_on="idEmisora").drop(["emisora"], axis=1)
-    st.session_state["profits_df"] = pd.merge(profits_df, emisora_df, left_on="emisora", right_on="idEmisora").drop(["emisora"], axis=1)
-    st.session_state["base_df"] = pd.merge(base_df, emisora_df, left_on="best_emisora", right_on="idEmisora")
-    st.session_state["hit_costs_df"] = pd.merge(hit_costs_df, emisora_df, left_on="emisora", right_on="idEmisora").drop(["emisora"], axis=1)
-    st.session_state["data_loaded"] = True
+if "run_id" in st.session_state:
+    show_progress(st.session_state["run_id"])
+if "run_error" in st.session_state:
+    st.error("La asignación falló:")
+    st.code(st.session_state.pop("run_error"))
 
+latest = latest_run()
 
-# ------------------ Visualización ------------------
-if st.session_state["data_loaded"]:
-    base_df = st.session_state["base_df"]
-    probabilities_df = st.session_state["probabilities_df"]
-    profits_df = st.session_state["profits_df"]
-    hit_costs_df = st.session_state["hit_costs_df"]
-
-    bank = st.selectbox("Seleccione Banco", ["Todos"] + sorted(base_df["bank"].unique().tolist()))
-    emisora = st.selectbox("Seleccione Emisora", ["Todas"] + sorted(base_df["NombreEmisora"].unique().tolist()))
 
+# ------------------ Visualización ------------------
+if latest is not None:
+    # plotly loads only once there is a run to chart
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    tables, (result, payments) = load_run(latest["run_id"])
+    base_df = tables["assignments"]
+    cube_cells = tables["cube_cells"]
+    cube_sketches = tables["cube_sketches"]
+    st.caption(f"Asignación {latest['run_id']} · terminada {latest['finished'][:19]} · {latest['rows']:,} créditos")
+
+    assigned_cells = cube_cells[(cube_cells["assigned"] > 0) & cube_cells["NombreEmisora"].notna()]
+    bank = st.selectbox("Seleccione Banco", ["Todos"] + sorted(assigned_cells["bank"].unique().tolist()))
+    emisora = st.selectbox("Seleccione Emisora", ["Todas"] + sorted(assigned_cells["NombreEmisora"].unique().tolist()))
+
+    filtered_cells = assigned_cells
     filtered_df = base_df
     if bank != "Todos":
+        filtered_cells = filtered_cells[filtered_cells['bank'] == bank]
         filtered_df = filtered_df[filtered_df['bank'] == bank]
     if emisora != "Todas":
+        filtered_cells = filtered_cells[filtered_cells['NombreEmisora'] == emisora]
         filtered_df = filtered_df[filtered_df['NombreEmisora'] == emisora]
 
-    selected_emisoras = filtered_df['NombreEmisora'].unique()
+    selected_emisoras = filtered_cells['NombreEmisora'].unique()
 
     # --- Gráfica: Mediana de probabilidad por emisora ---
-    filtered_probabilities_df = probabilities_df[probabilities_df['NombreEmisora'].isin(selected_emisoras)]
+    # Sketch median merged over every bank, within 1% of the exact value
     median_probs = (
-        filtered_probabilities_df
-        .groupby('NombreEmisora')['probability']
-        .median()
+        sketch_quantile(cube_sketches[cube_sketches['NombreEmisora'].isin(selected_emisoras)], 'probability', 0.5)
         .reset_index()
         .sort_values(by='probability', ascending=False)
     )
@@ -112,11 +100,11 @@ if st.session_state["data_loaded"]:
     )
 
     # --- Gráfica: Distribución de ganancias esperadas ---
-    filtered_profits_df = profits_df[profits_df['NombreEmisora'].isin(selected_emisoras)]
     sum_profits = (
-        filtered_profits_df
-        .groupby('NombreEmisora')['profit']
+        cube_cells[cube_cells['NombreEmisora'].isin(selected_emisoras)]
+        .groupby('NombreEmisora')['profit_sum']
         .sum()
+        .rename('profit')
         .reset_index()
         .sort_values(by='profit', ascending=False)
     )
@@ -147,34 +135,36 @@ if st.session_state["data_loaded"]:
 
     # --- Gráfica: Costo por Hit Exitoso ---
     sum_hit_success = (
-        hit_costs_df
-        .groupby('NombreEmisora')['Costo_Hit_Win_x']
+        cube_cells[cube_cells['hits'] > 0]
+        .groupby('NombreEmisora')['hit_win_sum']
         .sum()
+        .rename('Costo_Hit_Win')
         .reset_index()
-        .sort_values(by='Costo_Hit_Win_x', ascending=False)
+        .sort_values(by='Costo_Hit_Win', ascending=False)
     )
     fig_hit_win = px.bar(
         sum_hit_success,
         x='NombreEmisora',
-        y='Costo_Hit_Win_x',
+        y='Costo_Hit_Win',
         title='Suma de Costo por Hit Exitoso por Emisora',
-        labels={'NombreEmisora': 'Emisora', 'Costo_Hit_Win_x': 'Suma de Costo Hit Éxito'},
+        labels={'NombreEmisora': 'Emisora', 'Costo_Hit_Win': 'Suma de Costo Hit Éxito'},
     )
 
     # --- Gráfica: Costo por Hit Fallido ---
     sum_hit_fail = (
-        hit_costs_df
-        .groupby('NombreEmisora')['Costo_Hit_Miss_x']
+        cube_cells[cube_cells['hits'] > 0]
+        .groupby('NombreEmisora')['hit_miss_sum']
         .sum()
+        .rename('Costo_Hit_Miss')
         .reset_index()
-        .sort_values(by='Costo_Hit_Miss_x', ascending=True)
+        .sort_values(by='Costo_Hit_Miss', ascending=True)
     )
     fig_hit_fail = px.bar(
         sum_hit_fail,
         x='NombreEmisora',
-        y='Costo_Hit_Miss_x',
+        y='Costo_Hit_Miss',
         title='Suma de Costo por Hit Fallido por Emisora',
-        labels={'NombreEmisora': 'Emisora', 'Costo_Hit_Miss_x': 'Suma de Costo Hit Fallido'},
+        labels={'NombreEmisora': 'Emisora', 'Costo_Hit_Miss': 'Suma de Costo Hit Fallido'},
     )
 
     # --- Mostrar en diseño compacto ---
@@ -193,3 +183,42 @@ if st.session_state["data_loaded"]:
     # --- Mostrar tabla ---
     st.subheader("Detalle de Asignación")
     st.dataframe(filtered_df)
+
+    # ------------------ Simulador de costos ------------------
+    st.subheader("Simulador de costos (what-if)")
+    emisora_cat = load_emisora_cat().drop_duplicates("idEmisora").set_index("idEmisora")
+    names = emisora_cat["NombreEmisora"].reindex(result["emisora_ids"])
+
+    em_id = st.selectbox(
+        "Emisora a recotizar",
+        result["emisora_ids"],
+        format_func=lambda em: f"{names[em]} ({em})",
+    )
+    col1, col2 = st.columns(2)
+    with col1:
+        new_miss = st.number_input("Costo_Hit_Miss", value=float(emisora_cat.loc[em_id, "Costo_Hit_Miss"]))
+    with col2:
+        new_win = st.number_input("Costo_Hit_Win", value=float(emisora_cat.loc[em_id, "Costo_Hit_Win"]))
+
+    start = time.perf_counter()
+    scenario = reprice(result, payments, {em_id: (new_miss, new_win)})
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    baseline = float(result["profits"][np.arange(len(payments)), result["best"]].sum())
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Ganancia esperada", f"{scenario['expected_profit']:,.0f}", f"{scenario['expected_profit'] - baseline:,.0f}")
+    col2.metric("Créditos reasignados", f"{int(scenario['reassigned'].sum()):,}")
+    col3.metric("Tiempo de recálculo", f"{elapsed_ms:.0f} ms")
+
+    moved = scenario["reassigned"]
+    if moved.any():
+        flows = (
+            pd.DataFrame({
+                "Antes": names.reindex(result["best_emisora"][moved]).to_numpy(),
+                "Después": names.reindex(scenario["best_emisora"][moved]).to_numpy(),
+            })
+            .value_counts()
+            .rename("Créditos")
+            .reset_index()
+        )
+        st.dataframe(flows, hide_index=True)
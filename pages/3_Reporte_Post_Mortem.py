@@ -1,7 +1,12 @@
 import streamlit as st
 import os
 import pandas as pd
-from datetime import datetime
+
+from processing.feature_state import FeatureState
+from processing.ingest import ingest_upload, read_upload
+from processing.report import load_respuestas, outcome_frame, outcome_ids, post_mortem_report, rollup
+from processing.schema import read_csv
+from processing.validation import ValidationError
 
 st.title("Subida de nuevos datos para predicción")
 
@@ -19,7 +24,8 @@ Esta sección está diseñada para que los operadores carguen nuevos datos cada
 
 ✅ **Requisitos del archivo CSV:**
 
-- Debe contener todas las columnas requeridas (por ejemplo: `credito_id`, `monto`, `fecha`, `emisora_actual`, etc.).
+- Debe contener todas las columnas requeridas (por ejemplo: `idCredito`, `montoCobrar`, `IdBanco_Credito`, `idEmisora`, `transCount`, etc.).
+- Cada valor de cada fila se revisa contra el tipo de su columna; solo `fechaCobroBanco` y `fechaEnvioCobro` pueden venir vacías.
 - No debe tener filas vacías o columnas renombradas.
 - El archivo no debe estar filtrado, ordenado o modificado manualmente.
 
@@ -33,72 +39,47 @@ Esta sección está diseñada para que los operadores carguen nuevos datos cada
 """)
 
 
-REQUIRED_COLUMNS = {
-    "idCredito": str,
-    "montoCobrar": float,
-    "fechaCobroBanco": str,  # podrías parsearla después
-    "idBanco": str
-}
-
-uploaded_file = st.file_uploader("Cargar archivo CSV", type=["csv"])
-
-# Crear la carpeta si no existe
-save_dir = "data/uploads"
-os.makedirs(save_dir, exist_ok=True)
-
-# Ruta al log
-log_path = os.path.join(save_dir, "upload_log.csv")
+@st.cache_data
+def load_respuestas_cat():
+    return load_respuestas()
 
-# Función para registrar eventos
-def log_upload(fecha_envio_cobro, status, message):
-    log_entry = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "fecha_envio_cobroy": fecha_envio_cobro,
-        "status": status,
-        "message": message
-    }
+@st.cache_data
+def load_emisora_cat():
+    return read_csv("data/EmisoraBancoPrecios.csv", "catalog")
 
-    if os.path.exists(log_path):
-        log_df = pd.read_csv(log_path)
-        log_df = pd.concat([log_df, pd.DataFrame([log_entry])], ignore_index=True)
-    else:
-        log_df = pd.DataFrame([log_entry])
-
-    log_df.to_csv(log_path, index=False)
+uploaded_file = st.file_uploader("Cargar archivo CSV", type=["csv"])
 
 if uploaded_file is not None:
     try:
-        df = pd.read_csv(uploaded_file)
-
-        # ✅ Validar columnas
-        missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-        if missing_cols:
-            st.error(f"❌ Faltan columnas requeridas: {', '.join(missing_cols)}")
+        # ✅ Validar columnas y tipos, y guardar una sola vez por contenido
+        try:
+            info = ingest_upload(uploaded_file.getvalue(), uploaded_file.name)
+        except ValidationError as e:
+            if e.report["missing_columns"]:
+                st.error(f"❌ Faltan columnas requeridas: {', '.join(e.report['missing_columns'])}")
+            elif e.report["structure"]:
+                st.error(f"❌ El CSV está mal formado después de la fila {e.report['rows']:,}: {e.report['structure']}")
+            else:
+                st.error(f"❌ {sum(e.report['violations'].values()):,} valores no tienen el tipo esperado en {e.report['rows']:,} filas.")
+                st.dataframe(
+                    pd.Series(e.report["violations"], name="Valores inválidos").rename_axis("Columna").reset_index(),
+                    hide_index=True,
+                )
+                st.markdown("Primeras filas con errores:")
+                st.dataframe(e.report["examples"].rename(columns={"row": "Fila", "column": "Columna", "value": "Valor"}), hide_index=True)
             st.stop()
 
-        # ✅ Validar tipos de datos
-        type_errors = []
-        for col, expected_type in REQUIRED_COLUMNS.items():
-            sample = df[col].dropna().iloc[0] if not df[col].dropna().empty else None
-            if sample is not None and not isinstance(sample, expected_type):
-                try:
-                    df[col] = df[col].astype(expected_type)
-                except Exception:
-                    type_errors.append(f"{col} debe ser tipo {expected_type.__name__}")
-        if type_errors:
-            st.error("❌ Errores en los tipos de datos:\n- " + "\n- ".join(type_errors))
-            st.stop()
-
-        # ✅ Guardar el archivo
-        save_dir = "data/uploads"
-        os.makedirs(save_dir, exist_ok=True)
-        now = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"datos_crudos_{now}.csv"
-        filepath = os.path.join(save_dir, filename)
-        df.to_csv(filepath, index=False)
+        df = read_upload(info["sha256"])
 
         # ✅ Mostrar resumen y mensaje de éxito
-        st.success(f"✅ Archivo validado y guardado exitosamente: `{filename}`")
+        if info["status"] == "duplicate":
+            st.info(f"ℹ️ Este archivo ya se había cargado antes (`{info['sha256'][:12]}`); no se guardó de nuevo.")
+        else:
+            st.success(f"✅ Archivo validado y guardado exitosamente: `{os.path.basename(info['path'])}`")
+            # Solo los archivos nuevos extienden el historial de cada crédito
+            with FeatureState() as feature_state:
+                nuevas = feature_state.update(df)
+                st.caption(f"Historial actualizado: {len(nuevas):,} intentos nuevos, {len(feature_state):,} créditos con historial.")
         st.dataframe(df.head())
                 # 🎯 Mostrar porcentaje de cada emisora
         st.markdown("### 📊 Distribución de emisoras en el archivo")
@@ -119,40 +100,60 @@ if uploaded_file is not None:
         st.info("✅ Datos preparados. Listos para enviarse al modelo.")
         st.markdown("## 📌 Análisis de Transacciones")
 
-        # Agregar columnas auxiliares
-        df["es_exito"] = df["fechaCobroBanco"].notna()
-        df["es_reintento"] = df["transCount"] > 1
-        df["es_fallo"] = df["fechaCobroBanco"].isna()
+        # Resultado de cada envío según CatRespuestaBancos
+        outcomes = outcome_frame(df, load_respuestas_cat())
+        report = post_mortem_report(outcomes)
+        totales = rollup(report).iloc[0]
 
         # IDs
-        ids_reintento = df[df["Status"].str.contains("reintento", case=False)]["consecutivoCobro"]
-        ids_error = df[df["Status"].str.contains("error|cuenta cancelada", case=False)]["consecutivoCobro"]
-        ids_fallido = df[df["Status"].str.contains("rechazado|fondos|fallido", case=False)]["consecutivoCobro"]
-
+        ids_reintento = outcome_ids(outcomes, "reintento")
+        ids_error = outcome_ids(outcomes, "error")
+        ids_fallido = outcome_ids(outcomes, "perdida")
 
         # Exportar archivos
         st.download_button("⬇ Descargar IDs erróneos", data=ids_error.to_csv(index=False), file_name="ids_exito.csv")
         st.download_button("⬇ Descargar IDs fallidos", data=ids_fallido.to_csv(index=False), file_name="ids_fallo.csv")
         st.download_button("⬇ Descargar IDs de reintentos", data=ids_reintento.to_csv(index=False), file_name="ids_reintento.csv")
 
-        # Porcentaje de reintentos exitosos
-        reintentos = df[df["es_reintento"]]
-        reintentos_exitosos = reintentos[reintentos["es_exito"]]
-        pct_exito_reintentos = round(len(reintentos_exitosos) / len(reintentos) * 100, 2) if len(reintentos) > 0 else 0
-
-        # Ganancia y pérdida
-        df["ganancia"] = df.apply(lambda row: row["montoCobrado"] - row["Costo"] if row["es_exito"] else 0, axis=1)
-        df["perdida"] = df.apply(lambda row: -row["Costo"] if not row["es_exito"] else 0, axis=1)
-
-        ganancia_total = df["ganancia"].sum()
-        perdida_total = df["perdida"].sum()
-
         # Métricas en pantalla
-        st.metric("✅ Porcentaje de reintentos exitosos", f"{pct_exito_reintentos}%")
-        st.metric("💸 Costo total", f"${abs(perdida_total):,.2f}")
-        st.metric("💰 Ganancia total", f"${ganancia_total:,.2f}")
-
-
+        st.metric("✅ Porcentaje de reintentos exitosos", f"{round(totales['pct_exito_reintentos'], 2)}%")
+        st.metric("💸 Costo total", f"${abs(totales['perdida']):,.2f}")
+        st.metric("💰 Ganancia total", f"${totales['ganancia']:,.2f}")
+
+        # --- Desglose por emisora y por banco ---
+        columnas = {
+            "envios": "Envíos",
+            "exitos": "Éxitos",
+            "pct_exito_reintentos": "Reintentos exitosos (%)",
+            "ganancia": "Ganancia",
+            "perdida": "Pérdida",
+            "n_reintento": "Reintento",
+            "n_perdida": "Pérdida (cuenta)",
+            "n_error": "Error",
+            "n_sin_clasificar": "Sin clasificar",
+        }
+        nombres = load_emisora_cat().drop_duplicates("idEmisora").set_index("idEmisora")["NombreEmisora"]
+
+        por_emisora = rollup(report, ["idEmisora"])
+        # Plain text, so emisoras missing from the catalog can be filled in below
+        por_emisora.insert(1, "NombreEmisora", por_emisora["idEmisora"].map(nombres).astype(object))
+        st.markdown("### 📊 Resultados por emisora")
+        st.dataframe(por_emisora[["idEmisora", "NombreEmisora"] + list(columnas)].rename(columns=columnas), hide_index=True)
+
+        por_banco = rollup(report, ["IdBanco_Credito"])
+        st.markdown("### 🏦 Resultados por banco del crédito")
+        st.dataframe(por_banco[["IdBanco_Credito"] + list(columnas)].rename(columns=columnas), hide_index=True)
+
+        import plotly.express as px
+
+        fig_resultados = px.bar(
+            por_emisora.assign(NombreEmisora=por_emisora["NombreEmisora"].fillna(por_emisora["idEmisora"].astype(str))),
+            x="NombreEmisora",
+            y=["n_reintento", "n_perdida", "n_error", "n_sin_clasificar"],
+            title="Resultado de los envíos por emisora",
+            labels={"NombreEmisora": "Emisora", "value": "Envíos", "variable": "Resultado"},
+        )
+        st.plotly_chart(fig_resultados, use_container_width=True)
 
     except Exception as e:
         st.error("💥 Error inesperado al procesar el archivo:")
@@ -0,0 +1,115 @@
+import streamlit as st
+import pandas as pd
+
+from processing.telemetry import read_run_log
+
+st.title("Rendimiento del pipeline")
+
+st.markdown("""
+Tiempos y memoria de cada etapa (preprocesado, scoring, máscara, costos, ganancia y asignación) en cada corrida del pipeline.
+Sirve para ver qué etapa se volvió más lenta después de un cambio de modelo o de datos.
+""")
+
+# ------------------ Carga ------------------
+records = read_run_log()
+if not records:
+    st.info("Todavía no hay corridas registradas. Ejecuta el pipeline o crea una asignación.")
+    st.stop()
+
+import plotly.express as px
+
+log_df = pd.DataFrame(records)
+# Runs logged before the RSS of each stage was recorded
+for column in ("rss_mb", "rss_delta_mb"):
+    if column not in log_df.columns:
+        log_df[column] = float("nan")
+
+# Streaming runs log one record per stage and batch
+runs_df = (
+    log_df
+    .groupby(["run_id", "source", "stage"], sort=False)
+    .agg(
+        started=("started", "min"),
+        seconds=("seconds", "sum"),
+        rows_in=("rows_in", "sum"),
+        rows_out=("rows_out", "sum"),
+        allocated_mb=("allocated_mb", "max"),
+        rss_mb=("rss_mb", "max"),
+        # Streaming stages run once per batch: the batch that grew the most
+        rss_delta_mb=("rss_delta_mb", "max"),
+    )
+    .reset_index()
+)
+runs_df["rows_per_sec"] = runs_df["rows_in"] / runs_df["seconds"]
+runs_df["run"] = runs_df["started"].groupby(runs_df["run_id"]).transform("min") + " · " + runs_df["source"]
+
+sources = sorted(runs_df["source"].unique().tolist())
+source = st.selectbox("Origen", ["Todos"] + sources)
+if source != "Todos":
+    runs_df = runs_df[runs_df["source"] == source]
+
+last_runs = runs_df["run_id"].drop_duplicates().tail(st.slider("Corridas a mostrar", 1, 100, 20))
+runs_df = runs_df[runs_df["run_id"].isin(last_runs)]
+
+# --- Gráfica: Tiempo por etapa ---
+fig_seconds = px.bar(
+    runs_df,
+    x="run",
+    y="seconds",
+    color="stage",
+    title="Tiempo por etapa en cada corrida",
+    labels={"run": "Corrida", "seconds": "Segundos", "stage": "Etapa"},
+)
+
+# --- Gráfica: Filas por segundo ---
+fig_throughput = px.line(
+    runs_df,
+    x="run",
+    y="rows_per_sec",
+    color="stage",
+    markers=True,
+    title="Filas por segundo por etapa",
+    labels={"run": "Corrida", "rows_per_sec": "Filas/s", "stage": "Etapa"},
+)
+
+# --- Gráfica: Memoria ---
+fig_memory = px.bar(
+    runs_df.dropna(subset=["rss_delta_mb"]),
+    x="run",
+    y="rss_delta_mb",
+    color="stage",
+    barmode="group",
+    title="Cambio de la memoria residente durante cada etapa (MB)",
+    labels={"run": "Corrida", "rss_delta_mb": "MB", "stage": "Etapa"},
+)
+
+col1, col2 = st.columns(2)
+with col1:
+    st.plotly_chart(fig_seconds, use_container_width=True)
+with col2:
+    st.plotly_chart(fig_throughput, use_container_width=True)
+st.plotly_chart(fig_memory, use_container_width=True)
+
+# --- Detalle de la última corrida vs la anterior ---
+st.subheader("Última corrida vs anterior")
+run_ids = last_runs.tolist()
+latest = runs_df[runs_df["run_id"] == run_ids[-1]].set_index("stage")
+detail = latest[["seconds", "rows_in", "rows_out", "rows_per_sec", "rss_delta_mb", "rss_mb", "allocated_mb"]].copy()
+if len(run_ids) > 1:
+    previous = runs_df[runs_df["run_id"] == run_ids[-2]].set_index("stage")
+    detail["cambio_tiempo_%"] = ((latest["seconds"] / previous["seconds"] - 1) * 100).round(1)
+st.dataframe(detail)
+
+# --- Caché de predicciones ---
+if "cache_hits" in log_df.columns:
+    cache_df = (
+        log_df.dropna(subset=["cache_hits"])
+        .groupby(["run_id", "source"], sort=False)
+        .agg(started=("started", "min"), hits=("cache_hits", "sum"), misses=("cache_misses", "sum"))
+        .reset_index()
+        .tail(len(last_runs))
+    )
+    if len(cache_df):
+        st.subheader("Caché de predicciones")
+        cache_df["hit_rate_%"] = (100 * cache_df["hits"] / (cache_df["hits"] + cache_df["misses"])).round(1)
+        st.dataframe(cache_df[["started", "source", "hits", "misses", "hit_rate_%"]], hide_index=True)
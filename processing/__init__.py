@@ -0,0 +1,8 @@
+"""
+Scoring and assignment of credits to emisoras.
+
+Every module can be imported without side effects: commands run from main()
+or under __name__ == "__main__", and scikit-learn, joblib and scipy are only
+imported by the functions that train, unpickle or optimize. The batch command
+is processing.preprocess_data.main, installed as the assign script.
+"""
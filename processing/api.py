@@ -0,0 +1,364 @@
+"""
+Local HTTP scoring service. The models, the preprocessing artifact and the
+catalog stay loaded, and concurrent requests are grouped into micro-batches
+so single-credit calls get close to the throughput of batch scoring.
+
+    POST /score    one credit {"idCredito": ..., "montoCobrar": ..., ...}, a
+                   list of them or {"credits": [...]}; the credits need the
+                   preprocessing FEATURES
+    GET  /stats    request latency and batch size percentiles
+    GET  /health
+
+A micro-batch is scored once it holds max_batch credits, or max_wait_ms after
+its first request arrived, whichever comes first. Requests that arrive while
+a batch is being scored wait for the next one. The result of a credit does
+not depend on the batch it was scored in (see scorer.MIN_ROWS). If scoring a
+batch fails, its requests are scored again one by one, so only the request
+that caused the error fails.
+
+    python -m processing.api --port 8765 --max-wait-ms 5
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from processing.paths import data_path
+from processing.pipeline import client_probabilities
+from processing.preprocessing import FEATURES, load_preprocessing, transform
+from processing.process import best_emisora_index, cost_vectors, eligibility_mask, expected_profits, hit_cost_matrices
+from processing.registry import get_stack
+from processing.scorer import predict_proba
+
+
+CATALOG_PATH = data_path("EmisoraBancoPrecios.csv")
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_BATCH = 1024
+MAX_WAIT_MS = 5.0
+# Requests and batches kept for the percentiles of /stats
+STATS_WINDOW = 10_000
+MAX_BODY_BYTES = 64 * 2 ** 20
+
+
+# Bank ids are looked up exactly; larger floats are no longer exact integers
+MAX_BANK_ID = 2 ** 53
+
+
+def _number(value) -> float:
+    # JSON numbers only; text, booleans and missing values make the credit
+    # invalid, and so do numbers that overflow a float (1e400 is inf)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return np.nan
+
+
+def _credit_errors(features: np.ndarray) -> list:
+    """
+    Returns:
+        list: Per credit, None if its features can be scored, else the error.
+    """
+    bank = features[:, FEATURES.index("IdBanco_Credito")]
+    finite = np.isfinite(features).all(axis=1)
+    with np.errstate(invalid="ignore"):
+        integral = (np.mod(bank, 1) == 0) & (np.abs(bank) < MAX_BANK_ID)
+    return [
+        None if ok_finite and ok_bank
+        else f"needs finite numeric {', '.join(FEATURES)}" if not ok_finite
+        else "IdBanco_Credito must be an integer"
+        for ok_finite, ok_bank in zip(finite.tolist(), integral.tolist())
+    ]
+
+
+class ScoringService:
+    """
+    Micro-batching scorer with the results of pipeline.run_assignment.
+
+    Usage:
+        service = ScoringService()
+        await service.start()
+        responses = await service.score([credit, ...])
+        service.stats()
+    """
+
+    def __init__(self, catalog_path: str = CATALOG_PATH, max_batch: int = MAX_BATCH, max_wait_ms: float = MAX_WAIT_MS):
+        self.catalog = pd.read_csv(catalog_path)
+        self.artifact = load_preprocessing()
+        # Loads every model and lays out the catalog now, not on the first request
+        self._prepared_for = None
+        self._prepared()
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        # One thread: batches are scored one at a time, off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.latencies = deque(maxlen=STATS_WINDOW)
+        self.batch_sizes = deque(maxlen=STATS_WINDOW)
+        self.requests = self.credits = self.batches = 0
+        self.started = time.time()
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batches())
+
+    async def score(self, credits: list) -> list:
+        """
+        Returns:
+            list: One dict per credit, in order: {'idCredito', 'best_emisora',
+                'expected_profit', 'probabilities': {idEmisora: probability}}
+                or {'idCredito', 'error'} for credits with missing or
+                non-finite features or a non-integer IdBanco_Credito.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((credits, future))
+        return await future
+
+    async def _run_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            size = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                size += len(item[0])
+
+            credits = [credit for item_credits, _ in items for credit in item_credits]
+            try:
+                responses = await loop.run_in_executor(self.executor, self._score_batch, credits)
+            except Exception as e:
+                if len(items) == 1:
+                    if not items[0][1].done():
+                        items[0][1].set_exception(e)
+                    continue
+                # Find the request that broke the batch: each one alone
+                for item_credits, future in items:
+                    try:
+                        item_responses = await loop.run_in_executor(self.executor, self._score_batch, item_credits)
+                    except Exception as item_error:
+                        if not future.done():
+                            future.set_exception(item_error)
+                        continue
+                    self.batches += 1
+                    self.batch_sizes.append(len(item_credits))
+                    if not future.done():
+                        future.set_result(item_responses)
+                continue
+            self.batches += 1
+            self.batch_sizes.append(len(credits))
+            start = 0
+            for item_credits, future in items:
+                if not future.done():
+                    future.set_result(responses[start:start + len(item_credits)])
+                start += len(item_credits)
+
+    def _prepared(self) -> dict:
+        """
+        The catalog in the layout of the current model set: eligibility rows
+        per bank and the hit cost vectors. Rebuilt only when the models change.
+        """
+        stack = get_stack(self.artifact["feature_names"])
+        if self._prepared_for is None or self._prepared_for["models_hash"] != stack["models_hash"]:
+            emisora_ids = stack["emisora_ids"]
+            banks = pd.Index(sorted(self.catalog["IdBanco"].unique()))
+            # Last row: a bank id that is in no catalog, for credits of banks
+            # outside it, which can only use INTERBANCARIO emisoras
+            eligible = eligibility_mask(self.catalog, list(banks) + [-1], emisora_ids)
+            chm, chw, in_catalog = cost_vectors(self.catalog, emisora_ids)
+            self._prepared_for = {
+                "models_hash": stack["models_hash"],
+                "stack": stack,
+                "banks": banks,
+                "eligible": eligible,
+                "chm": chm,
+                "chw": chw,
+                "in_catalog": in_catalog,
+                "emisora_ids": [int(em_id) for em_id in emisora_ids],
+            }
+        return self._prepared_for
+
+    def _score_batch(self, credits: list) -> list:
+        # Same steps and functions as pipeline.run_assignment, minus the
+        # per-call catalog work that _prepared keeps and most of the pandas
+        # overhead, which dominates batches of a few credits. features stays
+        # two-dimensional for a batch of no credits
+        features = np.array([[_number(credit.get(name)) for name in FEATURES] for credit in credits], dtype=float).reshape(len(credits), len(FEATURES))
+        errors = _credit_errors(features)
+        valid = np.flatnonzero([error is None for error in errors])
+        responses = [{"idCredito": credit.get("idCredito"), "error": error} for credit, error in zip(credits, errors)]
+        if not len(valid):
+            return responses
+        rows = pd.DataFrame(features[valid], columns=FEATURES)
+        X = transform(self.artifact, rows)
+
+        prepared = self._prepared()
+        probabilities = client_probabilities(prepared["stack"], predict_proba(prepared["stack"], X))
+        eligible = prepared["eligible"][prepared["banks"].get_indexer(rows["IdBanco_Credito"].to_numpy(dtype=np.int64))]
+        probabilities = np.where(eligible, probabilities, 0.0)
+        missing = (probabilities != 0) & ~prepared["in_catalog"]
+        if missing.any():
+            raise KeyError(prepared["emisora_ids"][int(np.nonzero(missing.any(axis=0))[0][0])])
+        hit_miss, hit_win = hit_cost_matrices(probabilities, prepared["chm"], prepared["chw"])
+        profits = expected_profits(probabilities, rows["montoCobrar"].to_numpy(dtype=float), hit_miss, hit_win)
+        best = best_emisora_index(profits)
+
+        emisora_ids = prepared["emisora_ids"]
+        for position, column, profit, row in zip(
+            valid.tolist(),
+            best.tolist(),
+            profits[np.arange(len(best)), best].tolist(),
+            probabilities.tolist(),
+        ):
+            responses[position] = {
+                "idCredito": credits[position].get("idCredito"),
+                "best_emisora": emisora_ids[column],
+                "expected_profit": profit,
+                "probabilities": dict(zip(emisora_ids, row)),
+            }
+        return responses
+
+    def record(self, seconds: float, credits: int) -> None:
+        self.requests += 1
+        self.credits += credits
+        self.latencies.append(seconds * 1000)
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: {'requests', 'credits', 'batches', 'uptime_s', 'queue',
+                'latency_ms': {'p50', 'p99', 'max'}, 'batch_size': {'p50',
+                'p99', 'mean', 'max'}} over the last STATS_WINDOW requests and
+                batches.
+        """
+        return {
+            "requests": self.requests,
+            "credits": self.credits,
+            "batches": self.batches,
+            "uptime_s": round(time.time() - self.started, 1),
+            "queue": self.queue.qsize() if self.queue is not None else 0,
+            "latency_ms": _summary(self.latencies, ("p50", "p99", "max")),
+            "batch_size": _summary(self.batch_sizes, ("p50", "p99", "mean", "max")),
+        }
+
+
+def _summary(values, keys: tuple) -> dict:
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return dict.fromkeys(keys)
+    summary = {"p50": np.percentile(values, 50), "p99": np.percentile(values, 99), "mean": values.mean(), "max": values.max()}
+    return {key: float(summary[key]) for key in keys}
+
+
+# ------------------ HTTP ------------------
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def _response(status: int, payload, keep_alive: bool) -> bytes:
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    head = (
+        f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode() + body
+
+
+def _credits(payload) -> list:
+    if isinstance(payload, dict):
+        payload = payload.get("credits", [payload])
+    if not isinstance(payload, list) or not all(isinstance(credit, dict) for credit in payload):
+        raise ValueError("expected a credit object, a list of them or {\"credits\": [...]}")
+    return payload
+
+
+async def _route(service: ScoringService, method: str, path: str, body: bytes) -> tuple:
+    if path == "/score":
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        start = time.perf_counter()
+        try:
+            credits = _credits(json.loads(body))
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        responses = await service.score(credits)
+        service.record(time.perf_counter() - start, len(credits))
+        return 200, {"credits": responses}
+    if path in ("/stats", "/health"):
+        if method != "GET":
+            return 405, {"error": "use GET"}
+        return 200, service.stats() if path == "/stats" else {"status": "ok"}
+    return 404, {"error": f"no route {path}"}
+
+
+async def handle_connection(service: ScoringService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """
+    Serves HTTP/1.1 requests on one connection until the client closes it.
+    """
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, path, version = request_line.decode("latin-1").split()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_BYTES:
+                writer.write(_response(413, {"error": "body too large"}, False))
+                await writer.drain()
+                break
+            body = await reader.readexactly(length) if length else b""
+            try:
+                status, payload = await _route(service, method, path.split("?")[0], body)
+            except Exception as e:
+                status, payload = 500, {"error": repr(e)}
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str = HOST, port: int = PORT, catalog_path: str = CATALOG_PATH, max_batch: int = MAX_BATCH, max_wait_ms: float = MAX_WAIT_MS) -> None:
+    service = ScoringService(catalog_path, max_batch, max_wait_ms)
+    await service.start()
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    print(f"Scoring {len(service.catalog)} catalog rows with {len(get_stack(service.artifact['feature_names'])['emisora_ids'])} models on http://{host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve credit scoring over HTTP with micro-batching.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="credits per micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS, help="longest a request waits for its batch to fill")
+    parser.add_argument("--catalog", default=CATALOG_PATH)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.catalog, args.max_batch, args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+
+# Log-bucket quantile sketch: every non-zero value goes to the bucket
+# ceil(log_gamma(|x|)), so any quantile comes back within RELATIVE_ACCURACY of
+# a real value. Sketches of different cells merge by adding bucket counts.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+MIN_VALUE = 1e-9  # smaller magnitudes count as 0
+KEY_OFFSET = 1 - int(np.floor(np.log(MIN_VALUE) / np.log(GAMMA)))
+# (cell, key) pairs are packed as cell * KEY_SPAN + key, so keys must stay
+# within +-MAX_KEY: magnitudes from MIN_VALUE up to MAX_VALUE (about 1e275)
+KEY_SPAN = 1 << 16
+MAX_KEY = KEY_SPAN // 2 - 1
+# One bucket short of MAX_KEY, so rounding in the log cannot push a key over
+MAX_VALUE = GAMMA ** (MAX_KEY - KEY_OFFSET - 1)
+
+SKETCH_METRICS = ("probability", "profit", "hit_miss", "hit_win")
+
+
+def sketch_keys(values: np.ndarray) -> np.ndarray:
+    """
+    Bucket key of each value. Keys sort in the same order as the values:
+    negative values get negative keys and 0 gets key 0.
+
+    Raises:
+        ValueError: A magnitude above MAX_VALUE (or infinite) has no key.
+    """
+    magnitude = np.abs(values)
+    nonzero = magnitude >= MIN_VALUE
+    if (magnitude[nonzero] > MAX_VALUE).any():
+        raise ValueError(f"Sketches only hold magnitudes up to {MAX_VALUE:.3g}, got {magnitude[nonzero].max():.3g}")
+    keys = np.zeros(values.shape, dtype=np.int64)
+    exponent = np.ceil(np.log(magnitude[nonzero]) / np.log(GAMMA)).astype(np.int64) + KEY_OFFSET
+    keys[nonzero] = np.where(values[nonzero] < 0, -exponent, exponent)
+    return keys
+
+
+def key_values(keys: np.ndarray) -> np.ndarray:
+    """
+    Representative value of each bucket key.
+    """
+    keys = np.asarray(keys)
+    exponent = np.abs(keys) - KEY_OFFSET
+    values = 2 * GAMMA ** exponent / (GAMMA + 1)
+    return np.where(keys == 0, 0.0, np.sign(keys) * values)
+
+
+def build_cube(rows: pd.DataFrame, result: dict, catalog: pd.DataFrame) -> tuple:
+    """
+    Aggregates one assignment by (bank, emisora).
+
+    Parameters:
+        rows (pd.DataFrame): Scored rows returned by pipeline.run_assignment.
+        result (dict): Output of process.assign.
+        catalog (pd.DataFrame): EmisoraBancoPrecios.csv.
+
+    Returns:
+        tuple: (cells, sketches)
+            cells: one row per (bank, idEmisora) with NombreEmisora, credits
+                (scored), assigned (credits whose best emisora it is),
+                probability_sum, profit_sum, hits (non-zero probability),
+                hit_miss_sum and hit_win_sum.
+            sketches: (bank, idEmisora, metric, key, count) bucket counts of the
+                probability, profit, hit_miss and hit_win sketches.
+    """
+    n, m = result["probabilities"].shape
+    bank_codes, banks = pd.factorize(rows["IdBanco_Credito"].to_numpy(), sort=True)
+    emisora_ids = np.asarray(result["emisora_ids"], dtype=np.int64)
+    n_cells = len(banks) * m
+
+    # Cell of credit i and emisora j
+    cell = (bank_codes[:, None] * m + np.arange(m)).ravel()
+    charged = result["probabilities"].ravel() != 0
+    assigned = np.zeros((n, m), dtype=bool)
+    assigned[np.arange(n), result["best"]] = True
+
+    def cell_sum(values, where=None):
+        if where is None:
+            return np.bincount(cell, weights=values, minlength=n_cells)
+        return np.bincount(cell[where], weights=values[where], minlength=n_cells)
+
+    metrics = {
+        "probability": result["probabilities"].ravel(),
+        "profit": result["profits"].ravel(),
+        "hit_miss": result["costo_hit_miss"].ravel(),
+        "hit_win": result["costo_hit_win"].ravel(),
+    }
+    names = catalog.drop_duplicates("idEmisora").set_index("idEmisora")["NombreEmisora"]
+
+    cells = pd.DataFrame({
+        "bank": np.repeat(np.asarray(banks), m),
+        "idEmisora": np.tile(emisora_ids, len(banks)),
+        "credits": np.bincount(cell, minlength=n_cells),
+        "assigned": np.bincount(cell, weights=assigned.ravel(), minlength=n_cells).astype(np.int64),
+        "probability_sum": cell_sum(metrics["probability"]),
+        "profit_sum": cell_sum(metrics["profit"]),
+        "hits": np.bincount(cell, weights=charged, minlength=n_cells).astype(np.int64),
+        "hit_miss_sum": cell_sum(metrics["hit_miss"], charged),
+        "hit_win_sum": cell_sum(metrics["hit_win"], charged),
+    })
+    cells.insert(2, "NombreEmisora", cells["idEmisora"].map(names))
+
+    parts = []
+    for metric, values in metrics.items():
+        # Hit costs only exist where the credit is charged
+        where = charged if metric.startswith("hit_") else slice(None)
+        # (cell, key) packed in one int64 so a 1-D unique does the counting
+        packed, counts = np.unique(cell[where] * KEY_SPAN + sketch_keys(values[where]) + KEY_SPAN // 2, return_counts=True)
+        cells_of, keys = np.divmod(packed, KEY_SPAN)
+        parts.append(pd.DataFrame({
+            "bank": np.asarray(banks)[cells_of // m],
+            "idEmisora": emisora_ids[cells_of % m],
+            "metric": metric,
+            "key": keys - KEY_SPAN // 2,
+            "count": counts,
+        }))
+    sketches = pd.concat(parts, ignore_index=True)
+    sketches["NombreEmisora"] = sketches["idEmisora"].map(names)
+    return cells, sketches
+
+
+def sketch_quantile(sketches: pd.DataFrame, metric: str, q: float, by: str = "NombreEmisora") -> pd.Series:
+    """
+    Merges the sketches of every cell in the given frame per group and reads
+    the q quantile.
+
+    Parameters:
+        sketches (pd.DataFrame): Rows of the sketches table, already filtered.
+        metric (str): One of SKETCH_METRICS.
+        q (float): Quantile in [0, 1], 0.5 for the median.
+        by (str): Column to group by.
+
+    Returns:
+        pd.Series: Quantile per group.
+    """
+    merged = (
+        sketches[sketches["metric"] == metric]
+        .groupby([by, "key"], observed=True)["count"]
+        .sum()
+        .reset_index()
+        .sort_values([by, "key"])
+    )
+    cumulative = merged.groupby(by, observed=True)["count"].cumsum()
+    total = merged.groupby(by, observed=True)["count"].transform("sum")
+    # First bucket whose cumulative count passes the target rank
+    reached = merged[cumulative > q * (total - 1)]
+    first = reached.groupby(by, observed=True)["key"].first()
+    return pd.Series(key_values(first.to_numpy()), index=first.index, name=metric)
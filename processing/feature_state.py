@@ -0,0 +1,271 @@
+"""
+Per-credit state of the history features, updated one upload at a time.
+
+ProcesadoYLimpieza.ipynb derives transCount, transSuccess, transResidual,
+pagoAnterior, ratioAnterior and residualAnterior by replaying the whole
+ListaCobroDetalle history sorted by (idCredito, consecutivoCobro). Every one
+of them only depends on the previous attempt of the same credit, so keeping
+the last attempt of each credit is enough to extend the history:
+
+    idCredito -> last consecutivoCobro, attempts, successful attempts,
+                 last montoCobrado, last montoCobrado / montoCobrar
+
+    python -m processing.feature_state update upload.parquet
+    python -m processing.feature_state check history.parquet --chunks 12
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from processing.paths import state_path
+
+
+STATE_PATH = state_path("feature_state.sqlite")
+
+# Only retry attempts count towards the history, as in the notebook
+HISTORY_STATUS = "reintento"
+
+FEATURE_COLUMNS = ["transCount", "transSuccess", "transResidual", "pagoAnterior", "ratioAnterior", "residualAnterior"]
+STATE_COLUMNS = ["last_consecutivo", "trans_count", "trans_success", "last_cobrado", "last_ratio"]
+
+_SQL_CHUNK = 900  # ids per IN (...) query
+
+
+def _history_rows(df: pd.DataFrame, status: str) -> pd.DataFrame:
+    if status is not None and "Status" in df.columns:
+        df = df[df["Status"].astype(str) == status]
+    return df.sort_values(["idCredito", "consecutivoCobro"], kind="stable")
+
+
+def _ratio(rows: pd.DataFrame) -> pd.Series:
+    # Unknown ratios (montoCobrar 0) carry over as 0, like the notebook's fillna
+    ratio = rows["montoCobrado"] / rows["montoCobrar"].replace(0, np.nan)
+    return ratio.fillna(0.0)
+
+
+def replay_features(df: pd.DataFrame, status: str = HISTORY_STATUS) -> pd.DataFrame:
+    """
+    The notebook's full replay: cumcount, forward-filled success counts and
+    shifts over the whole history, sorted by (idCredito, consecutivoCobro).
+
+    Returns:
+        pd.DataFrame: FEATURE_COLUMNS for the history rows, on df's index.
+    """
+    rows = _history_rows(df, status)
+    credit = rows["idCredito"]
+    succeeded = rows["fechaCobroBanco"].notna()
+
+    trans_count = rows.groupby(credit).cumcount() + 1
+    trans_success = pd.Series(np.nan, index=rows.index)
+    trans_success[succeeded] = rows[succeeded].groupby(credit[succeeded]).cumcount() + 1
+    trans_success = trans_success.groupby(credit).ffill().fillna(0.0)
+    pago_anterior = rows.groupby(credit)["montoCobrado"].shift(1).fillna(0.0)
+    ratio_anterior = (rows["montoCobrado"] / rows["montoCobrar"].replace(0, np.nan)).groupby(credit).shift(1).fillna(0.0)
+
+    return pd.DataFrame({
+        "transCount": trans_count,
+        "transSuccess": trans_success,
+        "transResidual": trans_count - trans_success,
+        "pagoAnterior": pago_anterior,
+        "ratioAnterior": ratio_anterior,
+        "residualAnterior": pago_anterior,
+    })
+
+
+class FeatureState:
+    """
+    SQLite table of the last attempt of each credit. update() reads and
+    writes only the credits present in the new rows.
+
+    Usage:
+        with FeatureState() as state:
+            features = state.update(upload_df)
+    """
+
+    def __init__(self, path: str = STATE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS credit_state (
+                idCredito INTEGER PRIMARY KEY,
+                last_consecutivo INTEGER NOT NULL,
+                trans_count INTEGER NOT NULL,
+                trans_success INTEGER NOT NULL,
+                last_cobrado REAL NOT NULL,
+                last_ratio REAL NOT NULL
+            )
+        """)
+
+    def get(self, credit_ids) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: STATE_COLUMNS indexed by idCredito, for the given
+                credits that have a state.
+        """
+        credit_ids = [int(i) for i in credit_ids]
+        parts = []
+        for start in range(0, len(credit_ids), _SQL_CHUNK):
+            chunk = credit_ids[start:start + _SQL_CHUNK]
+            parts.append(pd.read_sql_query(
+                f"SELECT idCredito, {', '.join(STATE_COLUMNS)} FROM credit_state WHERE idCredito IN ({', '.join('?' * len(chunk))})",
+                self.connection,
+                params=chunk,
+            ))
+        if not parts:
+            return pd.DataFrame(columns=STATE_COLUMNS, index=pd.Index([], name="idCredito"))
+        return pd.concat(parts, ignore_index=True).set_index("idCredito")
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM credit_state").fetchone()[0]
+
+    def update(self, df: pd.DataFrame, status: str = HISTORY_STATUS) -> pd.DataFrame:
+        """
+        Extends the history of each credit with the new rows and returns
+        their features.
+
+        Parameters:
+            df (pd.DataFrame): New attempts with idCredito, consecutivoCobro,
+                montoCobrar, montoCobrado, fechaCobroBanco and Status.
+            status (str): Status of the rows that count, None for all rows.
+
+        Returns:
+            pd.DataFrame: FEATURE_COLUMNS on df's index, for the rows that
+                extended a history. Rows not newer than the stored
+                last_consecutivo of their credit (re-sent or late attempts)
+                are skipped; their count is in the 'stale' attribute of the
+                frame.
+        """
+        rows = _history_rows(df, status)
+        previous = self.get(rows["idCredito"].unique()).reindex(rows["idCredito"].to_numpy())
+        fresh = ~(rows["consecutivoCobro"].to_numpy() <= previous["last_consecutivo"].to_numpy(dtype=float))
+        rows, previous = rows[fresh], previous[fresh]
+
+        credit = rows["idCredito"]
+        first = ~credit.duplicated().to_numpy()
+        succeeded = rows["fechaCobroBanco"].notna().astype(np.int64)
+        ratio = _ratio(rows)
+
+        count0 = previous["trans_count"].fillna(0).to_numpy(dtype=float)
+        success0 = previous["trans_success"].fillna(0).to_numpy(dtype=float)
+        trans_count = count0 + rows.groupby(credit).cumcount().to_numpy() + 1
+        trans_success = success0 + succeeded.groupby(credit).cumsum().to_numpy()
+        # The first new row of a credit takes its previous attempt from the state
+        pago_anterior = np.where(first, previous["last_cobrado"].fillna(0.0).to_numpy(dtype=float), rows.groupby(credit)["montoCobrado"].shift(1).to_numpy())
+        ratio_anterior = np.where(first, previous["last_ratio"].fillna(0.0).to_numpy(dtype=float), ratio.groupby(credit).shift(1).to_numpy())
+
+        features = pd.DataFrame({
+            "transCount": trans_count.astype(np.int64),
+            "transSuccess": trans_success,
+            "transResidual": trans_count - trans_success,
+            "pagoAnterior": pago_anterior,
+            "ratioAnterior": ratio_anterior,
+            "residualAnterior": pago_anterior,
+        }, index=rows.index)
+
+        last = ~credit.duplicated(keep="last").to_numpy()
+        self.connection.executemany(
+            """
+            INSERT INTO credit_state (idCredito, last_consecutivo, trans_count, trans_success, last_cobrado, last_ratio)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(idCredito) DO UPDATE SET
+                last_consecutivo = excluded.last_consecutivo,
+                trans_count = excluded.trans_count,
+                trans_success = excluded.trans_success,
+                last_cobrado = excluded.last_cobrado,
+                last_ratio = excluded.last_ratio
+            """,
+            zip(
+                credit.to_numpy()[last].tolist(),
+                rows["consecutivoCobro"].to_numpy()[last].tolist(),
+                trans_count[last].astype(np.int64).tolist(),
+                trans_success[last].astype(np.int64).tolist(),
+                rows["montoCobrado"].to_numpy(dtype=float)[last].tolist(),
+                ratio.to_numpy()[last].tolist(),
+            ),
+        )
+        self.connection.commit()
+        features.attrs["stale"] = int((~fresh).sum())
+        return features
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def check_consistency(history: pd.DataFrame, chunks: int = 12, status: str = HISTORY_STATUS) -> dict:
+    """
+    Feeds the history to an empty in-memory FeatureState in chunks of
+    consecutivoCobro, as successive uploads would arrive, and compares the
+    features with replay_features on the whole history.
+
+    Returns:
+        dict: {'rows', 'chunks', 'seconds_incremental', 'seconds_replay',
+            'mismatches': {feature: rows that differ}, 'consistent': bool}
+    """
+    order = np.argsort(history["consecutivoCobro"].to_numpy(), kind="stable")
+
+    start = time.perf_counter()
+    with FeatureState(":memory:") as state:
+        parts = [state.update(history.iloc[positions], status) for positions in np.array_split(order, chunks)]
+    incremental = pd.concat(parts)
+    seconds_incremental = time.perf_counter() - start
+
+    start = time.perf_counter()
+    replay = replay_features(history, status)
+    seconds_replay = time.perf_counter() - start
+
+    incremental = incremental.reindex(replay.index)
+    mismatches = {
+        column: int((~np.isclose(incremental[column].to_numpy(dtype=float), replay[column].to_numpy(dtype=float), rtol=0, atol=1e-9, equal_nan=True)).sum())
+        for column in FEATURE_COLUMNS
+    }
+    return {
+        "rows": len(replay),
+        "chunks": chunks,
+        "seconds_incremental": seconds_incremental,
+        "seconds_replay": seconds_replay,
+        "mismatches": mismatches,
+        "consistent": not any(mismatches.values()),
+    }
+
+
+def _read(path: str) -> pd.DataFrame:
+    return pd.read_csv(path) if path.endswith(".csv") else pd.read_parquet(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain or check the per-credit feature state.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    update_parser = commands.add_parser("update", help="apply an upload to the state")
+    update_parser.add_argument("path", help="CSV or Parquet with the upload columns")
+    update_parser.add_argument("--state", default=STATE_PATH)
+    check_parser = commands.add_parser("check", help="compare incremental updates with a full replay")
+    check_parser.add_argument("path", help="CSV or Parquet history")
+    check_parser.add_argument("--chunks", type=int, default=12)
+    args = parser.parse_args()
+
+    if args.command == "update":
+        with FeatureState(args.state) as state:
+            start = time.perf_counter()
+            features = state.update(_read(args.path))
+            print(f"{len(features):,} rows in {time.perf_counter() - start:.2f} s, {features.attrs['stale']:,} stale, {len(state):,} credits in the state")
+    else:
+        report = check_consistency(_read(args.path), args.chunks)
+        print(
+            f"{report['rows']:,} rows in {report['chunks']} chunks: incremental {report['seconds_incremental']:.2f} s, "
+            f"replay {report['seconds_replay']:.2f} s, {'consistent' if report['consistent'] else 'MISMATCH'}"
+        )
+        for column, count in report["mismatches"].items():
+            if count:
+                print(f"  {column}: {count:,} rows differ")
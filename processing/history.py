@@ -0,0 +1,206 @@
+"""
+ListaCobroDetalle history as a Hive-partitioned Parquet dataset:
+
+    data/history/year=2024/idEmisora=12/<part>.parquet
+
+Rows are routed to their partition while they are written, in one pass over
+the input, and readers only open the partitions and columns they ask for.
+
+    python -m processing.history write ListaCobroDetalle2023.csv ListaCobroDetalle2024.csv
+    python -m processing.history info
+"""
+import argparse
+import os
+import re
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+
+from processing.paths import data_path
+from processing.schema import UPLOAD_SCHEMA
+
+
+HISTORY_DIR = data_path("history")
+PARTITION_SCHEMA = pa.schema([("year", pa.int16()), ("idEmisora", pa.int32())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+
+# Date used for the year partition, yyyy-mm-dd
+YEAR_COLUMN = "fechaEnvioCobro"
+
+
+def _conform(batch: pa.RecordBatch, year: int = None) -> pa.RecordBatch:
+    """
+    Casts the known columns to UPLOAD_SCHEMA and adds the year column: the
+    given year, or the year of YEAR_COLUMN.
+    """
+    table = pa.Table.from_batches([batch])
+    for field in UPLOAD_SCHEMA:
+        if field.name in table.column_names and table.schema.field(field.name).type != field.type:
+            column = table[field.name]
+            if pa.types.is_dictionary(field.type):
+                # Codes such as IdRespuestaBanco may come in as numbers
+                column = column.cast(pa.string())
+            table = table.set_column(table.schema.get_field_index(field.name), field.name, column.cast(field.type))
+    if year is not None:
+        years = pa.array([year] * table.num_rows, pa.int16())
+    else:
+        dates = pc.cast(table[YEAR_COLUMN], pa.string())
+        years = pc.cast(pc.utf8_slice_codeunits(dates, 0, 4), pa.int16())
+    if "year" in table.column_names:
+        table = table.drop_columns(["year"])
+    return table.append_column("year", years).combine_chunks().to_batches()[0]
+
+
+def _write(batches, schema: pa.Schema, history_dir: str, replace: bool) -> None:
+    ds.write_dataset(
+        batches,
+        history_dir,
+        schema=schema,
+        format="parquet",
+        partitioning=PARTITIONING,
+        # A fresh name per write, so appends never overwrite earlier parts
+        basename_template=f"part-{uuid.uuid4().hex[:8]}-{{i}}.parquet",
+        existing_data_behavior="delete_matching" if replace else "overwrite_or_ignore",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        # Input blocks spread over every partition; buffer them into
+        # row groups big enough to read efficiently
+        min_rows_per_group=1 << 16,
+        max_rows_per_group=1 << 20,
+    )
+
+
+def write_history(df: pd.DataFrame, year: int = None, history_dir: str = HISTORY_DIR, replace: bool = False) -> None:
+    """
+    Writes rows into the partitioned dataset.
+
+    Parameters:
+        df (pd.DataFrame): ListaCobroDetalle rows with at least idEmisora.
+        year (int): Partition year of every row; taken from fechaEnvioCobro
+            if None (rows without a date land in the default partition).
+        replace (bool): Replace the partitions the rows fall in instead of
+            adding to them.
+    """
+    batch = _conform(pa.RecordBatch.from_pandas(df, preserve_index=False), year)
+    _write([batch], batch.schema, history_dir, replace)
+
+
+def write_history_csv(path: str, year: int = None, history_dir: str = HISTORY_DIR, replace: bool = False) -> int:
+    """
+    Streams one yearly CSV into the dataset block by block. The year comes
+    from the file name (ListaCobroDetalle2024.csv) when not given.
+
+    Returns:
+        int: Rows written.
+    """
+    if year is None:
+        match = re.search(r"(19|20)\d\d", os.path.basename(path))
+        year = int(match.group(0)) if match else None
+
+    reader = pv.open_csv(path, convert_options=pv.ConvertOptions(
+        column_types={field.name: field.type for field in UPLOAD_SCHEMA},
+        strings_can_be_null=True,
+    ))
+    first = _conform(reader.read_next_batch(), year)
+    rows = first.num_rows
+
+    def batches():
+        nonlocal rows
+        yield first
+        for batch in reader:
+            batch = _conform(batch, year)
+            rows += batch.num_rows
+            yield batch
+
+    _write(batches(), first.schema, history_dir, replace)
+    return rows
+
+
+def history_dataset(history_dir: str = HISTORY_DIR) -> ds.Dataset:
+    return ds.dataset(history_dir, format="parquet", partitioning=PARTITIONING)
+
+
+def history_filter(years: list = None, emisoras: list = None, where: ds.Expression = None) -> ds.Expression:
+    """
+    Dataset filter for the given years and emisoras, plus any extra
+    expression such as ds.field('montoCobrado') > 0.
+    """
+    expression = None
+    for name, values in (("year", years), ("idEmisora", emisoras)):
+        if values is not None:
+            condition = ds.field(name).isin(list(values))
+            expression = condition if expression is None else expression & condition
+    if where is not None:
+        expression = where if expression is None else expression & where
+    return expression
+
+
+def read_history(columns: list = None, years: list = None, emisoras: list = None, where: ds.Expression = None, history_dir: str = HISTORY_DIR) -> pd.DataFrame:
+    """
+    Reads part of the history. Year and emisora filters prune whole
+    partition directories; other predicates are pushed down to the Parquet
+    row-group statistics.
+
+    Parameters:
+        columns (list): Columns to load, all if None. year and idEmisora are
+            available as columns too.
+        years (list): Years to read, all if None.
+        emisoras (list): idEmisora values to read, all if None.
+        where (ds.Expression): Extra row filter.
+
+    Returns:
+        pd.DataFrame
+    """
+    table = history_dataset(history_dir).to_table(columns=columns, filter=history_filter(years, emisoras, where))
+    return table.to_pandas()
+
+
+def partitions(history_dir: str = HISTORY_DIR) -> pd.DataFrame:
+    """
+    Returns:
+        pd.DataFrame: year, idEmisora, files and rows of each partition,
+            read from the Parquet footers only.
+    """
+    dataset = history_dataset(history_dir)
+    records = []
+    for fragment in dataset.get_fragments():
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        records.append({
+            "year": keys.get("year"),
+            "idEmisora": keys.get("idEmisora"),
+            "rows": fragment.metadata.num_rows,
+        })
+    if not records:
+        return pd.DataFrame(columns=["year", "idEmisora", "files", "rows"])
+    return (
+        pd.DataFrame(records)
+        .groupby(["year", "idEmisora"], dropna=False)
+        .agg(files=("rows", "size"), rows=("rows", "sum"))
+        .reset_index()
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the partitioned ListaCobroDetalle history.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    write_parser = commands.add_parser("write", help="add CSVs or Parquet files to the history")
+    write_parser.add_argument("paths", nargs="+")
+    write_parser.add_argument("--year", type=int, help="partition year, from the file name or fechaEnvioCobro if omitted")
+    write_parser.add_argument("--replace", action="store_true", help="replace the partitions the rows fall in")
+    commands.add_parser("info", help="list the partitions")
+    args = parser.parse_args()
+
+    if args.command == "write":
+        for path in args.paths:
+            if path.endswith(".csv"):
+                rows = write_history_csv(path, args.year, replace=args.replace)
+            else:
+                df = pd.read_parquet(path)
+                write_history(df, args.year, replace=args.replace)
+                rows = len(df)
+            print(f"{path}: {rows:,} rows")
+    else:
+        print(partitions().to_string(index=False))
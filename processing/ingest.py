@@ -0,0 +1,138 @@
+"""
+Content-addressed storage of the uploaded post-mortem CSVs.
+
+Each upload is stored once, as data/uploads/<sha256 of the CSV bytes>.parquet
+with the fixed schema.UPLOAD_SCHEMA; uploading the same bytes again only adds
+a 'duplicate' line to the append-only upload log.
+
+    python -m processing.ingest data/uploads/*.csv
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from processing.paths import data_path
+from processing.schema import UPLOAD_SCHEMA
+from processing.validation import ValidationError, validate_csv
+
+
+UPLOAD_DIR = data_path("uploads")
+UPLOAD_LOG = "upload_log.jsonl"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def upload_path(sha256: str, upload_dir: str = UPLOAD_DIR) -> str:
+    return os.path.join(upload_dir, f"{sha256}.parquet")
+
+
+def log_event(event: dict, upload_dir: str = UPLOAD_DIR) -> None:
+    """
+    Appends one JSON line to the upload log; the log is never rewritten.
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    entry = {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), **event}
+    with open(os.path.join(upload_dir, UPLOAD_LOG), "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def convert_csv(data: bytes, path: str) -> int:
+    """
+    Validates CSV bytes against UPLOAD_SCHEMA and converts them to a
+    zstd-compressed Parquet file in the same pass, block by block. The file
+    is written to a temporary name of its own, so concurrent uploads of the
+    same content never share it, and moved into place only once the whole
+    CSV is valid; otherwise the temporary file is removed.
+
+    Raises:
+        ValidationError: With the validation report, if a column is missing,
+            a row is malformed or a value does not fit its type.
+
+    Returns:
+        int: Rows written.
+    """
+    tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:6]}.tmp"
+    try:
+        with pq.ParquetWriter(tmp, UPLOAD_SCHEMA, compression="zstd") as writer:
+            report = validate_csv(data, UPLOAD_SCHEMA, on_batch=writer.write_batch)
+        if not report["valid"]:
+            raise ValidationError(report)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return report["rows"]
+
+
+def ingest_upload(data: bytes, filename: str = None, upload_dir: str = UPLOAD_DIR) -> dict:
+    """
+    Stores one uploaded CSV unless the same bytes were already stored.
+
+    Parameters:
+        data (bytes): Raw contents of the CSV.
+        filename (str): Original file name, only recorded in the log.
+        upload_dir (str): Directory of the Parquet files and the log.
+
+    Raises:
+        ValidationError: If the CSV does not match UPLOAD_SCHEMA; the
+            rejection is logged first.
+
+    Returns:
+        dict: {'sha256', 'path', 'status' ('stored' or 'duplicate'), 'rows', 'bytes'}
+    """
+    sha256 = content_hash(data)
+    path = upload_path(sha256, upload_dir)
+    event = {"sha256": sha256, "filename": filename, "bytes": len(data)}
+
+    if os.path.exists(path):
+        event.update(status="duplicate", rows=pq.ParquetFile(path).metadata.num_rows)
+    else:
+        os.makedirs(upload_dir, exist_ok=True)
+        try:
+            rows = convert_csv(data, path)
+        except ValidationError as e:
+            log_event({**event, "status": "rejected", "message": str(e), "violations": e.report["violations"]}, upload_dir)
+            raise
+        event.update(status="stored", rows=rows)
+
+    log_event(event, upload_dir)
+    return {**event, "path": path}
+
+
+def read_upload(sha256: str, columns: list = None, upload_dir: str = UPLOAD_DIR) -> pd.DataFrame:
+    """
+    Reads a stored upload; the dictionary columns come back as categoricals.
+    """
+    return pq.read_table(upload_path(sha256, upload_dir), columns=columns).to_pandas()
+
+
+def stored_uploads(upload_dir: str = UPLOAD_DIR) -> list:
+    """
+    Returns:
+        list: Hashes of the stored uploads, oldest first.
+    """
+    paths = sorted(glob.glob(os.path.join(upload_dir, "*.parquet")), key=os.path.getmtime)
+    return [os.path.basename(path)[:-len(".parquet")] for path in paths]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store CSV uploads as content-addressed Parquet files.")
+    parser.add_argument("paths", nargs="+", help="CSV files to ingest")
+    parser.add_argument("--remove", action="store_true", help="delete each CSV once it is stored")
+    args = parser.parse_args()
+
+    for csv_path in args.paths:
+        with open(csv_path, "rb") as f:
+            info = ingest_upload(f.read(), os.path.basename(csv_path))
+        print(f"{csv_path}: {info['status']} {info['sha256'][:12]} ({info['rows']:,} rows)")
+        if args.remove:
+            os.remove(csv_path)
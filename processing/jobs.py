@@ -0,0 +1,332 @@
+"""
+Background runs of the assignment pipeline, shared by every Streamlit
+session of the server.
+
+submit() starts run_assignment and write_store in a worker process and
+returns at once; the page polls read_status() for the progress. Each run
+lives in its own directory:
+
+    optimizer/runs/<run_id>/
+        status.json   state, stage, progress, inputs key, times and error
+        *.arrow       the store tables, see store.write_store
+        result/*.npy  the arrays of process.assign and the payments
+
+A run is keyed by the hashes of its inputs (batch, catalog, preprocessing
+and models). Submitting inputs that already have a completed or running
+run returns that run instead of computing it again. Each new run prunes
+the directories of older ones beyond KEEP_RUNS, never a running run or
+the latest finished one.
+
+    python -m processing.jobs run
+    python -m processing.jobs list
+"""
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from processing.paths import data_path, package_path, state_path
+from processing.pipeline import run_assignment
+from processing.prediction_cache import PredictionCache
+from processing.preprocessing import PREPROCESSING_PATH
+from processing.registry import MODEL_DIR, file_hash, model_hashes
+from processing.store import read_table, write_store
+from processing.telemetry import Telemetry, stage
+
+
+RUNS_DIR = state_path("runs")
+BATCH_PATH = package_path("2025Test.parquet")
+CATALOG_PATH = data_path("EmisoraBancoPrecios.csv")
+WORKERS = 2
+KEEP_RUNS = 10
+
+# Stages of one run in order; progress is the share of them already started
+STAGES = ("load", "preprocess", "score", "mask", "cost", "profit", "assign", "store")
+RESULT_ARRAYS = ("probabilities", "costo_hit_miss", "costo_hit_win", "profits", "best")
+
+# Process-wide, like the registry: one pool and the runs it is working on
+_lock = threading.Lock()
+_pool = None
+_active = {}
+
+
+def input_key(batch_path: str = BATCH_PATH, catalog_path: str = CATALOG_PATH, model_dir: str = MODEL_DIR) -> str:
+    """
+    Returns:
+        str: SHA-256 over the contents of every input of a run. The model
+            hashes come from the registry, which only rehashes changed files.
+    """
+    digest = hashlib.sha256()
+    for path in (batch_path, catalog_path, PREPROCESSING_PATH):
+        digest.update(file_hash(path).encode())
+    for em_id, sha256 in model_hashes(model_dir).items():
+        digest.update(f"{em_id}:{sha256}".encode())
+    return digest.hexdigest()
+
+
+def run_dir(run_id: str, runs_dir: str = RUNS_DIR) -> str:
+    return os.path.join(runs_dir, run_id)
+
+
+def _write_status(status: dict, runs_dir: str) -> None:
+    path = os.path.join(run_dir(status["run_id"], runs_dir), "status.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(status, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def read_status(run_id: str, runs_dir: str = RUNS_DIR) -> dict:
+    """
+    Returns:
+        dict: {'run_id', 'key', 'state' ('running', 'done' or 'failed'),
+            'stage', 'progress' (0 to 1), 'submitted', 'finished', 'rows',
+            'error'}
+    """
+    with open(os.path.join(run_dir(run_id, runs_dir), "status.json")) as f:
+        return json.load(f)
+
+
+def list_runs(runs_dir: str = RUNS_DIR) -> list:
+    """
+    Returns:
+        list: The status of every run, most recently submitted first.
+    """
+    runs = []
+    for path in glob.glob(os.path.join(runs_dir, "*", "status.json")):
+        try:
+            with open(path) as f:
+                runs.append(json.load(f))
+        except FileNotFoundError:
+            # Pruned by another process in between
+            pass
+    return sorted(runs, key=lambda status: status["submitted"], reverse=True)
+
+
+def latest_run(key: str = None, runs_dir: str = RUNS_DIR) -> dict:
+    """
+    Returns:
+        dict: Status of the most recently finished run, only among the runs
+            of the given inputs key if one is given; None if there is none.
+    """
+    done = [s for s in list_runs(runs_dir) if s["state"] == "done" and key in (None, s["key"])]
+    return max(done, key=lambda status: status["finished"]) if done else None
+
+
+class _ProgressTelemetry(Telemetry):
+    # Publishes each stage to status.json as it starts, then records it as usual
+
+    def __init__(self, status: dict, runs_dir: str):
+        super().__init__("asignar")
+        self.status = status
+        self.runs_dir = runs_dir
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int):
+        self.status["stage"] = name
+        self.status["progress"] = STAGES.index(name) / len(STAGES) if name in STAGES else self.status["progress"]
+        _write_status(self.status, self.runs_dir)
+        with super().stage(name, rows_in) as record:
+            yield record
+
+
+def save_result(result: dict, payments: np.ndarray, directory: str) -> None:
+    """
+    Writes the assign arrays as .npy files that load_result memory-maps.
+    """
+    os.makedirs(directory, exist_ok=True)
+    arrays = {name: result[name] for name in RESULT_ARRAYS}
+    arrays["emisora_ids"] = np.asarray(result["emisora_ids"], dtype=np.int64)
+    arrays["payments"] = np.asarray(payments, dtype=float)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), array)
+
+
+def load_result(run_id: str, runs_dir: str = RUNS_DIR) -> tuple:
+    """
+    Returns:
+        tuple: (result, payments) of a finished run, with result shaped like
+            the output of process.assign. The arrays are read-only memory
+            maps, so every session shares the same pages.
+    """
+    directory = os.path.join(run_dir(run_id, runs_dir), "result")
+    result = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in RESULT_ARRAYS}
+    emisora_ids = np.load(os.path.join(directory, "emisora_ids.npy")).tolist()
+    result["emisora_ids"] = emisora_ids
+    result["best_emisora"] = np.asarray(emisora_ids, dtype=object)[result["best"]]
+    return result, np.load(os.path.join(directory, "payments.npy"), mmap_mode="r")
+
+
+def read_run_table(run_id: str, name: str, columns: list = None, runs_dir: str = RUNS_DIR) -> pd.DataFrame:
+    """
+    store.read_table on the tables of one run.
+    """
+    return read_table(name, columns, store_dir=run_dir(run_id, runs_dir))
+
+
+def _read_batch(path: str) -> pd.DataFrame:
+    return pd.read_csv(path) if path.endswith(".csv") else pd.read_parquet(path)
+
+
+def execute(status: dict, batch_path: str, catalog_path: str, runs_dir: str = RUNS_DIR) -> dict:
+    """
+    Runs one submitted job to completion in this process: scoring and
+    assignment, the store tables and the result arrays, all inside the run
+    directory. Failures are recorded in the status instead of raised.
+
+    Returns:
+        dict: The final status.
+    """
+    directory = run_dir(status["run_id"], runs_dir)
+    telemetry = _ProgressTelemetry(status, runs_dir)
+    try:
+        with stage(telemetry, "load", 0) as record:
+            batch = _read_batch(batch_path)
+            catalog = pd.read_csv(catalog_path)
+            record["rows_out"] = len(batch)
+        rows, result = run_assignment(batch, catalog, telemetry=telemetry, cache=PredictionCache())
+        with stage(telemetry, "store", len(rows)):
+            write_store(rows, result, catalog, store_dir=directory)
+            save_result(result, rows["montoCobrar"].to_numpy(dtype=float), os.path.join(directory, "result"))
+        status.update(state="done", stage=None, progress=1.0, rows=len(rows))
+    except Exception:
+        status.update(state="failed", error=traceback.format_exc())
+    status["finished"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+    _write_status(status, runs_dir)
+    return status
+
+
+def prune_runs(runs_dir: str = RUNS_DIR, keep: int = KEEP_RUNS) -> list:
+    """
+    Removes the directories of all but the keep most recently submitted
+    runs. Running runs and the latest finished run, the one the page shows,
+    are always kept.
+
+    Returns:
+        list: run_id of the removed runs.
+    """
+    runs = list_runs(runs_dir)
+    latest = latest_run(runs_dir=runs_dir)
+    removed = []
+    for status in runs[keep:]:
+        if status["state"] == "running" or (latest is not None and status["run_id"] == latest["run_id"]):
+            continue
+        shutil.rmtree(run_dir(status["run_id"], runs_dir), ignore_errors=True)
+        removed.append(status["run_id"])
+    return removed
+
+
+def _new_run(key: str, runs_dir: str) -> dict:
+    status = {
+        "run_id": datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6],
+        "key": key,
+        "state": "running",
+        "stage": "queued",
+        "progress": 0.0,
+        "submitted": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"),
+        "finished": None,
+        "rows": None,
+        "error": None,
+    }
+    os.makedirs(run_dir(status["run_id"], runs_dir), exist_ok=True)
+    _write_status(status, runs_dir)
+    return status
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking the threaded Streamlit server is not safe
+        _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _record_failure(future, pool: ProcessPoolExecutor, run_id: str, runs_dir: str) -> None:
+    # Done callback: execute records its own failures, so an exception here
+    # means the worker never finished (killed, out of memory, broken pool)
+    global _pool
+    if future.cancelled():
+        error = "Cancelled before it started"
+    elif future.exception() is not None:
+        error = "".join(traceback.format_exception(future.exception()))
+        if isinstance(future.exception(), BrokenProcessPool) and _pool is pool:
+            # The next submit starts a new pool
+            _pool = None
+    else:
+        return
+    status = read_status(run_id, runs_dir)
+    status.update(state="failed", error=error)
+    status["finished"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+    _write_status(status, runs_dir)
+
+
+def submit(batch_path: str = BATCH_PATH, catalog_path: str = CATALOG_PATH, runs_dir: str = RUNS_DIR) -> str:
+    """
+    Starts an assignment run in the background, unless its inputs already
+    have a finished run or one in progress in this process.
+
+    Returns:
+        str: run_id of the new or the existing run; poll it with read_status.
+    """
+    global _pool
+    key = input_key(batch_path, catalog_path)
+    with _lock:
+        for run_id, future in list(_active.items()):
+            if future.done():
+                del _active[run_id]
+            elif read_status(run_id, runs_dir)["key"] == key:
+                return run_id
+        latest = latest_run(key, runs_dir)
+        if latest is not None:
+            return latest["run_id"]
+
+        status = _new_run(key, runs_dir)
+        run_id = status["run_id"]
+        pool = _get_pool()
+        try:
+            future = pool.submit(execute, status, batch_path, catalog_path, runs_dir)
+        except BrokenProcessPool:
+            # A worker died since the last run
+            _pool = None
+            pool = _get_pool()
+            future = pool.submit(execute, status, batch_path, catalog_path, runs_dir)
+        future.add_done_callback(lambda done: _record_failure(done, pool, run_id, runs_dir))
+        _active[run_id] = future
+        prune_runs(runs_dir)
+        return run_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run or list the background assignment runs.")
+    parser.add_argument("command", choices=["run", "list"])
+    parser.add_argument("--batch", default=BATCH_PATH)
+    parser.add_argument("--catalog", default=CATALOG_PATH)
+    parser.add_argument("--runs-dir", default=RUNS_DIR)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        key = input_key(args.batch, args.catalog)
+        latest = latest_run(key, args.runs_dir)
+        if latest is not None:
+            print(f"Up to date: run {latest['run_id']} finished {latest['finished']}")
+        else:
+            # Same job as submit, in the foreground
+            status = _new_run(key, args.runs_dir)
+            status = execute(status, args.batch, args.catalog, args.runs_dir)
+            print(f"Run {status['run_id']}: {status['state']}", status["error"] or f"({status['rows']:,} credits)")
+            prune_runs(args.runs_dir)
+    else:
+        for status in list_runs(args.runs_dir):
+            print(f"{status['run_id']}  {status['state']:<8} {status['submitted'][:19]}  {status['key'][:12]}  {status['rows'] or ''}")
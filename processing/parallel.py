@@ -0,0 +1,136 @@
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from processing.paths import data_path
+from processing.pipeline import assignment_frame, run_assignment
+from processing.preprocessing import FEATURES, load_preprocessing
+
+
+CATALOG_PATH = data_path("EmisoraBancoPrecios.csv")
+
+# Loaded once per worker process by _init_worker
+_worker = {}
+
+
+def _init_worker(catalog_path: str) -> None:
+    _worker["catalog"] = pd.read_csv(catalog_path)
+    _worker["artifact"] = load_preprocessing()
+
+
+def _run_shard(args: tuple) -> tuple:
+    shard, detail = args
+    rows, result = run_assignment(shard, _worker["catalog"], _worker["artifact"])
+    # The index holds the row positions in the full batch; rows with missing
+    # features were dropped by run_assignment
+    return rows.index.to_numpy(), assignment_frame(rows, result, detail)
+
+
+def shard_positions(df: pd.DataFrame, shard_size: int, shard_by: str = "hash") -> list:
+    """
+    Splits the rows of df into shards.
+
+    Parameters:
+        df (pd.DataFrame): Credits to assign.
+        shard_size (int): Target rows per shard.
+        shard_by (str): 'hash' spreads idCredito evenly over the shards.
+            'bank' keeps every IdBanco_Credito in a single shard: banks are
+            packed in order into shards of up to shard_size rows, and a bank
+            larger than shard_size is a shard of its own, so shard_size is
+            only a target there.
+
+    Returns:
+        list: Arrays of row positions, one per non-empty shard.
+    """
+    n_shards = max(1, math.ceil(len(df) / shard_size))
+    if shard_by == "hash":
+        keys = pd.util.hash_array(df["idCredito"].to_numpy()) % n_shards
+    elif shard_by == "bank":
+        banks, _ = pd.factorize(df["IdBanco_Credito"].to_numpy(), sort=True)
+        counts = np.bincount(banks)
+        shard_of_bank = np.empty(len(counts), dtype=np.int64)
+        shard, filled = 0, 0
+        for bank, rows in enumerate(counts):
+            if filled and filled + rows > shard_size:
+                shard, filled = shard + 1, 0
+            shard_of_bank[bank] = shard
+            filled += rows
+        keys = shard_of_bank[banks]
+    else:
+        raise ValueError(f"shard_by must be 'hash' or 'bank', got {shard_by!r}")
+    codes, _ = pd.factorize(keys, sort=True)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.cumsum(np.bincount(codes))[:-1]
+    return [shard for shard in np.split(order, bounds) if len(shard)]
+
+
+def parallel_assignment(df: pd.DataFrame, workers: int = None, shard_size: int = 50_000, shard_by: str = "hash", detail: bool = True, catalog_path: str = CATALOG_PATH) -> pd.DataFrame:
+    """
+    Runs preprocess -> score -> assign over shards of df in a process pool.
+    Each worker loads the models and the catalog once. Shard results are put
+    back in the row order of df, so the output equals the single-process
+    assignment_frame(*run_assignment(df, catalog)).
+
+    Parameters:
+        df (pd.DataFrame): Credits, as in 2025Test.parquet.
+        workers (int): Worker processes, os.cpu_count() by default.
+        shard_size (int): Target rows per shard.
+        shard_by (str): 'hash' or 'bank', see shard_positions.
+        detail (bool): Keep the per-emisora columns.
+        catalog_path (str): EmisoraBancoPrecios.csv.
+
+    Returns:
+        pd.DataFrame: See pipeline.assignment_frame.
+    """
+    df = df[FEATURES + ["idCredito"]].reset_index(drop=True)
+    tasks = [(df.iloc[positions], detail) for positions in shard_positions(df, shard_size, shard_by)]
+    if not tasks:
+        # No rows, no shards: the empty frame of the single-process path
+        # has the same columns and dtypes
+        return assignment_frame(*run_assignment(df, pd.read_csv(catalog_path)), detail)
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker, initargs=(catalog_path,)) as pool:
+        shards = list(pool.map(_run_shard, tasks))
+
+    positions = np.concatenate([kept for kept, _ in shards])
+    frame = pd.concat([part for _, part in shards], ignore_index=True)
+    return frame.iloc[np.argsort(positions, kind="stable")].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assign emisoras to a Parquet of credits across a process pool.")
+    parser.add_argument("input", help="input Parquet")
+    parser.add_argument("--output", help="output Parquet")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shard-size", type=int, default=50_000)
+    parser.add_argument("--shard-by", choices=["hash", "bank"], default="hash")
+    parser.add_argument("--scaling", action="store_true", help="time 1/2/4/8 workers against the single-process pipeline and check they match")
+    args = parser.parse_args()
+
+    df = pd.read_parquet(args.input, columns=FEATURES + ["idCredito"])
+
+    if args.scaling:
+        # Baseline: the single-process pipeline, models and catalog loaded as
+        # a fresh pool worker would
+        start = time.perf_counter()
+        reference = assignment_frame(*run_assignment(df, pd.read_csv(CATALOG_PATH), load_preprocessing()))
+        base = time.perf_counter() - start
+        print(f"single process: {base:.2f} s, {len(df) / base:,.0f} rows/s")
+        for workers in (1, 2, 4, 8):
+            start = time.perf_counter()
+            frame = parallel_assignment(df, workers, args.shard_size, args.shard_by)
+            seconds = time.perf_counter() - start
+            same = frame.equals(reference)
+            print(f"{workers} workers: {seconds:.2f} s, {len(df) / seconds:,.0f} rows/s, speedup {base / seconds:.2f}x, identical={same}")
+    else:
+        start = time.perf_counter()
+        frame = parallel_assignment(df, args.workers, args.shard_size, args.shard_by)
+        seconds = time.perf_counter() - start
+        if args.output:
+            frame.to_parquet(args.output, index=False)
+        print(f"{len(frame):,} rows with {args.workers} workers in {seconds:.2f} s ({len(frame) / seconds:,.0f} rows/s)")
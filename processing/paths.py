@@ -0,0 +1,32 @@
+"""
+Default locations of the files the package reads and writes, so that the
+commands work from any directory.
+
+The models, the preprocessing artifact and the test batch ship inside the
+package. The catalogs and the history live in data/ of the project, next
+to the package. The runtime state (run log, stack and prediction caches,
+store, background runs) goes to optimizer/ of the project, or to the
+directory in the CREDIFIEL_STATE_DIR environment variable.
+"""
+import os
+
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(PACKAGE_DIR)
+DATA_DIR = os.path.join(PROJECT_DIR, "data")
+STATE_DIR = os.environ.get("CREDIFIEL_STATE_DIR") or os.path.join(PROJECT_DIR, "optimizer")
+
+
+def package_path(*parts: str) -> str:
+    return os.path.join(PACKAGE_DIR, *parts)
+
+
+def data_path(*parts: str) -> str:
+    return os.path.join(DATA_DIR, *parts)
+
+
+def state_path(*parts: str, state_dir: str = None) -> str:
+    """
+    A path under state_dir, STATE_DIR by default.
+    """
+    return os.path.join(state_dir or STATE_DIR, *parts)
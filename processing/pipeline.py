@@ -0,0 +1,116 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from processing.process import assign
+from processing.preprocessing import FEATURES, load_preprocessing, transform, valid_rows
+from processing.registry import MODEL_DIR, STACK_CACHE_DIR, get_stack
+from processing.scorer import predict_proba
+from processing.telemetry import stage
+
+
+def preprocess(train_df, artifact):
+    """
+    Applies the frozen preprocessing artifact to a batch.
+
+    Returns:
+        tuple: (rows, X) where rows holds idCredito, IdBanco_Credito and
+            montoCobrar of the scored credits and X is their model matrix.
+    """
+    train_df = train_df.loc[valid_rows(train_df), FEATURES + ["idCredito"]]
+    return train_df, transform(artifact, train_df)
+
+def client_probabilities(stack, proba):
+    """
+    Success probability used by the optimizer: the smaller class probability
+    for models fit with both classes, 0 for single-class models.
+    """
+    return np.where(stack["n_classes"] == 2, proba.min(axis=2), 0.0)
+
+def score(stack, rows, X, artifact, cache=None, record=None):
+    """
+    client_probabilities of the preprocessed rows, taken from a
+    prediction_cache.PredictionCache where possible. The cache's hit and miss
+    counts are added to record, a telemetry stage record.
+    """
+    if cache is None:
+        return client_probabilities(stack, predict_proba(stack, X))
+    # The same raw features give the same X only under the same artifact
+    models_hash = hashlib.sha256((stack["models_hash"] + json.dumps(artifact, sort_keys=True)).encode()).hexdigest()
+    probabilities = cache.score(
+        models_hash,
+        rows[FEATURES].to_numpy(dtype=float),
+        X,
+        lambda X: client_probabilities(stack, predict_proba(stack, X)),
+    )
+    if record is not None:
+        record.update({f"cache_{key}": cache.last_stats[key] for key in ("hits", "misses", "hit_rate")})
+    return probabilities
+
+def run_assignment(df: pd.DataFrame, catalog: pd.DataFrame, artifact: dict = None, telemetry=None, cache=None, model_dir: str = MODEL_DIR, stack_dir: str = STACK_CACHE_DIR) -> tuple:
+    """
+    Preprocess -> score -> assign for one batch of credits, with the models
+    taken from the registry.
+
+    Parameters:
+        df (pd.DataFrame): Raw credits, as in 2025Test.parquet.
+        catalog (pd.DataFrame): EmisoraBancoPrecios.csv.
+        artifact (dict): Preprocessing artifact, loaded from disk if not given.
+        telemetry (Telemetry): Records the preprocess, score, mask, cost,
+            profit and assign stages.
+        cache (PredictionCache): Reuses the probabilities of credits whose
+            features and models did not change since an earlier run.
+        model_dir (str): Directory of the emisora models.
+        stack_dir (str): Cache of stacked models, see registry.get_stack.
+
+    Returns:
+        tuple: (rows, result) with the scored rows and the output of process.assign.
+    """
+    artifact = artifact or load_preprocessing()
+    with stage(telemetry, "preprocess", len(df)) as record:
+        rows, X = preprocess(df, artifact)
+        record["rows_out"] = len(rows)
+
+    with stage(telemetry, "score", len(rows)) as record:
+        stack = get_stack(artifact["feature_names"], model_dir, stack_dir)
+        probabilities = score(stack, rows, X, artifact, cache, record)
+
+    result = assign(
+        catalog,
+        probabilities,
+        rows["IdBanco_Credito"].to_numpy(),
+        rows["montoCobrar"].to_numpy(dtype=float),
+        stack["emisora_ids"],
+        telemetry,
+    )
+    return rows, result
+
+def assignment_frame(rows: pd.DataFrame, result: dict, detail: bool = True) -> pd.DataFrame:
+    """
+    Flat table of one assigned batch, one row per credit.
+
+    Parameters:
+        rows (pd.DataFrame): Scored rows returned by run_assignment.
+        result (dict): Output of process.assign.
+        detail (bool): Add the per-emisora probability_<id> and profit_<id> columns.
+
+    Returns:
+        pd.DataFrame: idCredito, IdBanco_Credito, montoCobrar, best_emisora,
+            expected_profit and, with detail, the per-emisora columns.
+    """
+    n = len(rows)
+    columns = {
+        "idCredito": rows["idCredito"].to_numpy(),
+        "IdBanco_Credito": rows["IdBanco_Credito"].to_numpy(),
+        "montoCobrar": rows["montoCobrar"].to_numpy(dtype=float),
+        "best_emisora": result["best_emisora"].astype(np.int64),
+        "expected_profit": result["profits"][np.arange(n), result["best"]],
+    }
+    if detail:
+        for j, em_id in enumerate(result["emisora_ids"]):
+            columns[f"probability_{em_id}"] = result["probabilities"][:, j]
+        for j, em_id in enumerate(result["emisora_ids"]):
+            columns[f"profit_{em_id}"] = result["profits"][:, j]
+    return pd.DataFrame(columns)
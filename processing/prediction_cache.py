@@ -0,0 +1,290 @@
+"""
+On-disk cache of credit probabilities, keyed by the model set and the
+credit's feature vector.
+
+Between scoring cycles most credits keep exactly the same features, so
+their probabilities under an unchanged model set are already known. Each
+model set has a directory of segment files, each sorted by key so a batch
+is looked up with one searchsorted per segment:
+
+    optimizer/prediction_cache/<models_hash>/<segment>.npy
+        key            raw bytes of the credit's float64 feature row
+        last_used      time of the last run that read or wrote the entry
+        probabilities  the row of pipeline.client_probabilities
+
+A batch writes only its misses, as a new segment with a name no other
+process uses, so a write costs the size of the misses, not of the cache,
+and processes sharing the cache (the workers of jobs.py) never overwrite
+each other. Past max_segments the smallest segments are merged; merging
+and eviction hold an exclusive lock on the cache directory.
+
+The key is the feature row itself rather than a digest of it, so two
+credits share an entry only when their features are bit-identical. Past
+max_entries over all model sets the least recently used entries are
+evicted, whole model sets of replaced models first, down to LOW_WATER of
+max_entries so that eviction does not run again on the next batch.
+
+    python -m processing.prediction_cache info
+    python -m processing.prediction_cache clear
+"""
+import argparse
+import fcntl
+import glob
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from processing.paths import state_path
+
+
+CACHE_DIR = state_path("prediction_cache")
+MAX_ENTRIES = 1_000_000
+MAX_SEGMENTS = 8
+LOW_WATER = 0.9
+
+
+def _dtype(key_bytes: int, n_emisoras: int) -> np.dtype:
+    return np.dtype([("key", f"S{key_bytes}"), ("last_used", "<i8"), ("probabilities", "<f8", (n_emisoras,))])
+
+
+def feature_keys(features: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: One fixed-width bytes key per row of features, its float64
+            values as raw bytes.
+    """
+    features = np.ascontiguousarray(features, dtype=np.float64)
+    return features.view(f"S{features.shape[1] * 8}").ravel()
+
+
+def _load(path: str, mode: str = "r"):
+    # None when another process merged the segment away in the meantime
+    try:
+        return np.load(path, mmap_mode=mode)
+    except FileNotFoundError:
+        return None
+
+
+def _write_segment(directory: str, table: np.ndarray) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:6]}.npy")
+    # Not *.npy, so no reader lists a half-written segment
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, table)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def _merge(tables: list) -> np.ndarray:
+    # One table sorted by key; of repeated keys the most recently used is kept
+    merged = np.concatenate(tables)
+    merged = merged[np.lexsort((-merged["last_used"], merged["key"]))]
+    first = np.ones(len(merged), dtype=bool)
+    first[1:] = merged["key"][1:] != merged["key"][:-1]
+    return merged[first]
+
+
+class PredictionCache:
+    """
+    LRU of probability rows. score() takes the cached rows and calls the
+    scoring function only for the feature vectors it has not seen under
+    models_hash.
+
+    Usage:
+        cache = PredictionCache()
+        probabilities = cache.score(models_hash, features, X, score)
+        cache.last_stats  # {'rows', 'hits', 'misses', 'hit_rate', ...}
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_entries: int = MAX_ENTRIES, max_segments: int = MAX_SEGMENTS):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_segments = max_segments
+        self.last_stats = None
+
+    def _dir(self, models_hash: str) -> str:
+        return os.path.join(self.cache_dir, models_hash)
+
+    def _segments(self, directory: str, mode: str = "r") -> list:
+        """
+        Returns:
+            list: (path, table) of the segments of one model set, oldest
+                first, memory-mapped with mode.
+        """
+        segments = ((path, _load(path, mode)) for path in sorted(glob.glob(os.path.join(directory, "*.npy"))))
+        return [(path, table) for path, table in segments if table is not None]
+
+    def _sets(self) -> list:
+        """
+        Returns:
+            list: (directory, entries) of every model set, least recently written first.
+        """
+        directories = sorted((path for path in glob.glob(os.path.join(self.cache_dir, "*")) if os.path.isdir(path)), key=os.path.getmtime)
+        return [(directory, sum(len(table) for _, table in self._segments(directory))) for directory in directories]
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, ".lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _replace(self, directory: str, segments: list, table: np.ndarray) -> None:
+        if len(table):
+            _write_segment(directory, table)
+        for path, _ in segments:
+            os.remove(path)
+
+    def _maintain(self, directory: str) -> int:
+        """
+        Merges the smallest segments of a model set once it has more than
+        max_segments, then evicts down to LOW_WATER if the cache is past
+        max_entries: the files of other model sets, least recently written
+        first, then this set's least recently used entries.
+
+        Returns:
+            int: Entries evicted.
+        """
+        with self._locked():
+            segments = self._segments(directory)
+            if len(segments) > self.max_segments:
+                smallest = sorted(segments, key=lambda segment: len(segment[1]))[:len(segments) - self.max_segments // 2 + 1]
+                self._replace(directory, smallest, _merge([table for _, table in smallest]))
+
+            sets = self._sets()
+            total = sum(n for _, n in sets)
+            if total <= self.max_entries:
+                return 0
+            target = int(self.max_entries * LOW_WATER)
+            evicted = 0
+            for other, n in sets:
+                if total <= target:
+                    break
+                if other != directory:
+                    shutil.rmtree(other)
+                    total -= n
+                    evicted += n
+            if total > target:
+                segments = self._segments(directory)
+                own = sum(len(table) for _, table in segments)
+                merged = _merge([table for _, table in segments])
+                keep = min(len(merged), max(0, target - (total - own)))
+                kept = merged[np.sort(np.argsort(merged["last_used"], kind="stable")[len(merged) - keep:])]
+                evicted += own - len(kept)
+                self._replace(directory, segments, kept)
+            return evicted
+
+    def score(self, models_hash: str, features: np.ndarray, X: np.ndarray, score) -> np.ndarray:
+        """
+        Probabilities of every credit, from the cache where possible.
+
+        Parameters:
+            models_hash (str): Identifies the model set and the preprocessing
+                that turns features into X.
+            features (np.ndarray): (credits, k) raw features that determine
+                each credit's row of X.
+            X (np.ndarray): (credits, features) model matrix.
+            score (callable): Maps a model matrix to its (credits, emisoras)
+                probabilities; called once, with the distinct missing rows.
+
+        Returns:
+            np.ndarray: (credits, emisoras) probabilities. The stats of the
+                call are kept in last_stats.
+        """
+        start = time.perf_counter()
+        if not len(X):
+            return np.asarray(score(X), dtype=np.float64)
+        keys = feature_keys(features)
+        # Credits with identical features are looked up and scored once
+        distinct, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+        directory = self._dir(models_hash)
+        tables = [table for _, table in self._segments(directory, "r+") if len(table) and table.dtype["key"].itemsize == keys.itemsize]
+        # Segment and position of each distinct key, -1 for the misses
+        found = np.full(len(distinct), -1)
+        position = np.zeros(len(distinct), dtype=np.int64)
+        for s, table in enumerate(tables):
+            todo = np.flatnonzero(found < 0)
+            if not len(todo):
+                break
+            at = np.searchsorted(table["key"], distinct[todo]).clip(max=len(table) - 1)
+            match = table["key"][at] == distinct[todo]
+            found[todo[match]] = s
+            position[todo[match]] = at[match]
+        hit = found >= 0
+
+        now = time.time_ns()
+        fresh = np.asarray(score(X[first[~hit]]), dtype=np.float64) if not hit.all() else None
+        n_emisoras = fresh.shape[1] if fresh is not None else tables[found[0]].dtype["probabilities"].shape[0]
+        values = np.empty((len(distinct), n_emisoras))
+        for s, table in enumerate(tables):
+            rows = found == s
+            if rows.any():
+                values[rows] = table["probabilities"][position[rows]]
+                # Only the LRU clock changes, in place
+                table["last_used"][position[rows]] = now
+                table.flush()
+        del tables
+
+        evicted = 0
+        if fresh is not None:
+            values[~hit] = fresh
+            added = np.empty(int((~hit).sum()), dtype=_dtype(keys.itemsize, n_emisoras))
+            added["key"] = distinct[~hit]
+            added["last_used"] = now
+            added["probabilities"] = fresh
+            _write_segment(directory, added)
+            evicted = self._maintain(directory)
+
+        misses = int((~hit)[inverse].sum())
+        self.last_stats = {
+            "rows": len(X),
+            "distinct": len(distinct),
+            "hits": len(X) - misses,
+            "misses": misses,
+            "hit_rate": (len(X) - misses) / len(X),
+            "evicted": evicted,
+            "seconds": time.perf_counter() - start,
+        }
+        return values[inverse]
+
+    def __len__(self) -> int:
+        return sum(n for _, n in self._sets())
+
+    def info(self) -> list:
+        """
+        Returns:
+            list: (models_hash, entries) per model set, most recently written first.
+        """
+        return [(os.path.basename(directory), n) for directory, n in reversed(self._sets())]
+
+    def clear(self) -> None:
+        with self._locked():
+            for directory, _ in self._sets():
+                shutil.rmtree(directory)
+            # Single-file tables of the earlier layout
+            for path in glob.glob(os.path.join(self.cache_dir, "*.npy")):
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clear the prediction cache.")
+    parser.add_argument("command", choices=["info", "clear"])
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args()
+
+    cache = PredictionCache(args.cache_dir)
+    if args.command == "info":
+        print(f"{len(cache):,} entries (max {cache.max_entries:,}) in {args.cache_dir}")
+        for models_hash, entries in cache.info():
+            print(f"  {models_hash[:12]}  {entries:,}")
+    else:
+        cache.clear()
+        print(f"Cleared {args.cache_dir}")
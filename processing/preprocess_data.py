@@ -1,59 +1,88 @@
+"""
+Batch assignment command: scores a batch of credits, writes the store tables
+the dashboard reads and serializes the assignment.
+
+    python -m processing.preprocess_data --format parquet --output asignacion.parquet
+    assign --input upload.csv --output - --no-detail --state-dir /var/lib/credifiel
+
+Importing this module does nothing; main() runs the command. The assign
+script is installed by pyproject.toml. Every default path is absolute (see
+paths.py), so the command runs from any directory.
+"""
+import argparse
 import os
+import sys
+
 import pandas as pd
-import numpy as np
-import joblib
-from sklearn.naive_bayes import GaussianNB
-from sklearn.preprocessing import StandardScaler
-from tqdm import tqdm
-import json
 
-from process import mask_client_probabilities, append_hit_costs, append_profits, calculate_best_emisora
+from processing.paths import STATE_DIR, data_path, package_path, state_path
+from processing.pipeline import run_assignment
+from processing.prediction_cache import CACHE_DIR, PredictionCache
+from processing.preprocessing import PREPROCESSING_PATH, load_preprocessing
+from processing.registry import MODEL_DIR, STACK_CACHE_DIR
+from processing.sinks import FORMATS, open_sink
+from processing.store import STORE_DIR, write_store
+from processing.telemetry import RUN_LOG_PATH, Telemetry, stage
+
+
+INPUT_PATH = package_path("2025Test.parquet")
+CATALOG_PATH = data_path("EmisoraBancoPrecios.csv")
 
 
-files = pd.DataFrame({"files":os.listdir("processing/modelOut")})
+def read_batch(path: str) -> pd.DataFrame:
+    """
+    Reads a batch of credits from a .csv or a Parquet file.
+    """
+    return pd.read_csv(path) if path.endswith(".csv") else pd.read_parquet(path)
 
-def preprocess(train_df):
-    train_df["dic"] = train_df.apply(lambda x: {
-        "bank":str(x['IdBanco_Credito']),
-        "payment": float(x['montoCobrar'])
-                }, axis=1)
-    features = ['montoCobrar', 'transCount', 'IdBanco_Credito',
-                'pagoAnterior', 'ratioAnterior', 'residualAnterior', 'idEmisora', "dic", "idCredito"]
-    train_df = train_df.dropna(subset=features)
-    train_df = train_df[features]
-    train_df = pd.get_dummies(train_df, columns=['IdBanco_Credito', 'idEmisora'], drop_first=True)
-    train_df['montoCobrar'] = np.log1p(train_df['montoCobrar'])
 
-    numeric_cols = ['montoCobrar', 'transCount', 'pagoAnterior', 'ratioAnterior', 'residualAnterior']
-    scaler = StandardScaler()
-    train_df[numeric_cols] = scaler.fit_transform(train_df[numeric_cols])
-    return train_df
+def main(argv: list = None) -> None:
+    """
+    Entry point of the assign command.
 
-test_parquet_path="processing/2025Test.parquet"
-test_df = pd.read_parquet(test_parquet_path)
-test_df = preprocess(test_df)
+    Parameters:
+        argv (list): Arguments, sys.argv[1:] if None.
+    """
+    parser = argparse.ArgumentParser(prog="assign", description="Assign emisoras to a batch of credits and write the result.")
+    parser.add_argument("--input", default=INPUT_PATH, help="credits to assign, .csv or Parquet")
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="emisora and bank price catalog")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--output", default="-", help="output path, '-' for stdout")
+    parser.add_argument("--no-detail", action="store_true", help="write only the assignment, without per-emisora values")
+    parser.add_argument("--no-cache", action="store_true", help="score every credit instead of reusing cached probabilities")
+    parser.add_argument("--trace-memory", action="store_true", help="log the memory each stage allocates (slower)")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="directory of the emisora models")
+    parser.add_argument("--artifact", default=PREPROCESSING_PATH, help="preprocessing artifact")
+    parser.add_argument("--state-dir", default=STATE_DIR, help="writable directory of the run log, caches and store")
+    args = parser.parse_args(argv)
 
-def test(x):
-    model = joblib.load(os.path.join("processing/modelOut", x))
-    test_df[list(set(model.feature_names_in_).difference(set(test_df.columns)))] = False
-    return model.predict_proba(test_df[model.feature_names_in_])
-files["predicts"] = files.files.apply(test)
-files["emisora"] = files.files.apply(lambda x: x[8:].split(".")[0])
+    # The same layout as the defaults, under the given state directory
+    def state(default: str) -> str:
+        return state_path(os.path.basename(default), state_dir=args.state_dir)
 
-def crearJson(x):
-    json = {}
-    files.apply(lambda model: json.update({model.emisora: min(model.predicts[x.name]) if len(model.predicts[x.name]) == 2 else 0}), axis=1)
-    x.dic.update({"probabilities":json})
-test_df.apply(crearJson, axis=1)
+    telemetry = Telemetry("preprocess_data", log_path=state(RUN_LOG_PATH), trace_memory=args.trace_memory)
+    cache = None if args.no_cache else PredictionCache(state(CACHE_DIR))
 
+    with stage(telemetry, "load", 0) as record:
+        batch = read_batch(args.input)
+        catalog = pd.read_csv(args.catalog)
+        record["rows_out"] = len(batch)
 
-emisoras_banco = pd.read_csv("data/EmisoraBancoPrecios.csv")
+    rows, result = run_assignment(batch, catalog, load_preprocessing(args.artifact), telemetry, cache, args.model_dir, state(STACK_CACHE_DIR))
+    if cache is not None:
+        stats = cache.last_stats
+        print(f"Prediction cache: {stats['hits']:,} hits, {stats['misses']:,} misses ({stats['hit_rate']:.1%})", file=sys.stderr)
 
-clients = test_df.set_index("idCredito")["dic"].to_dict()
+    with stage(telemetry, "store", len(rows)):
+        write_store(rows, result, catalog, state(STORE_DIR))
 
-mask_client_probabilities(emisoras_banco, clients)
-append_hit_costs(emisoras_banco, clients)
-append_profits(clients)
-print(json.dumps(calculate_best_emisora(clients), indent=4))
+    with stage(telemetry, "serialize", len(rows)):
+        sink = open_sink(args.format, args.output, detail=not args.no_detail)
+        try:
+            sink.write(rows, result)
+        finally:
+            sink.close()
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from processing.paths import data_path, package_path
+
+
+# Bump when the layout or the meaning of the artifact changes.
+PREPROCESSING_VERSION = 1
+PREPROCESSING_PATH = package_path("modelOut", "preprocessing.json")
+
+NUMERIC_COLS = ['montoCobrar', 'transCount', 'pagoAnterior', 'ratioAnterior', 'residualAnterior']
+CATEGORICAL_COLS = ['IdBanco_Credito', 'idEmisora']
+FEATURES = NUMERIC_COLS + CATEGORICAL_COLS
+
+
+def fit_preprocessing(df: pd.DataFrame, vocabularies: dict = None) -> dict:
+    """
+    Fits the frozen preprocessing used at scoring time: log1p of montoCobrar,
+    standard scaling of the numeric columns and one-hot dummies (first category
+    dropped) over fixed vocabularies.
+
+    Parameters:
+        df (pd.DataFrame): Reference batch the scaler is fit on.
+        vocabularies (dict): Extra categories per column, e.g. every bank in the
+            catalog. They are merged with the ones present in df.
+
+    Returns:
+        dict: Preprocessing artifact, see save_preprocessing.
+    """
+    # Only fitting needs scikit-learn; scoring uses the saved mean and scale
+    from sklearn.preprocessing import StandardScaler
+
+    df = df.dropna(subset=FEATURES)
+    numeric = df[NUMERIC_COLS].to_numpy(dtype=float)
+    numeric[:, 0] = np.log1p(numeric[:, 0])
+
+    scaler = StandardScaler().fit(numeric)
+
+    vocabularies = vocabularies or {}
+    vocab = {
+        col: sorted({int(v) for v in df[col].unique()} | {int(v) for v in vocabularies.get(col, [])})
+        for col in CATEGORICAL_COLS
+    }
+    feature_names = NUMERIC_COLS + [f"{col}_{v}" for col in CATEGORICAL_COLS for v in vocab[col][1:]]
+
+    return {
+        "version": PREPROCESSING_VERSION,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "numeric_cols": NUMERIC_COLS,
+        "scaler": {"mean": scaler.mean_.tolist(), "scale": scaler.scale_.tolist()},
+        "vocabularies": vocab,
+        "feature_names": feature_names,
+    }
+
+
+def save_preprocessing(artifact: dict, path: str = PREPROCESSING_PATH) -> None:
+    """
+    Writes the artifact as JSON next to the models.
+
+    The file holds:
+        version: PREPROCESSING_VERSION it was written with
+        created: fit timestamp
+        numeric_cols: scaled columns, in order
+        scaler: {'mean': [...], 'scale': [...]} one value per numeric column
+        vocabularies: {column: [category, ...]}, the first one is dropped
+        feature_names: exact column order of the transformed matrix
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(artifact, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def load_preprocessing(path: str = PREPROCESSING_PATH) -> dict:
+    """
+    Loads a preprocessing artifact and checks its version.
+    """
+    with open(path) as f:
+        artifact = json.load(f)
+    if artifact.get("version") != PREPROCESSING_VERSION:
+        raise ValueError(
+            f"Preprocessing artifact {path} has version {artifact.get('version')}, "
+            f"expected {PREPROCESSING_VERSION}"
+        )
+    return artifact
+
+
+def valid_rows(df: pd.DataFrame) -> np.ndarray:
+    """
+    Boolean mask of the rows that have every feature.
+    """
+    return df[FEATURES].notna().all(axis=1).to_numpy()
+
+
+def transform(artifact: dict, df: pd.DataFrame) -> np.ndarray:
+    """
+    Turns a batch into the model matrix with the frozen parameters. The shape
+    only depends on the artifact, never on which banks or emisoras are in df.
+
+    Parameters:
+        artifact (dict): Output of fit_preprocessing / load_preprocessing.
+        df (pd.DataFrame): Rows to transform, without missing features.
+
+    Returns:
+        np.ndarray: (rows, len(artifact['feature_names'])) float matrix.
+    """
+    n_numeric = len(artifact["numeric_cols"])
+    X = np.zeros((len(df), len(artifact["feature_names"])))
+
+    numeric = X[:, :n_numeric]
+    numeric[:] = df[artifact["numeric_cols"]].to_numpy(dtype=float)
+    numeric[:, 0] = np.log1p(numeric[:, 0])
+    numeric -= np.asarray(artifact["scaler"]["mean"])
+    numeric /= np.asarray(artifact["scaler"]["scale"])
+
+    rows = np.arange(len(df))
+    offset = n_numeric
+    for col in CATEGORICAL_COLS:
+        vocab = artifact["vocabularies"][col]
+        # Unknown categories get -1 and, like the dropped first one, no dummy
+        codes = pd.Index(vocab).get_indexer(df[col].to_numpy())
+        hit = codes > 0
+        X[rows[hit], offset + codes[hit] - 1] = 1.0
+        offset += len(vocab) - 1
+
+    return X
+
+
+if __name__ == "__main__":
+    from processing.registry import load_models
+
+    # Categories the models or the catalog know about but the reference batch may lack
+    banks = set(pd.read_csv(data_path("EmisoraBancoPrecios.csv"))["IdBanco"])
+    emisoras = set(pd.read_csv(data_path("EmisoraBancoPrecios.csv"))["idEmisora"])
+    for em_id, model in load_models().items():
+        emisoras.add(em_id)
+        for name in model.feature_names_in_:
+            if name.startswith("IdBanco_Credito_"):
+                banks.add(int(name[len("IdBanco_Credito_"):]))
+
+    artifact = fit_preprocessing(
+        pd.read_parquet(package_path("2025Test.parquet")),
+        {"IdBanco_Credito": banks, "idEmisora": emisoras},
+    )
+    save_preprocessing(artifact)
+    print(f"Saved {len(artifact['feature_names'])} features to {PREPROCESSING_PATH}")
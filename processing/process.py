@@ -1,7 +1,282 @@
 import pandas as pd
+import numpy as np
 import pickle
 import json
 
+from processing.telemetry import stage
+
+
+# ------------------ Matrix engine ------------------
+# Credits are rows and emisoras are columns. The dict functions further down
+# are thin wrappers over these and give bit-identical results.
+
+def catalog_sets(df: pd.DataFrame) -> tuple:
+    """
+    Builds the bank -> idEmisora sets and the INTERBANCARIO idEmisora set.
+
+    Parameters:
+        df (pd.DataFrame): Must contain 'idEmisora', 'IdBanco', and 'TipoEnvio'.
+
+    Returns:
+        tuple: (bank_to_ids, interbancario_ids)
+    """
+    bank_to_ids = df.groupby("IdBanco")["idEmisora"].apply(set).to_dict()
+    interbancario_ids = set(df[df["TipoEnvio"] == "INTERBANCARIO"]["idEmisora"])
+    return bank_to_ids, interbancario_ids
+
+
+def eligibility_mask(df: pd.DataFrame, banks, emisora_ids) -> np.ndarray:
+    """
+    Builds the credits x emisoras eligibility mask. A credit may use every
+    emisora of its own bank plus every INTERBANCARIO emisora.
+
+    Parameters:
+        df (pd.DataFrame): Must contain 'idEmisora', 'IdBanco', and 'TipoEnvio'.
+        banks (array-like): Bank of each credit, one per row.
+        emisora_ids (list): idEmisora of each column.
+
+    Returns:
+        np.ndarray: Boolean array of shape (len(banks), len(emisora_ids)).
+    """
+    bank_to_ids, interbancario_ids = catalog_sets(df)
+    return _eligibility_from_sets(bank_to_ids, interbancario_ids, banks, emisora_ids)
+
+
+def _eligibility_from_sets(bank_to_ids, interbancario_ids, banks, emisora_ids) -> np.ndarray:
+    # Only the distinct banks are checked in Python; rows are then gathered.
+    # A missing bank (None/NaN) gets code -1 and, as in the per-client loop,
+    # none of the bank emisoras: it indexes the empty row appended last.
+    codes, uniques = pd.factorize(pd.Series(list(banks), dtype=object), use_na_sentinel=True)
+    inter_row = np.array([em_id in interbancario_ids for em_id in emisora_ids], dtype=bool)
+    bank_rows = np.array(
+        [[em_id in bank_to_ids.get(bank, set()) for em_id in emisora_ids] for bank in uniques] + [[False] * len(emisora_ids)],
+        dtype=bool,
+    ).reshape(len(uniques) + 1, len(emisora_ids))
+    return bank_rows[codes] | inter_row
+
+
+def cost_vectors(df: pd.DataFrame, emisora_ids) -> tuple:
+    """
+    Aligns the hit costs of the catalog to the emisora columns.
+
+    Parameters:
+        df (pd.DataFrame): Must contain 'idEmisora', 'Costo_Hit_Miss', and 'Costo_Hit_Win'.
+        emisora_ids (list): idEmisora of each column.
+
+    Returns:
+        tuple: (costo_hit_miss, costo_hit_win, in_catalog) arrays of length len(emisora_ids).
+            Emisoras missing from the catalog get 0 costs and False in in_catalog.
+    """
+    cost_mapping = df.set_index("idEmisora")[["Costo_Hit_Miss", "Costo_Hit_Win"]].to_dict(orient="index")
+    in_catalog = np.array([em_id in cost_mapping for em_id in emisora_ids], dtype=bool)
+    chm = np.array([cost_mapping[em_id]["Costo_Hit_Miss"] if ok else 0 for em_id, ok in zip(emisora_ids, in_catalog)], dtype=float)
+    chw = np.array([cost_mapping[em_id]["Costo_Hit_Win"] if ok else 0 for em_id, ok in zip(emisora_ids, in_catalog)], dtype=float)
+    return chm, chw, in_catalog
+
+
+def hit_cost_matrices(probabilities: np.ndarray, chm: np.ndarray, chw: np.ndarray) -> tuple:
+    """
+    Spreads the cost vectors over the credits. A credit only pays the hit
+    costs of an emisora with a non-zero probability.
+
+    Returns:
+        tuple: (costo_hit_miss, costo_hit_win) arrays shaped like probabilities.
+    """
+    charged = probabilities != 0
+    return np.where(charged, chm, 0.0), np.where(charged, chw, 0.0)
+
+
+def expected_profits(probabilities: np.ndarray, payments: np.ndarray, chm: np.ndarray, chw: np.ndarray) -> np.ndarray:
+    """
+    Expected profit of sending each credit to each emisora.
+
+    Parameters:
+        probabilities (np.ndarray): (credits, emisoras) success probabilities.
+        payments (np.ndarray): (credits,) amount to collect.
+        chm (np.ndarray): Costo_Hit_Miss, broadcastable to probabilities.
+        chw (np.ndarray): Costo_Hit_Win, broadcastable to probabilities.
+
+    Returns:
+        np.ndarray: (credits, emisoras) expected profits.
+    """
+    penalty = np.where(chm == chw, chm, chm * (1 - probabilities))
+    return payments[:, None] * probabilities + penalty
+
+
+def best_emisora_index(profits: np.ndarray) -> np.ndarray:
+    """
+    Column of the highest profit per credit. Ties go to the first column and
+    NaN is never picked unless it is in the first column, same as Python's max.
+    """
+    nan = np.isnan(profits)
+    best = np.argmax(np.where(nan, -np.inf, profits), axis=1)
+    return np.where(nan[:, 0], 0, best)
+
+
+def assign(df: pd.DataFrame, probabilities: np.ndarray, banks, payments, emisora_ids, telemetry=None) -> dict:
+    """
+    Runs mask -> hit costs -> profits -> best emisora on whole arrays.
+
+    Parameters:
+        df (pd.DataFrame): Emisora catalog (EmisoraBancoPrecios.csv).
+        probabilities (np.ndarray): (credits, emisoras) model probabilities.
+        banks (array-like): Bank of each credit.
+        payments (array-like): Amount to collect of each credit.
+        emisora_ids (list): idEmisora of each column.
+        telemetry (Telemetry): Records the mask, cost, profit and assign stages.
+
+    Returns:
+        dict: {
+            'emisora_ids': list,
+            'probabilities': masked probabilities,
+            'costo_hit_miss': hit miss cost per credit and emisora,
+            'costo_hit_win': hit win cost per credit and emisora,
+            'profits': expected profits,
+            'best': best column per credit,
+            'best_emisora': best idEmisora per credit
+        }
+    """
+    emisora_ids = list(emisora_ids)
+    payments = np.asarray(payments, dtype=float)
+    n = len(payments)
+    with stage(telemetry, "mask", n):
+        mask = eligibility_mask(df, banks, emisora_ids)
+        probabilities = np.where(mask, probabilities, 0.0)
+
+    with stage(telemetry, "cost", n):
+        chm, chw, in_catalog = cost_vectors(df, emisora_ids)
+        missing = (probabilities != 0) & ~in_catalog
+        if missing.any():
+            raise KeyError(emisora_ids[int(np.nonzero(missing.any(axis=0))[0][0])])
+        hit_miss, hit_win = hit_cost_matrices(probabilities, chm, chw)
+
+    with stage(telemetry, "profit", n):
+        profits = expected_profits(probabilities, payments, hit_miss, hit_win)
+
+    with stage(telemetry, "assign", n):
+        best = best_emisora_index(profits)
+    return {
+        "emisora_ids": emisora_ids,
+        "probabilities": probabilities,
+        "costo_hit_miss": hit_miss,
+        "costo_hit_win": hit_win,
+        "profits": profits,
+        "best": best,
+        "best_emisora": np.asarray(emisora_ids, dtype=object)[best],
+    }
+
+
+def reprice(result: dict, payments, costs: dict) -> dict:
+    """
+    What-if of new hit costs on an existing assignment. Only the columns of
+    the repriced emisoras and the credits charged for them are recomputed,
+    so the result is the same as a full assign with the new catalog costs.
+
+    Parameters:
+        result (dict): Output of assign; left unchanged.
+        payments (array-like): Amount to collect of each credit, as passed to assign.
+        costs (dict): {idEmisora: (Costo_Hit_Miss, Costo_Hit_Win), ...}
+
+    Returns:
+        dict: Same keys as assign plus {
+            'expected_profit': total profit of the best emisoras,
+            'reassigned': True for the credits whose best emisora changed
+        }
+    """
+    payments = np.asarray(payments, dtype=float)
+    index = {em_id: j for j, em_id in enumerate(result["emisora_ids"])}
+    hit_miss = result["costo_hit_miss"].copy()
+    hit_win = result["costo_hit_win"].copy()
+    profits = result["profits"].copy()
+    touched = np.zeros(len(payments), dtype=bool)
+    for em_id, (chm, chw) in costs.items():
+        j = index.get(em_id)
+        if j is None:
+            continue
+        charged = np.flatnonzero(result["probabilities"][:, j] != 0)
+        probabilities = result["probabilities"][charged, j:j + 1]
+        hit_miss[charged, j] = chm
+        hit_win[charged, j] = chw
+        profits[charged, j] = expected_profits(
+            probabilities, payments[charged], hit_miss[charged, j:j + 1], hit_win[charged, j:j + 1]
+        )[:, 0]
+        touched[charged] = True
+
+    best = result["best"].copy()
+    rows = np.flatnonzero(touched)
+    best[rows] = best_emisora_index(profits[rows])
+    best_emisora = result["best_emisora"].copy()
+    best_emisora[rows] = np.asarray(result["emisora_ids"], dtype=object)[best[rows]]
+    return {
+        **result,
+        "costo_hit_miss": hit_miss,
+        "costo_hit_win": hit_win,
+        "profits": profits,
+        "best": best,
+        "best_emisora": best_emisora,
+        "expected_profit": float(profits[np.arange(len(best)), best].sum()),
+        "reassigned": best != result["best"],
+    }
+
+
+def to_client_dicts(result: dict, client_ids, banks, payments) -> dict:
+    """
+    Converts the output of assign back to the per-client dict structure.
+
+    Returns:
+        dict: {
+            client_id: {
+                'bank': bank,
+                'payment': payment,
+                'probabilities': {idEmisora: probability, ...},
+                'hit_costs': {idEmisora: {'Costo_Hit_Miss': ..., 'Costo_Hit_Win': ...}, ...},
+                'profits': {idEmisora: profit, ...},
+                'best_emisora': idEmisora
+            },
+            ...
+        }
+    """
+    emisora_ids = result["emisora_ids"]
+    clients = {}
+    rows = zip(
+        client_ids, banks, payments,
+        result["probabilities"].tolist(),
+        result["costo_hit_miss"].tolist(),
+        result["costo_hit_win"].tolist(),
+        result["profits"].tolist(),
+        result["best_emisora"].tolist(),
+    )
+    for client_id, bank, payment, probs, chm, chw, profits, best in rows:
+        clients[client_id] = {
+            "bank": bank,
+            "payment": payment,
+            "probabilities": dict(zip(emisora_ids, probs)),
+            "hit_costs": {
+                em_id: {"Costo_Hit_Miss": miss, "Costo_Hit_Win": win}
+                for em_id, prob, miss, win in zip(emisora_ids, probs, chm, chw)
+                if prob != 0
+            },
+            "profits": dict(zip(emisora_ids, profits)),
+            "best_emisora": best,
+        }
+    return clients
+
+
+def _group_by_columns(clients: dict, key: str) -> dict:
+    # Clients almost always share one key order; grouping keeps the
+    # first-key tie break of the dict version when they don't.
+    groups = {}
+    for client_id, data in clients.items():
+        groups.setdefault(tuple(data[key]), []).append(client_id)
+    return groups
+
+
+def _to_matrix(clients: dict, client_ids: list, key: str) -> np.ndarray:
+    return np.array([list(clients[c][key].values()) for c in client_ids], dtype=float).reshape(len(client_ids), -1)
+
+
+# ------------------ Dict API ------------------
+
 def mask_client_probabilities(df: pd.DataFrame, clients: dict) -> dict:
     """
     Keeps probabilities for a client's own bank and any INTERBANCARIO rows.
@@ -20,25 +295,19 @@ def mask_client_probabilities(df: pd.DataFrame, clients: dict) -> dict:
     Returns:
         dict: Same structure but with filtered probabilities.
     """
-    # Bank to idEmisora mapping
-    bank_to_ids = df.groupby("IdBanco")["idEmisora"].apply(set).to_dict()
-    print(bank_to_ids)
-
-    # INTERBANCARIO idEmisora set
-    interbancario_ids = set(df[df["TipoEnvio"] == "INTERBANCARIO"]["idEmisora"])
+    bank_to_ids, interbancario_ids = catalog_sets(df)
 
-    for client_id, data in clients.items():
-        client_bank = data["bank"]
-        prob_dict = data["probabilities"]
-
-        ids_from_bank = bank_to_ids.get(client_bank, set())
-        ids_to_keep = ids_from_bank.union(interbancario_ids)
+    for columns, client_ids in _group_by_columns(clients, "probabilities").items():
+        banks = [clients[c]["bank"] for c in client_ids]
+        keep = _eligibility_from_sets(bank_to_ids, interbancario_ids, banks, columns)
 
-        # Keep only bank + interbancario ids and remove NaN, 0, or 1 probabilities
-        data["probabilities"] = {
-            em_id: prob if em_id in ids_to_keep else 0
-            for em_id, prob in prob_dict.items()
-        }
+        # Keep only bank + interbancario ids
+        for client_id, row in zip(client_ids, keep.tolist()):
+            data = clients[client_id]
+            data["probabilities"] = {
+                em_id: prob if kept else 0
+                for (em_id, prob), kept in zip(data["probabilities"].items(), row)
+            }
 
     return clients
 
@@ -61,21 +330,16 @@ def append_hit_costs(df: pd.DataFrame, clients: dict) -> dict:
     """
     # Create a mapping of idEmisora to costs
     cost_mapping = df.set_index("idEmisora")[["Costo_Hit_Miss", "Costo_Hit_Win"]].to_dict(orient="index")
-    # Get keys with no 0 values
 
     for client_id, data in clients.items():
-        prob_dict = data["probabilities"]
-        # Get keys with no 0 values
-        keys_with_values = [k for k, v in prob_dict.items() if v != 0]
+        # Only keys with non 0 values get hit costs
         data["hit_costs"] = {
-            em_id: cost_mapping[em_id] if em_id in keys_with_values else None
-            for em_id in prob_dict.keys()
+            em_id: cost_mapping[em_id]
+            for em_id, prob in data["probabilities"].items()
+            if prob != 0
         }
-        # Remove keys with 0 values in data["hit_costs"]
-        data["hit_costs"] = {k: v for k, v in data["hit_costs"].items() if v is not None}
 
-
-    return clients  
+    return clients
 
 def compute_profits_for_client(client_data):
     payment = client_data["payment"]
@@ -145,8 +409,24 @@ def append_profits(clients):
         dict: Same structure but with appended profits.
     """
 
-    for client_id, data in clients.items():
-        data["profits"] = compute_profits_for_client(data)
+    for columns, client_ids in _group_by_columns(clients, "probabilities").items():
+        index = {em_id: j for j, em_id in enumerate(columns)}
+        probabilities = _to_matrix(clients, client_ids, "probabilities")
+        payments = np.array([clients[c]["payment"] for c in client_ids], dtype=float)
+
+        # Missing hit costs count as 0, same as compute_profits_for_client
+        chm = np.zeros_like(probabilities)
+        chw = np.zeros_like(probabilities)
+        for i, client_id in enumerate(client_ids):
+            for em_id, hit_cost in clients[client_id].get("hit_costs", {}).items():
+                j = index.get(em_id)
+                if j is not None:
+                    chm[i, j] = hit_cost.get("Costo_Hit_Miss", 0)
+                    chw[i, j] = hit_cost.get("Costo_Hit_Win", 0)
+
+        profits = expected_profits(probabilities, payments, chm, chw)
+        for client_id, row in zip(client_ids, profits.tolist()):
+            clients[client_id]["profits"] = dict(zip(columns, row))
 
     return clients
 
@@ -167,17 +447,12 @@ def calculate_best_emisora(clients):
         dict: Same structure but with appended best emisora.
     """
 
-    for client_id, data in clients.items():
-        profits = data["profits"]
-        # best_emisora = max(profits, key=profits.get)
-        # Filter out keys where the value is None
-        # valid_profits = {k: v for k, v in profits.items() if v is not None}
-
-        # # Then safely compute the minimum
-        # best_emisora = min(valid_profits, key=valid_profits.get) if valid_profits else None
-
-        best_emisora = max(profits, key=profits.get)
-        data["best_emisora"] = best_emisora
+    for columns, client_ids in _group_by_columns(clients, "profits").items():
+        if not columns:
+            raise ValueError("max() arg is an empty sequence")
+        best = best_emisora_index(_to_matrix(clients, client_ids, "profits"))
+        for client_id, j in zip(client_ids, best.tolist()):
+            clients[client_id]["best_emisora"] = columns[j]
 
     return clients
 
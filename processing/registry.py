@@ -0,0 +1,217 @@
+import hashlib
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from processing.paths import package_path, state_path
+from processing.scorer import stack_models
+
+
+MODEL_DIR = package_path("modelOut")
+MODEL_PREFIX = "emisora_"
+# Stacked arrays of recent model sets, so a fresh process skips unpickling the
+# models (and importing scikit-learn) when they have not changed
+STACK_CACHE_DIR = state_path("stacks")
+STACK_CACHE_FILES = 4
+_STACK_ARRAYS = ("theta", "var", "log_prior", "feature_mask", "n_classes")
+
+# Process-wide cache shared by the batch script and every Streamlit session.
+# _entries: path -> {'idEmisora', 'path', 'sha256', 'stat', 'mtime', 'model',
+#     'metadata'}; model and metadata stay None until first used
+# _stacks: (model hashes, feature layout) -> stacked models
+_lock = threading.Lock()
+_entries = {}
+_stacks = {}
+
+
+def model_path(em_id: int, model_dir: str = MODEL_DIR) -> str:
+    return os.path.join(model_dir, f"{MODEL_PREFIX}{em_id}.parquet")
+
+
+def model_files(model_dir: str = MODEL_DIR) -> dict:
+    """
+    Finds the emisora model files.
+
+    Returns:
+        dict: {idEmisora: path, ...} sorted by idEmisora.
+    """
+    files = {}
+    for file in os.listdir(model_dir):
+        if file.startswith(MODEL_PREFIX) and file.endswith(".parquet"):
+            files[int(file[len(MODEL_PREFIX):].split(".")[0])] = os.path.join(model_dir, file)
+    return dict(sorted(files.items()))
+
+
+def file_hash(path: str) -> str:
+    """
+    SHA-256 of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _entry(em_id: int, path: str) -> dict:
+    # The stat signature avoids hashing unchanged files; the hash decides
+    # whether the model is actually reloaded.
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    entry = _entries.get(path)
+    if entry is not None and entry["stat"] == signature:
+        return entry
+
+    sha256 = file_hash(path)
+    if entry is None or entry["sha256"] != sha256:
+        entry = {"idEmisora": em_id, "path": path, "sha256": sha256, "model": None, "metadata": None}
+    entry["stat"] = signature
+    entry["mtime"] = stat.st_mtime
+    _entries[path] = entry
+    return entry
+
+
+def _loaded(entry: dict) -> dict:
+    # joblib (and scikit-learn, to unpickle) is only imported by the first
+    # caller that needs the model objects themselves
+    if entry["model"] is None:
+        import joblib
+
+        model = joblib.load(entry["path"])
+        entry["model"] = model
+        entry["metadata"] = {
+            "idEmisora": entry["idEmisora"],
+            "path": entry["path"],
+            "sha256": entry["sha256"],
+            "feature_names": list(model.feature_names_in_),
+            "classes": [int(c) for c in model.classes_],
+            "trained": datetime.fromtimestamp(entry["mtime"]).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+    return entry
+
+
+def _refresh(model_dir: str, load: bool = True) -> dict:
+    entries = {em_id: _entry(em_id, path) for em_id, path in model_files(model_dir).items()}
+    return {em_id: _loaded(entry) for em_id, entry in entries.items()} if load else entries
+
+
+def load_models(model_dir: str = MODEL_DIR) -> dict:
+    """
+    Returns every emisora model, loading from disk only the files that changed
+    since the last call.
+
+    Returns:
+        dict: {idEmisora: GaussianNB, ...} sorted by idEmisora.
+    """
+    with _lock:
+        return {em_id: entry["model"] for em_id, entry in _refresh(model_dir).items()}
+
+
+def model_metadata(model_dir: str = MODEL_DIR) -> dict:
+    """
+    Returns:
+        dict: {idEmisora: {'idEmisora', 'path', 'sha256', 'feature_names',
+            'classes', 'trained'}, ...}
+    """
+    with _lock:
+        return {em_id: dict(entry["metadata"]) for em_id, entry in _refresh(model_dir).items()}
+
+
+def model_hashes(model_dir: str = MODEL_DIR) -> dict:
+    """
+    Returns the hashes of the model files without loading the models.
+
+    Returns:
+        dict: {idEmisora: sha256, ...} sorted by idEmisora.
+    """
+    with _lock:
+        return {em_id: entry["sha256"] for em_id, entry in _refresh(model_dir, load=False).items()}
+
+
+def _stack_path(key: tuple, cache_dir: str) -> str:
+    return os.path.join(cache_dir, hashlib.sha256(repr(key).encode()).hexdigest() + ".npz")
+
+
+def _read_stack(path: str) -> dict:
+    with np.load(path) as data:
+        stack = {name: data[name] for name in _STACK_ARRAYS}
+        stack["emisora_ids"] = data["emisora_ids"].tolist()
+        stack["feature_names"] = data["feature_names"].tolist()
+    return stack
+
+
+def _write_stack(stack: dict, path: str) -> None:
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(
+            f,
+            emisora_ids=np.asarray(stack["emisora_ids"], dtype=np.int64),
+            feature_names=np.asarray(stack["feature_names"], dtype=str),
+            **{name: stack[name] for name in _STACK_ARRAYS},
+        )
+    os.replace(tmp, path)
+    # Keep only the most recent files; older model sets are not coming back.
+    # Job workers share the directory, so another process may have removed a
+    # file already
+    files = []
+    for file in os.listdir(directory):
+        if file.endswith(".npz"):
+            try:
+                files.append((os.path.getmtime(os.path.join(directory, file)), os.path.join(directory, file)))
+            except FileNotFoundError:
+                pass
+    for _, old in sorted(files, reverse=True)[STACK_CACHE_FILES:]:
+        try:
+            os.remove(old)
+        except FileNotFoundError:
+            pass
+
+
+def get_stack(feature_names: list = None, model_dir: str = MODEL_DIR, cache_dir: str = STACK_CACHE_DIR) -> dict:
+    """
+    Returns the models in stacked form (see scorer.stack_models), rebuilt only
+    when a model file or the feature layout changes.
+
+    A stack built once is kept in cache_dir, keyed by the model hashes and the
+    layout, so later processes read the arrays instead of unpickling every
+    model. cache_dir None keeps it in memory only.
+
+    The stack carries a 'models_hash' entry identifying the exact model set.
+    """
+    with _lock:
+        entries = _refresh(model_dir, load=False)
+        hashes = tuple((em_id, entry["sha256"]) for em_id, entry in entries.items())
+        key = (hashes, tuple(feature_names) if feature_names is not None else None)
+        stack = _stacks.get(key)
+        if stack is None:
+            path = _stack_path(key, cache_dir) if cache_dir is not None else None
+            try:
+                stack = _read_stack(path) if path is not None else None
+            except FileNotFoundError:
+                # Not built yet, or pruned by another process
+                stack = None
+            if stack is None:
+                models = {em_id: _loaded(entry)["model"] for em_id, entry in entries.items()}
+                stack = stack_models(models, feature_names)
+                if path is not None:
+                    _write_stack(stack, path)
+            stack["models_hash"] = hashlib.sha256(repr(hashes).encode()).hexdigest()
+            # Stacks of older model sets are never asked for again
+            for old_key in [k for k in _stacks if k[0] != hashes]:
+                del _stacks[old_key]
+            _stacks[key] = stack
+        return stack
+
+
+def clear_cache() -> None:
+    """
+    Drops every model and stack cached in memory. The stack files on disk
+    are keyed by content and stay valid.
+    """
+    with _lock:
+        _entries.clear()
+        _stacks.clear()
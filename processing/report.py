@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+from processing.paths import data_path
+
+
+RESPUESTAS_PATH = data_path("CatRespuestaBancos.csv")
+
+# Outcome classes of CatRespuestaBancos.Status, plus one for unknown codes
+OUTCOMES = ("reintento", "perdida", "error", "sin_clasificar")
+
+REPORT_COLUMNS = [
+    "envios", "exitos", "reintentos", "reintentos_exitosos",
+    "montoCobrado", "costo", "ganancia", "perdida",
+] + [f"n_{outcome}" for outcome in OUTCOMES]
+
+
+def load_respuestas(path: str = RESPUESTAS_PATH) -> pd.DataFrame:
+    # Codes are text so "04" and "DD00021" keep their spelling; the file is Latin-1
+    return pd.read_csv(path, dtype=str, encoding="latin-1")
+
+
+def normalize_codes(codes) -> pd.Index:
+    """
+    Spells response codes the same way on both sides of the join: numeric
+    codes lose their leading zeros ('04' and 4 both become '4'), the rest
+    are kept as text.
+    """
+    codes = pd.Index(codes).astype(str).str.strip()
+    numeric = codes.str.fullmatch(r"\d+")
+    return pd.Index(np.where(numeric, codes.str.lstrip("0").str.pad(1, fillchar="0"), codes))
+
+
+def classify(codes, respuestas: pd.DataFrame) -> pd.Categorical:
+    """
+    Outcome of each IdRespuestaBanco: one categorical lookup against the
+    catalog, done once per distinct code.
+
+    Returns:
+        pd.Categorical: One of OUTCOMES per code.
+    """
+    lookup = dict(zip(normalize_codes(respuestas["IdRespuestaBanco"]), respuestas["Status"].str.strip().str.lower()))
+    positions, uniques = pd.factorize(pd.Series(codes))
+    statuses = [lookup.get(code) for code in normalize_codes(uniques)]
+    unclassified = OUTCOMES.index("sin_clasificar")
+    # Missing codes get position -1, which picks the trailing unclassified entry
+    outcome_codes = np.array([OUTCOMES.index(s) if s in OUTCOMES else unclassified for s in statuses] + [unclassified], dtype=np.int8)
+    return pd.Categorical.from_codes(outcome_codes[positions], categories=OUTCOMES)
+
+
+def outcome_frame(df: pd.DataFrame, respuestas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-row outcome columns of an upload, all computed column-wise.
+
+    Parameters:
+        df (pd.DataFrame): Upload with the schema.UPLOAD_SCHEMA columns.
+        respuestas (pd.DataFrame): CatRespuestaBancos.csv, see load_respuestas.
+
+    Returns:
+        pd.DataFrame: idEmisora, IdBanco_Credito, consecutivoCobro, resultado,
+            es_exito (fechaCobroBanco is set), es_reintento (transCount > 1),
+            montoCobrado, costo, ganancia (montoCobrado - Costo on success)
+            and perdida (-Costo otherwise).
+    """
+    es_exito = df["fechaCobroBanco"].notna().to_numpy()
+    costo = df["Costo"].to_numpy(dtype=float)
+    cobrado = df["montoCobrado"].to_numpy(dtype=float)
+    return pd.DataFrame({
+        "idEmisora": df["idEmisora"].to_numpy(),
+        "IdBanco_Credito": df["IdBanco_Credito"].to_numpy(),
+        "consecutivoCobro": df["consecutivoCobro"].to_numpy(),
+        "resultado": classify(df["IdRespuestaBanco"], respuestas),
+        "es_exito": es_exito,
+        "es_reintento": df["transCount"].to_numpy() > 1,
+        "montoCobrado": cobrado,
+        "costo": costo,
+        "ganancia": np.where(es_exito, cobrado - costo, 0.0),
+        "perdida": np.where(es_exito, 0.0, -costo),
+    })
+
+
+def post_mortem_report(outcomes: pd.DataFrame, by: list = None) -> pd.DataFrame:
+    """
+    Aggregates outcome_frame in a single groupby.
+
+    Parameters:
+        outcomes (pd.DataFrame): Output of outcome_frame.
+        by (list): Grouping columns, ['idEmisora', 'IdBanco_Credito'] by default.
+
+    Returns:
+        pd.DataFrame: One row per group with REPORT_COLUMNS and
+            pct_exito_reintentos.
+    """
+    by = by or ["idEmisora", "IdBanco_Credito"]
+    counts = pd.get_dummies(outcomes["resultado"], prefix="n", dtype=np.int64)
+    frame = pd.concat([
+        outcomes[by],
+        outcomes[["montoCobrado", "costo", "ganancia", "perdida"]],
+        counts,
+        pd.DataFrame({
+            "envios": 1,
+            "exitos": outcomes["es_exito"].astype(np.int64),
+            "reintentos": outcomes["es_reintento"].astype(np.int64),
+            "reintentos_exitosos": (outcomes["es_reintento"] & outcomes["es_exito"]).astype(np.int64),
+        }, index=outcomes.index),
+    ], axis=1)
+    report = frame.groupby(by, observed=True, sort=True)[REPORT_COLUMNS].sum().reset_index()
+    return add_rates(report)
+
+
+def add_rates(report: pd.DataFrame) -> pd.DataFrame:
+    reintentos = report["reintentos"].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        report["pct_exito_reintentos"] = np.where(reintentos > 0, report["reintentos_exitosos"] / reintentos * 100, 0.0)
+    return report
+
+
+def rollup(report: pd.DataFrame, by: list = None) -> pd.DataFrame:
+    """
+    Re-aggregates a report to coarser groups (by=None for the global totals,
+    as a one-row frame) without going back to the rows.
+    """
+    if not by:
+        return add_rates(report[REPORT_COLUMNS].sum().to_frame().T)
+    return add_rates(report.groupby(by, observed=True, sort=True)[REPORT_COLUMNS].sum().reset_index())
+
+
+def outcome_ids(outcomes: pd.DataFrame, resultado: str) -> pd.Series:
+    """
+    consecutivoCobro of the rows with the given outcome.
+    """
+    return outcomes.loc[outcomes["resultado"] == resultado, "consecutivoCobro"]
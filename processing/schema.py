@@ -0,0 +1,197 @@
+"""
+Column types of the tables the app reads: the Arrow schema of the uploads
+and history, and the compact pandas dtypes of the frames the pages cache.
+
+    python -m processing.schema report --years 2025
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from processing.paths import data_path
+
+
+# Low-cardinality text columns are stored as dictionaries
+_category = pa.dictionary(pa.int32(), pa.string())
+
+# Columns of the post-mortem CSVs uploaded in pages/3_Reporte_Post_Mortem.py.
+# Dates stay as text: fechaCobroBanco comes as dd/mm/yyyy and
+# fechaEnvioCobro as yyyy-mm-dd. IdRespuestaBanco is text too, bank codes
+# such as 'DD00021' are not numbers. Only the two dates may be empty.
+UPLOAD_SCHEMA = pa.schema([
+    pa.field("idListaCobro", pa.int64(), nullable=False),
+    pa.field("idCredito", pa.int64(), nullable=False),
+    pa.field("consecutivoCobro", pa.int64(), nullable=False),
+    pa.field("montoCobrar", pa.float64(), nullable=False),
+    pa.field("montoCobrado", pa.float64(), nullable=False),
+    pa.field("fechaCobroBanco", _category),
+    pa.field("IdBanco_Credito", pa.int32(), nullable=False),
+    pa.field("idEmisora", pa.int32(), nullable=False),
+    pa.field("IdBanco_Emisora", pa.int32(), nullable=False),
+    pa.field("TipoEnvio", _category, nullable=False),
+    pa.field("IdRespuestaBanco", _category, nullable=False),
+    pa.field("Descripcion", _category, nullable=False),
+    pa.field("Status", _category, nullable=False),
+    pa.field("idBanco", pa.int32(), nullable=False),
+    pa.field("fechaEnvioCobro", _category),
+    pa.field("transCount", pa.int64(), nullable=False),
+    pa.field("transSuccess", pa.float64(), nullable=False),
+    pa.field("transResidual", pa.float64(), nullable=False),
+    pa.field("pagoAnterior", pa.float64(), nullable=False),
+    pa.field("ratio_cobrado_cobrar", pa.float64(), nullable=False),
+    pa.field("residual_cobrar", pa.float64(), nullable=False),
+    pa.field("Costo", pa.float64(), nullable=False),
+    pa.field("residualAnterior", pa.float64(), nullable=False),
+    pa.field("ratioAnterior", pa.float64(), nullable=False),
+])
+
+
+# ------------------ pandas dtypes ------------------
+# Compact dtypes of the frames the Streamlit pages cache. Ids fit in int32 and
+# repeated text becomes categorical. Amounts and ratios go to float32 only
+# while they keep the cent (see compact); the catalog hit costs stay float64
+# because the cost simulator compares them with the costs of a stored run.
+CATALOG_DTYPES = {
+    "idEmisora": "int32",
+    "NombreEmisora": "category",
+    "IdBanco": "int32",
+    "Emisora": "category",
+    "TipoEnvio": "category",
+    "Nombre": "category",
+    "Costo_Hit_Miss": "float64",
+    "Costo_Hit_Win": "float64",
+}
+
+CREDITS_DTYPES = {
+    "idCredito": "int32",
+    "cobrables": "int8",
+}
+
+HISTORY_DTYPES = {
+    "idListaCobro": "int32",
+    "idCredito": "int32",
+    "consecutivoCobro": "int32",
+    "montoCobrar": "float32",
+    "montoCobrado": "float32",
+    "fechaCobroBanco": "category",
+    "IdBanco_Credito": "int32",
+    "idEmisora": "int32",
+    "IdBanco_Emisora": "int32",
+    "TipoEnvio": "category",
+    "IdRespuestaBanco": "category",
+    "Descripcion": "category",
+    "Status": "category",
+    "idBanco": "int32",
+    "fechaEnvioCobro": "category",
+    "transCount": "int32",
+    "transSuccess": "float32",
+    "transResidual": "float32",
+    "pagoAnterior": "float32",
+    "ratio_cobrado_cobrar": "float32",
+    "residual_cobrar": "float32",
+    "Costo": "float32",
+    "residualAnterior": "float32",
+    "ratioAnterior": "float32",
+    "year": "int16",
+}
+
+TABLE_DTYPES = {
+    "catalog": CATALOG_DTYPES,
+    "credits": CREDITS_DTYPES,
+    "history": HISTORY_DTYPES,
+}
+
+# Largest rounding a float32 column may take on, half a cent
+FLOAT32_TOLERANCE = 0.005
+
+
+def compact(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """
+    Casts the columns of df named in dtypes; other columns are left alone.
+
+    Integer columns with missing values, and float32 columns that would move
+    any value by more than FLOAT32_TOLERANCE, keep their type.
+
+    Raises:
+        ValueError: An integer column has values outside the range of its
+            dtype, which read_csv would wrap silently.
+    """
+    columns = {}
+    for name, dtype in dtypes.items():
+        if name not in df.columns or df[name].dtype == dtype:
+            continue
+        column = df[name]
+        if dtype != "category" and np.dtype(dtype).kind in "iu":
+            if column.isna().any():
+                # e.g. the year of rows without fechaEnvioCobro
+                continue
+            info = np.iinfo(dtype)
+            if column.min() < info.min or column.max() > info.max:
+                raise ValueError(f"Column {name} does not fit {dtype}")
+        elif dtype == "float32":
+            converted = column.astype("float32")
+            if (converted.astype("float64") - column).abs().max() > FLOAT32_TOLERANCE:
+                continue
+            columns[name] = converted
+            continue
+        columns[name] = column.astype(dtype)
+    return df.assign(**columns) if columns else df
+
+
+def read_csv(path: str, table: str, **kwargs) -> pd.DataFrame:
+    """
+    pd.read_csv with the compact dtypes of one of TABLE_DTYPES.
+    """
+    dtypes = TABLE_DTYPES[table]
+    # Text columns are parsed straight into categories; numbers are checked by compact
+    text = {name: dtype for name, dtype in dtypes.items() if dtype == "category"}
+    return compact(pd.read_csv(path, dtype=text, **kwargs), dtypes)
+
+
+def memory_report(frames: dict) -> pd.DataFrame:
+    """
+    Memory of each table with the default dtypes and with its compact ones.
+
+    Parameters:
+        frames (dict): {table: pd.DataFrame with default dtypes}, tables named
+            as in TABLE_DTYPES.
+
+    Returns:
+        pd.DataFrame: table, rows, default_mb, compact_mb, saved_mb, saved_%
+    """
+    records = []
+    for table, df in frames.items():
+        default = df.memory_usage(deep=True).sum() / 2 ** 20
+        lean = compact(df, TABLE_DTYPES[table]).memory_usage(deep=True).sum() / 2 ** 20
+        records.append({
+            "table": table,
+            "rows": len(df),
+            "default_mb": round(default, 3),
+            "compact_mb": round(lean, 3),
+            "saved_mb": round(default - lean, 3),
+            "saved_%": round(100 * (1 - lean / default), 1) if default else 0.0,
+        })
+    return pd.DataFrame(records)
+
+
+if __name__ == "__main__":
+    from processing.history import HISTORY_DIR, read_history
+
+    parser = argparse.ArgumentParser(description="Report the memory saved by the compact dtypes.")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--years", type=int, nargs="+", help="history years to load, all if omitted")
+    parser.add_argument("--history-dir", default=HISTORY_DIR)
+    args = parser.parse_args()
+
+    frames = {
+        "catalog": pd.read_csv(data_path("EmisoraBancoPrecios.csv")),
+        "credits": pd.read_csv(data_path("credits.csv"), usecols=list(CREDITS_DTYPES)),
+    }
+    if os.path.isdir(args.history_dir):
+        frames["history"] = read_history(years=args.years, history_dir=args.history_dir)
+    report = memory_report(frames)
+    print(report.to_string(index=False))
+    print(f"Total saved: {report['saved_mb'].sum():.2f} MB of {report['default_mb'].sum():.2f} MB")
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+
+# Class labels of the emisora models: 0 = failed charge, 1 = successful charge.
+CLASSES = (0, 1)
+
+# BLAS takes other kernels for a few rows, which round differently; smaller
+# batches are padded so a credit gets bit-identical probabilities however it
+# is batched.
+MIN_ROWS = 256
+
+
+def stack_models(models: dict, feature_names: list = None) -> dict:
+    """
+    Pulls the parameters of every emisora GaussianNB into stacked arrays
+    aligned to one feature layout.
+
+    Parameters:
+        models (dict): {idEmisora: fitted GaussianNB, ...}
+        feature_names (list): Layout to align to, e.g. the one of the
+            preprocessing artifact. Defaults to the union of the models' features.
+
+    Returns:
+        dict: {
+            'emisora_ids': [idEmisora, ...],
+            'feature_names': feature layout of the arrays,
+            'theta': (models, classes, features) means,
+            'var': (models, classes, features) variances,
+            'log_prior': (models, classes) log priors, -inf for absent classes,
+            'feature_mask': (models, features) True where the model uses the feature,
+            'n_classes': (models,) number of classes each model was fit with
+        }
+    """
+    emisora_ids = list(models)
+    if feature_names is None:
+        feature_names = []
+        for model in models.values():
+            for name in model.feature_names_in_:
+                if name not in feature_names:
+                    feature_names.append(name)
+    feature_names = list(feature_names)
+    index = {name: k for k, name in enumerate(feature_names)}
+    for em_id, model in models.items():
+        unknown = [name for name in model.feature_names_in_ if name not in index]
+        if unknown:
+            raise ValueError(f"Model of emisora {em_id} uses features outside the layout: {unknown}")
+
+    n_models, n_classes, n_features = len(emisora_ids), len(CLASSES), len(feature_names)
+    theta = np.zeros((n_models, n_classes, n_features))
+    var = np.ones((n_models, n_classes, n_features))
+    log_prior = np.full((n_models, n_classes), -np.inf)
+    feature_mask = np.zeros((n_models, n_features), dtype=bool)
+    fitted_classes = np.zeros(n_models, dtype=int)
+
+    for m, model in enumerate(models.values()):
+        columns = [index[name] for name in model.feature_names_in_]
+        feature_mask[m, columns] = True
+        fitted_classes[m] = len(model.classes_)
+        for i, label in enumerate(model.classes_):
+            c = CLASSES.index(label)
+            theta[m, c, columns] = model.theta_[i]
+            var[m, c, columns] = model.var_[i]
+            with np.errstate(divide="ignore"):
+                log_prior[m, c] = np.log(model.class_prior_[i])
+
+    return {
+        "emisora_ids": emisora_ids,
+        "feature_names": feature_names,
+        "theta": theta,
+        "var": var,
+        "log_prior": log_prior,
+        "feature_mask": feature_mask,
+        "n_classes": fitted_classes,
+    }
+
+
+def align_features(stack: dict, df: pd.DataFrame) -> np.ndarray:
+    """
+    Returns the feature matrix in the stacked layout. Features a batch does not
+    have (e.g. a dummy for a bank that is not in it) are filled with 0.
+    """
+    return df.reindex(columns=stack["feature_names"], fill_value=0).to_numpy(dtype=float)
+
+
+def joint_log_likelihood(stack: dict, X: np.ndarray) -> np.ndarray:
+    """
+    Joint log likelihood of every credit under every model and class, in one
+    pass of matrix products.
+
+    Parameters:
+        stack (dict): Output of stack_models.
+        X (np.ndarray): (credits, features) matrix in the stack's layout, from
+            preprocessing.transform or align_features.
+
+    Returns:
+        np.ndarray: (credits, models, classes) log likelihoods.
+    """
+    n_models, n_classes, n_features = stack["theta"].shape
+    mask = np.broadcast_to(stack["feature_mask"][:, None, :], stack["theta"].shape)
+
+    # sum((x - theta)^2 / var) expanded as x^2 w - 2 x theta w + theta^2 w, with
+    # w = 1 / var on the features each model uses and 0 elsewhere.
+    # A model fit on constant features (emisora 11, one class) has var = 0;
+    # its likelihoods come out inf/NaN, as in GaussianNB, and are dropped by
+    # client_probabilities, so only those warnings are silenced.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = np.where(mask, 1.0 / stack["var"], 0.0).reshape(-1, n_features)
+        theta = stack["theta"].reshape(-1, n_features)
+        quadratic = (X ** 2) @ w.T - 2.0 * (X @ (theta * w).T) + (theta ** 2 * w).sum(axis=1)
+        norm = -0.5 * np.where(mask, np.log(2.0 * np.pi * stack["var"]), 0.0).sum(axis=2)
+    jll = stack["log_prior"] + norm - 0.5 * quadratic.reshape(len(X), n_models, n_classes)
+    return jll
+
+
+def predict_proba(stack: dict, X: np.ndarray) -> np.ndarray:
+    """
+    Class probabilities of every credit under every emisora model.
+
+    Returns:
+        np.ndarray: (credits, models, classes). Classes a model was not fit
+            with get probability 0.
+    """
+    n = len(X)
+    if 0 < n < MIN_ROWS:
+        X = np.resize(X, (MIN_ROWS, X.shape[1]))
+    jll = joint_log_likelihood(stack, X)[:n]
+    top = jll.max(axis=2, keepdims=True)
+    log_norm = top + np.log(np.exp(jll - top).sum(axis=2, keepdims=True))
+    return np.exp(jll - log_norm)
+
+
+def positive_proba(stack: dict, X: np.ndarray) -> np.ndarray:
+    """
+    Probability of a successful charge, as a dense (credits, emisoras) matrix.
+    """
+    return predict_proba(stack, X)[:, :, CLASSES.index(1)]
@@ -0,0 +1,128 @@
+import json
+import sys
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from processing.pipeline import assignment_frame
+from processing.process import to_client_dicts
+
+
+FORMATS = ("ndjson", "parquet", "csv")
+
+
+def _slice_result(result: dict, rows: slice) -> dict:
+    return {key: value[rows] if isinstance(value, np.ndarray) else value for key, value in result.items()}
+
+
+def _open_text(path: str):
+    # '-' writes to stdout, which is not closed afterwards
+    if path == "-":
+        return sys.stdout, False
+    return open(path, "w", newline=""), True
+
+
+class NdjsonSink:
+    """
+    One compact JSON object per credit and line. With detail, each object has
+    the per-emisora probabilities, hit_costs and profits, as in
+    process.to_client_dicts; without it only the assignment.
+    """
+
+    def __init__(self, path: str = "-", detail: bool = True, chunk_rows: int = 10_000):
+        self.file, self._owns_file = _open_text(path)
+        self.detail = detail
+        self.chunk_rows = chunk_rows
+
+    def write(self, rows, result: dict) -> None:
+        for start in range(0, len(rows), self.chunk_rows):
+            chunk = slice(start, start + self.chunk_rows)
+            chunk_rows = rows.iloc[chunk]
+            part = _slice_result(result, chunk)
+            if self.detail:
+                clients = to_client_dicts(
+                    part,
+                    chunk_rows["idCredito"].tolist(),
+                    chunk_rows["IdBanco_Credito"].tolist(),
+                    chunk_rows["montoCobrar"].astype(float).tolist(),
+                )
+                lines = [json.dumps({"idCredito": client_id, **data}, separators=(",", ":")) for client_id, data in clients.items()]
+                self.file.write("\n".join(lines) + "\n")
+            else:
+                frame = assignment_frame(chunk_rows, part, detail=False)
+                # Older pandas leave out the trailing newline
+                text = frame.to_json(orient="records", lines=True, double_precision=15).rstrip("\n")
+                if text:
+                    self.file.write(text + "\n")
+            self.file.flush()
+
+    def close(self) -> None:
+        self.file.flush()
+        if self._owns_file:
+            self.file.close()
+
+
+class ParquetSink:
+    """
+    Appends each batch to a Parquet file, see pipeline.assignment_frame.
+    """
+
+    def __init__(self, path: str, detail: bool = True):
+        self.path = path
+        self.detail = detail
+        self.writer = None
+
+    def write(self, rows, result: dict) -> None:
+        table = pa.Table.from_pandas(assignment_frame(rows, result, self.detail), preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+class CsvSink:
+    """
+    Minimal CSV of idCredito, best_emisora, expected_profit.
+    """
+
+    columns = ["idCredito", "best_emisora", "expected_profit"]
+
+    def __init__(self, path: str = "-"):
+        self.file, self._owns_file = _open_text(path)
+        self.header = True
+
+    def write(self, rows, result: dict) -> None:
+        frame = assignment_frame(rows, result, detail=False)[self.columns]
+        frame.to_csv(self.file, index=False, header=self.header)
+        self.header = False
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.flush()
+        if self._owns_file:
+            self.file.close()
+
+
+def open_sink(kind: str, path: str = "-", detail: bool = True):
+    """
+    Creates a result sink. Every sink has write(rows, result), taking the
+    output of pipeline.run_assignment, and close().
+
+    Parameters:
+        kind (str): 'ndjson', 'parquet' or 'csv'.
+        path (str): Output path; '-' is stdout for ndjson and csv.
+        detail (bool): Include the per-emisora detail (ignored by csv).
+    """
+    if kind == "ndjson":
+        return NdjsonSink(path, detail)
+    if kind == "parquet":
+        if path == "-":
+            raise ValueError("The parquet sink needs an output path")
+        return ParquetSink(path, detail)
+    if kind == "csv":
+        return CsvSink(path)
+    raise ValueError(f"kind must be one of {FORMATS}, got {kind!r}")
@@ -0,0 +1,401 @@
+"""
+Assignment under operating limits: per-emisora send capacity, a budget on
+the expected hit costs, and minimum volumes per bank.
+
+    maximize    sum profit[i, j] x[i, j]
+    subject to  sum_j x[i, j] <= 1                      each credit at most once
+                sum_i x[i, j] <= capacity[j]            per emisora
+                sum_ij hit_cost[i, j] x[i, j] <= budget
+                sum_i sum_{j of bank b} x[i, j] >= minimum[b]
+                x[i, j] in {0, 1}, only on eligible pairs (probability != 0)
+
+Only the few capacity, budget and minimum rows couple the credits. Their
+Lagrangian dual is a convex function of one price per row, and for given
+prices every credit independently takes the emisora of highest reduced
+profit, one vectorized argmax. The prices are found with a trust-region
+cutting-plane method (each master problem is a small LP). Then a MILP is
+solved over the credits that are close to a tie under those prices, with
+every other credit fixed to its best emisora. The dual value bounds the
+optimum from above: a credit whose best option beats every other by more
+than the gap between the bound and that first solution takes it in every
+better solution, so a second MILP over the remaining credits is exact.
+
+Prices of one solve warm-start the next, which then takes a few
+iterations when only some costs or capacities changed.
+
+    python -m processing.solver --capacity 12=2000 9=2000 --budget 25000 --bank-minimum 2=500
+
+scipy is imported by the functions that call it, so importing this module
+stays as cheap as importing process.py.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from processing.paths import data_path, package_path
+
+
+MAX_ITERATIONS = 500
+TOLERANCE = 1e-7  # relative gap between the dual bound and the cut model
+
+# Trust region of a warm start, as a share of the largest earlier price
+WARM_RADIUS = 0.05
+
+# Credits whose best reduced profit is within this share of the profit
+# range of another option stay free in the first MILP
+TIE_TOLERANCE = 1e-4
+
+
+def expected_hit_costs(probabilities: np.ndarray, hit_miss: np.ndarray, hit_win: np.ndarray) -> np.ndarray:
+    """
+    Expected hit cost of sending each credit to each emisora: Costo_Hit_Win
+    when the charge succeeds and Costo_Hit_Miss when it fails.
+    """
+    return np.where(probabilities != 0, hit_miss * (1 - probabilities) + hit_win * probabilities, 0.0)
+
+
+def _limits(result: dict, catalog: pd.DataFrame, capacity: dict, budget: float, bank_minimums: dict) -> dict:
+    emisora_ids = result["emisora_ids"]
+    m = len(emisora_ids)
+    cap = np.full(m, np.inf)
+    for em_id, limit in (capacity or {}).items():
+        if em_id in emisora_ids:
+            cap[emisora_ids.index(em_id)] = limit
+
+    banks, minimums, bank_of = [], [], np.full(m, -1)
+    if bank_minimums:
+        if catalog is None:
+            raise ValueError("bank_minimums needs the catalog to map emisoras to banks")
+        emisora_bank = catalog.set_index("idEmisora")["IdBanco"].to_dict()
+        for b, (bank, minimum) in enumerate(bank_minimums.items()):
+            banks.append(bank)
+            minimums.append(minimum)
+            for j, em_id in enumerate(emisora_ids):
+                if emisora_bank.get(em_id) == bank:
+                    bank_of[j] = b
+    return {
+        "capacity": cap,
+        "capped": np.flatnonzero(np.isfinite(cap)),
+        "budget": budget,
+        "banks": banks,
+        "minimums": np.asarray(minimums, dtype=float),
+        "bank_of": bank_of,
+    }
+
+
+def _compact(profits: np.ndarray, costs: np.ndarray, eligible: np.ndarray) -> dict:
+    """
+    Packs the eligible pairs into (w, credits) arrays, w being the most
+    eligible emisoras of any credit, padded with -inf profits. One row per
+    option keeps every pass over the credits contiguous.
+    """
+    width = max(int(eligible.sum(axis=1).max()), 1) if len(eligible) else 1
+    columns = np.argsort(~eligible, axis=1, kind="stable")[:, :width]
+    rows = np.arange(len(eligible))[:, None]
+    valid = eligible[rows, columns]
+    return {
+        "columns": np.ascontiguousarray(columns.T),
+        "profits": np.ascontiguousarray(np.where(valid, profits[rows, columns], -np.inf).T),
+        "costs": np.ascontiguousarray(np.where(valid, costs[rows, columns], 0.0).T),
+        "valid": np.ascontiguousarray(valid.T),
+    }
+
+
+def _relax(pairs: dict, limits: dict, prices: tuple, m: int) -> tuple:
+    """
+    The Lagrangian relaxation for the given prices: every credit takes its
+    best reduced profit, or is not sent when that is negative.
+
+    Returns:
+        tuple: (dual value, subgradient, best column per credit or -1,
+            (w, credits) reduced profits of the packed pairs)
+    """
+    lam, mu, nu = prices
+    column_price = lam.copy()
+    has_bank = limits["bank_of"] >= 0
+    column_price[has_bank] -= nu[limits["bank_of"][has_bank]]
+    reduced = pairs["profits"] - column_price.take(pairs["columns"])
+    if limits["budget"] is not None:
+        reduced -= mu * pairs["costs"]
+
+    # argmax over the few options, one contiguous comparison each
+    value = reduced[0].copy()
+    chosen = pairs["columns"][0].copy()
+    spend_per_credit = pairs["costs"][0].copy()
+    for option in range(1, len(reduced)):
+        better = reduced[option] > value
+        np.copyto(value, reduced[option], where=better)
+        np.copyto(chosen, pairs["columns"][option], where=better)
+        np.copyto(spend_per_credit, pairs["costs"][option], where=better)
+    sent = value > 0
+    best = np.where(sent, chosen, -1)
+
+    # Weighted counts avoid indexing with the sent mask
+    load = np.bincount(chosen, weights=sent, minlength=m)
+    capped = limits["capped"]
+    dual = np.maximum(value, 0).sum() + lam[capped] @ limits["capacity"][capped]
+    gradient = [limits["capacity"][capped] - load[capped]]
+    if limits["budget"] is not None:
+        dual += mu * limits["budget"]
+        gradient.append([limits["budget"] - spend_per_credit @ sent])
+    if len(limits["banks"]):
+        bank_load = np.bincount(limits["bank_of"][has_bank], weights=load[has_bank], minlength=len(limits["banks"]))
+        dual -= nu @ limits["minimums"]
+        gradient.append(bank_load - limits["minimums"])
+    return dual, np.concatenate(gradient), best, reduced
+
+
+def _split(x: np.ndarray, limits: dict, m: int) -> tuple:
+    lam = np.zeros(m)
+    lam[limits["capped"]] = x[:len(limits["capped"])]
+    k = len(limits["capped"])
+    mu = 0.0
+    if limits["budget"] is not None:
+        mu = x[k]
+        k += 1
+    return lam, mu, x[k:k + len(limits["banks"])]
+
+
+def _dual_prices(pairs: dict, limits: dict, m: int, warm_start, max_iterations: int, tolerance: float) -> tuple:
+    """
+    Minimizes the Lagrangian dual with cutting planes inside a box around
+    the best prices so far; the box grows after serious steps that reach
+    its edge and shrinks after repeated null steps.
+
+    Returns:
+        tuple: (prices, dual value, lower bound on it, iterations)
+    """
+    from scipy.optimize import linprog
+
+    profits, costs = pairs["profits"][pairs["valid"]], pairs["costs"][pairs["valid"]]
+    # No price beyond these changes any credit's choice
+    spread = float(np.abs(profits).max()) + 1.0 if len(profits) else 1.0
+    upper = [spread] * len(limits["capped"])
+    if limits["budget"] is not None:
+        positive = costs > 0
+        upper.append(float((np.abs(profits[positive]) / costs[positive]).max()) + 1.0 if positive.any() else 1.0)
+    upper += [spread] * len(limits["banks"])
+    upper = np.asarray(upper)
+    d = len(upper)
+
+    center = np.zeros(d)
+    radius = upper.copy()
+    if warm_start is not None and len(warm_start) == d:
+        center = np.clip(np.asarray(warm_start, dtype=float), 0, upper)
+        # Prices move little when a few costs or limits change
+        radius = np.full(d, WARM_RADIUS * max(float(np.abs(center).max()), 1e-6))
+
+    cuts_a, cuts_b = [], []
+    best_value, best_prices, null_steps, lower = np.inf, center, 0, -np.inf
+    x = center
+    for iteration in range(1, max_iterations + 1):
+        value, gradient, _, _ = _relax(pairs, limits, _split(x, limits, m), m)
+        # A subgradient cut: dual(y) >= value + gradient (y - x) for every y
+        cuts_a.append(np.append(gradient, -1.0))
+        cuts_b.append(gradient @ x - value)
+        if best_value == np.inf or value < best_value - 1e-12 * abs(best_value):
+            best_value, best_prices, null_steps = value, x, 0
+            if np.any(np.isclose(np.abs(x - center), radius)):
+                radius = np.minimum(2 * radius, upper)
+            center = x
+        else:
+            null_steps += 1
+            if null_steps >= 3:
+                radius = np.maximum(radius / 2, 1e-9 * upper)
+                null_steps = 0
+        if d == 0:
+            return best_prices, best_value, best_value, iteration
+
+        low, high = np.maximum(0, center - radius), np.minimum(upper, center + radius)
+        master = linprog(
+            np.append(np.zeros(d), 1.0),
+            A_ub=np.array(cuts_a),
+            b_ub=np.array(cuts_b),
+            bounds=list(zip(low, high)) + [(None, None)],
+            method="highs",
+        )
+        x, model = master.x[:d], master.fun
+        # Unless the box binds, the cut model's minimum is global and bounds
+        # the dual from below
+        binding = ((x <= low + 1e-12) & (low > 0)) | ((x >= high - 1e-12) & (high < upper))
+        if not binding.any():
+            lower = max(lower, model)
+        if best_value - lower <= tolerance * max(1.0, abs(best_value)):
+            break
+    return best_prices, best_value, lower, iteration
+
+
+def _meets_limits(assignment: np.ndarray, costs: np.ndarray, limits: dict, m: int) -> bool:
+    sent = assignment >= 0
+    load = np.bincount(assignment[sent], minlength=m)
+    capped = limits["capped"]
+    if (load[capped] > limits["capacity"][capped]).any():
+        return False
+    if limits["budget"] is not None and costs[sent, assignment[sent]].sum() > limits["budget"] * (1 + 1e-12) + 1e-9:
+        return False
+    has_bank = limits["bank_of"] >= 0
+    bank_load = np.bincount(limits["bank_of"][has_bank], weights=load[has_bank], minlength=len(limits["banks"]))
+    return not (bank_load < limits["minimums"]).any()
+
+
+def _recover(pairs: dict, costs: np.ndarray, limits: dict, prices: tuple, m: int, slack: float, mip_gap: float = None):
+    """
+    Fixes every credit whose best reduced profit under prices beats its
+    other options by more than slack, and solves a MILP for the rest, to
+    HiGHS' default relative gap unless mip_gap is given.
+
+    Returns:
+        np.ndarray: Column per credit, -1 when not sent; None if infeasible.
+    """
+    from scipy.optimize import Bounds, LinearConstraint, milp
+    from scipy.sparse import csr_matrix
+
+    _, _, best, reduced = _relax(pairs, limits, prices, m)
+    valid = pairs["valid"]
+    top = np.where(best >= 0, reduced.max(axis=0), 0.0)
+    # A credit is free when another emisora, or not sending it, is nearly as good
+    near = valid & (reduced >= top - slack)
+    free = (near.sum(axis=0) + (np.abs(top) <= slack)) > 1
+    assignment = best.copy()
+
+    rows = np.flatnonzero(free)
+    if not len(rows):
+        return assignment if _meets_limits(assignment, costs, limits, m) else None
+    fixed = ~free & (best >= 0)
+    K, I = np.nonzero(near[:, rows])
+    credit = rows[I]
+    J = pairs["columns"][K, credit]
+    k = len(I)
+
+    constraints = [LinearConstraint(csr_matrix((np.ones(k), (I, np.arange(k))), shape=(len(rows), k)), -np.inf, 1)]
+    capped = limits["capped"]
+    if len(capped):
+        load = np.bincount(best[fixed], minlength=m)
+        column = {j: c for c, j in enumerate(capped)}
+        keep = np.isin(J, capped)
+        matrix = csr_matrix((np.ones(keep.sum()), ([column[j] for j in J[keep]], np.flatnonzero(keep))), shape=(len(capped), k))
+        constraints.append(LinearConstraint(matrix, -np.inf, limits["capacity"][capped] - load[capped]))
+    if limits["budget"] is not None:
+        spend = costs[fixed, best[fixed]].sum()
+        constraints.append(LinearConstraint(pairs["costs"][K, credit][None, :], -np.inf, limits["budget"] - spend))
+    if len(limits["banks"]):
+        bank_load = np.bincount(limits["bank_of"][best[fixed]] + 1, minlength=len(limits["banks"]) + 1)[1:]
+        banked = limits["bank_of"][J] >= 0
+        matrix = csr_matrix((np.ones(banked.sum()), (limits["bank_of"][J][banked], np.flatnonzero(banked))), shape=(len(limits["banks"]), k))
+        constraints.append(LinearConstraint(matrix, limits["minimums"] - bank_load, np.inf))
+
+    solution = milp(-pairs["profits"][K, credit], constraints=constraints, integrality=np.ones(k), bounds=Bounds(0, 1), options={"presolve": False, **({"mip_rel_gap": mip_gap} if mip_gap is not None else {})})
+    if solution.x is None:
+        return None
+    assignment[rows] = -1
+    chosen = solution.x > 0.5
+    assignment[credit[chosen]] = J[chosen]
+    return assignment
+
+
+def solve_assignment(result: dict, capacity: dict = None, budget: float = None, bank_minimums: dict = None, catalog: pd.DataFrame = None, warm_start: np.ndarray = None, max_iterations: int = MAX_ITERATIONS, tolerance: float = TOLERANCE) -> dict:
+    """
+    Assigns each credit to at most one emisora under operating limits.
+
+    Parameters:
+        result (dict): Output of process.assign, for its probabilities, hit
+            costs and profits.
+        capacity (dict): {idEmisora: maximum credits sent}, unlimited for
+            emisoras not listed.
+        budget (float): Maximum total expected hit cost (expected_hit_costs),
+            None for no budget.
+        bank_minimums (dict): {IdBanco: minimum credits sent through the
+            bank's emisoras}.
+        catalog (pd.DataFrame): EmisoraBancoPrecios.csv, needed for
+            bank_minimums.
+        warm_start (np.ndarray): 'prices' of an earlier solve with the same
+            limits listed.
+
+    Returns:
+        dict: {
+            'best': column per credit, -1 when not sent,
+            'best_emisora': idEmisora per credit, None when not sent,
+            'objective': total profit of the assignment,
+            'bound': upper bound on the optimal profit (dual value),
+            'gap': (bound - objective) / |bound|,
+            'load': credits per emisora column,
+            'spend': total expected hit cost,
+            'prices': dual prices, the warm start of the next solve,
+            'iterations', 'seconds'
+        }
+
+    Raises:
+        ValueError: When no assignment meets the limits.
+    """
+    start = time.perf_counter()
+    limits = _limits(result, catalog, capacity, budget, bank_minimums)
+    profits = result["profits"]
+    eligible = result["probabilities"] != 0
+    costs = expected_hit_costs(result["probabilities"], result["costo_hit_miss"], result["costo_hit_win"])
+    m = profits.shape[1]
+    pairs = _compact(profits, costs, eligible)
+
+    prices, bound, _, iterations = _dual_prices(pairs, limits, m, warm_start, max_iterations, tolerance)
+    split = _split(prices, limits, m)
+    valid = pairs["valid"]
+    scale = float(np.abs(pairs["profits"][valid]).max()) if valid.any() else 1.0
+    assignment = None
+    tie_tolerance = TIE_TOLERANCE
+    while assignment is None and tie_tolerance <= 1.0:
+        assignment = _recover(pairs, costs, limits, split, m, tie_tolerance * scale)
+        tie_tolerance *= 10
+
+    # Any better assignment only moves credits whose best option loses less
+    # than bound - objective; with no first assignment every credit is free
+    objective = float(profits[assignment >= 0, assignment[assignment >= 0]].sum()) if assignment is not None else -np.inf
+    slack = (bound - objective) * (1 + 1e-9) + 1e-9 * scale
+    if bound - objective > tolerance * max(1.0, abs(bound)):
+        exact = _recover(pairs, costs, limits, split, m, slack, tolerance)
+        if exact is not None and (assignment is None or profits[exact >= 0, exact[exact >= 0]].sum() > objective):
+            assignment = exact
+    if assignment is None:
+        raise ValueError("No assignment meets the capacities, budget and bank minimums")
+
+    sent = assignment >= 0
+    objective = float(profits[sent, assignment[sent]].sum())
+    emisora_ids = np.asarray(result["emisora_ids"], dtype=object)
+    return {
+        "best": assignment,
+        "best_emisora": np.where(sent, emisora_ids[np.maximum(assignment, 0)], None),
+        "objective": objective,
+        "bound": bound,
+        "gap": (bound - objective) / abs(bound) if bound else 0.0,
+        "load": np.bincount(assignment[sent], minlength=m),
+        "spend": float(costs[sent, assignment[sent]].sum()),
+        "prices": prices,
+        "iterations": iterations,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def _pairs(values: list, cast=float) -> dict:
+    return {int(key): cast(value) for key, value in (item.split("=") for item in values or [])}
+
+
+if __name__ == "__main__":
+    from processing.pipeline import run_assignment
+
+    parser = argparse.ArgumentParser(description="Assign 2025Test.parquet under capacity, budget and bank minimums.")
+    parser.add_argument("--input", default=package_path("2025Test.parquet"))
+    parser.add_argument("--capacity", nargs="*", metavar="EMISORA=CREDITS")
+    parser.add_argument("--budget", type=float)
+    parser.add_argument("--bank-minimum", nargs="*", metavar="BANK=CREDITS")
+    args = parser.parse_args()
+
+    catalog = pd.read_csv(data_path("EmisoraBancoPrecios.csv"))
+    _, result = run_assignment(pd.read_parquet(args.input), catalog)
+    solution = solve_assignment(result, _pairs(args.capacity), args.budget, _pairs(args.bank_minimum), catalog)
+    unconstrained = float(result["profits"][np.arange(len(result["best"])), result["best"]].sum())
+    print(
+        f"{len(result['best']):,} credits in {solution['seconds']:.2f} s ({solution['iterations']} iterations): "
+        f"profit {solution['objective']:,.2f} (bound {solution['bound']:,.2f}, gap {solution['gap']:.2e}), "
+        f"unconstrained {unconstrained:,.2f}, hit costs {solution['spend']:,.2f}, "
+        f"{int((solution['best'] < 0).sum()):,} not sent"
+    )
@@ -0,0 +1,208 @@
+"""
+Reads ListaCobroDetalle-shaped rows from a SQL database in fixed-size chunks
+and assigns them chunk by chunk, the way stream.py does for Parquet files.
+
+Any DB-API 2.0 connection works. Rows come through cursor.fetchmany, so only
+one chunk is ever in memory; on PostgreSQL (psycopg2) the cursor is a named,
+server-side one and the database keeps the rest of the result. The date range
+and the banks are part of the WHERE clause, so only matching rows are sent.
+A date filter leaves out the rows without fechaEnvioCobro (most rows of an
+upload that was never sent) unless --include-undated is given.
+
+    python -m processing.sql_source cobros.db output.parquet --since 2025-01-01 --banks 2 12
+"""
+import argparse
+import re
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from processing.pipeline import run_assignment
+from processing.prediction_cache import PredictionCache
+from processing.preprocessing import FEATURES, load_preprocessing
+from processing.sinks import FORMATS, open_sink
+from processing.stream import CATALOG_PATH
+from processing.telemetry import Telemetry, peak_rss_mb
+
+
+TABLE = "ListaCobroDetalle"
+CHUNK_SIZE = 50_000
+# yyyy-mm-dd bounds compare in order with text, DATE and DATETIME columns; the
+# upper bound is the start of the next day, so 'yyyy-mm-dd hh:mm:ss' values of
+# the last day are read too
+DATE_COLUMN = "fechaEnvioCobro"
+BANK_COLUMN = "IdBanco_Credito"
+COLUMNS = FEATURES + ["idCredito"]
+
+# Table and column names go into the SQL text, values only as parameters
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
+_PLACEHOLDERS = {"qmark": "?", "format": "%s", "pyformat": "%s"}
+
+
+def _identifier(name: str) -> str:
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Not a valid SQL identifier: {name!r}")
+    return name
+
+
+def build_query(since: str = None, until: str = None, banks: list = None, columns: list = COLUMNS, table: str = TABLE, paramstyle: str = "qmark", include_undated: bool = False) -> tuple:
+    """
+    SELECT of the scoring columns with the filters pushed into the WHERE clause.
+
+    Parameters:
+        since (str): First fechaEnvioCobro to read, yyyy-mm-dd, inclusive.
+        until (str): Last fechaEnvioCobro to read, yyyy-mm-dd, inclusive,
+            whole day.
+        banks (list): IdBanco_Credito values to read, all if None.
+        paramstyle (str): The driver's DB-API paramstyle: 'qmark' (sqlite3) or
+            'format'/'pyformat' (psycopg2, pymysql).
+        include_undated (bool): Also read the rows with a NULL
+            fechaEnvioCobro when since or until is given; a date filter
+            leaves them out otherwise.
+
+    Returns:
+        tuple: (sql, params)
+    """
+    mark = _PLACEHOLDERS[paramstyle]
+    conditions, params = [], []
+    dates = []
+    if since is not None:
+        dates.append(f"{DATE_COLUMN} >= {mark}")
+        params.append(date.fromisoformat(since).isoformat())
+    if until is not None:
+        dates.append(f"{DATE_COLUMN} < {mark}")
+        params.append((date.fromisoformat(until) + timedelta(days=1)).isoformat())
+    if dates:
+        condition = " AND ".join(dates)
+        conditions.append(f"({condition} OR {DATE_COLUMN} IS NULL)" if include_undated else condition)
+    if banks is not None:
+        conditions.append(f"{BANK_COLUMN} IN ({', '.join([mark] * len(banks))})" if banks else "1 = 0")
+        params.extend(int(bank) for bank in banks)
+
+    sql = f"SELECT {', '.join(_identifier(c) for c in columns)} FROM {_identifier(table)}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return sql, params
+
+
+def _cursor(connection):
+    # psycopg2 keeps the result of a named cursor on the server; other drivers
+    # (sqlite3 among them) step through the result as fetchmany asks for rows
+    try:
+        return connection.cursor(name="credifiel_sql_source")
+    except TypeError:
+        return connection.cursor()
+
+
+def read_chunks(connection, since: str = None, until: str = None, banks: list = None, chunk_size: int = CHUNK_SIZE, columns: list = COLUMNS, table: str = TABLE, paramstyle: str = "qmark", stats: dict = None, include_undated: bool = False):
+    """
+    Yields the matching rows as DataFrames of at most chunk_size rows.
+
+    Parameters:
+        connection: DB-API 2.0 connection.
+        stats (dict): Filled in as chunks are read with 'chunks', 'rows',
+            'fetch_seconds' (time spent waiting for the database) and
+            'fetch_rows_per_sec'.
+
+    Yields:
+        pd.DataFrame: One chunk, with the columns in the given order.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(chunks=0, rows=0, fetch_seconds=0.0, fetch_rows_per_sec=0.0)
+    sql, params = build_query(since, until, banks, columns, table, paramstyle, include_undated)
+    cursor = _cursor(connection)
+    try:
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        while True:
+            records = cursor.fetchmany(chunk_size)
+            stats["fetch_seconds"] += time.perf_counter() - start
+            if not records:
+                break
+            stats["chunks"] += 1
+            stats["rows"] += len(records)
+            stats["fetch_rows_per_sec"] = stats["rows"] / stats["fetch_seconds"] if stats["fetch_seconds"] else 0.0
+            yield pd.DataFrame.from_records(records, columns=columns)
+            start = time.perf_counter()
+    finally:
+        cursor.close()
+
+
+def sql_assignment(connection, output_path: str, since: str = None, until: str = None, banks: list = None, chunk_size: int = CHUNK_SIZE, detail: bool = True, catalog: pd.DataFrame = None, output_format: str = "parquet", table: str = TABLE, paramstyle: str = "qmark", cache: PredictionCache = None, include_undated: bool = False) -> dict:
+    """
+    Scores and assigns the rows of a SQL table chunk by chunk, appending each
+    result to output_path. Only one chunk is held in memory at a time.
+
+    Parameters:
+        connection: DB-API 2.0 connection.
+        output_path (str): File to write, '-' for stdout with ndjson and csv.
+        since, until, banks, include_undated: Filters, see build_query.
+        chunk_size (int): Rows fetched and assigned at a time.
+        Others as in stream.stream_assignment.
+
+    Returns:
+        dict: {'rows_in', 'rows_out', 'chunks', 'seconds', 'rows_per_sec',
+            'fetch_seconds', 'fetch_rows_per_sec', 'peak_rss_mb'}
+    """
+    catalog = catalog if catalog is not None else pd.read_csv(CATALOG_PATH)
+    artifact = load_preprocessing()
+    telemetry = Telemetry("sql")
+
+    start = time.perf_counter()
+    fetch = {}
+    rows_out = 0
+    sink = open_sink(output_format, output_path, detail)
+    try:
+        for chunk in read_chunks(connection, since, until, banks, chunk_size, table=table, paramstyle=paramstyle, stats=fetch, include_undated=include_undated):
+            rows, result = run_assignment(chunk, catalog, artifact, telemetry, cache)
+            sink.write(rows, result)
+            rows_out += len(rows)
+    finally:
+        sink.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows_in": fetch["rows"],
+        "rows_out": rows_out,
+        "chunks": fetch["chunks"],
+        "seconds": seconds,
+        "rows_per_sec": fetch["rows"] / seconds if seconds else 0.0,
+        "fetch_seconds": fetch["fetch_seconds"],
+        "fetch_rows_per_sec": fetch["fetch_rows_per_sec"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assign emisoras to the rows of a SQLite table, chunk by chunk.")
+    parser.add_argument("database", help="SQLite database file")
+    parser.add_argument("output", help="output path, '-' for stdout with ndjson and csv")
+    parser.add_argument("--table", default=TABLE)
+    parser.add_argument("--since", help="first fechaEnvioCobro, yyyy-mm-dd")
+    parser.add_argument("--until", help="last fechaEnvioCobro, yyyy-mm-dd")
+    parser.add_argument("--banks", type=int, nargs="+", help="IdBanco_Credito values to read")
+    parser.add_argument("--include-undated", action="store_true", help="with --since/--until, also read rows without fechaEnvioCobro")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--no-detail", action="store_true", help="write only the assignment, without per-emisora columns")
+    parser.add_argument("--cache", action="store_true", help="reuse cached probabilities of unchanged credits")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.database)
+    try:
+        stats = sql_assignment(
+            connection, args.output, args.since, args.until, args.banks, args.chunk_size,
+            not args.no_detail, output_format=args.format, table=args.table,
+            cache=PredictionCache() if args.cache else None, include_undated=args.include_undated,
+        )
+    finally:
+        connection.close()
+    print(
+        f"{stats['rows_in']:,} rows in {stats['chunks']} chunks, {stats['seconds']:.2f} s "
+        f"({stats['rows_per_sec']:,.0f} rows/s); fetch {stats['fetch_seconds']:.2f} s "
+        f"({stats['fetch_rows_per_sec']:,.0f} rows/s), peak RSS {stats['peak_rss_mb']:.0f} MB",
+        file=sys.stderr,
+    )
@@ -0,0 +1,189 @@
+import glob
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from processing.cube import build_cube
+from processing.paths import state_path
+
+STORE_DIR = state_path("store")
+TABLES = ("assignments", "probabilities", "profits", "hit_costs", "cube_cells", "cube_sketches")
+# Each write_store is a generation directory of store_dir; the CURRENT file
+# names the one readers use. Older generations are kept for readers that
+# resolved CURRENT just before a swap
+CURRENT = "CURRENT"
+KEEP_GENERATIONS = 2
+
+# Catalog columns joined to the assignment of each credit
+ASSIGNMENT_CATALOG_COLS = ["NombreEmisora", "IdBanco", "TipoEnvio", "Nombre", "Costo_Hit_Miss", "Costo_Hit_Win"]
+
+
+def current_dir(store_dir: str = STORE_DIR) -> str:
+    """
+    Returns:
+        str: Directory of the current generation of the store. Tables read
+            from it all come from the same write_store, even if another one
+            is swapped in meanwhile. store_dir itself for stores written
+            before generations.
+    """
+    try:
+        with open(os.path.join(store_dir, CURRENT)) as f:
+            return os.path.join(store_dir, f.read().strip())
+    except FileNotFoundError:
+        return store_dir
+
+
+def table_path(name: str, store_dir: str = STORE_DIR) -> str:
+    return os.path.join(current_dir(store_dir), f"{name}.arrow")
+
+
+def _names(catalog: pd.DataFrame, emisora_ids) -> tuple:
+    # One dictionary entry per named emisora column, so long tables only store
+    # indices. Returns (dictionary index of each column, -1 for emisoras
+    # missing from the catalog, and the dictionary)
+    names = catalog.drop_duplicates("idEmisora").set_index("idEmisora")["NombreEmisora"].reindex(list(emisora_ids))
+    known = names.notna().to_numpy()
+    codes = np.where(known, np.cumsum(known) - 1, -1).astype(np.int32)
+    return codes, pa.array(names[known].tolist(), pa.string())
+
+
+def _name_array(column_codes: np.ndarray, names: tuple) -> pa.DictionaryArray:
+    # Null name for the emisoras missing from the catalog
+    codes = names[0][column_codes]
+    return pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0), names[1])
+
+
+def build_tables(rows: pd.DataFrame, result: dict, catalog: pd.DataFrame) -> dict:
+    """
+    Turns one assignment into the store tables, already joined to the
+    emisora names.
+
+    Parameters:
+        rows (pd.DataFrame): Scored rows returned by pipeline.run_assignment.
+        result (dict): Output of process.assign.
+        catalog (pd.DataFrame): EmisoraBancoPrecios.csv.
+
+    Returns:
+        dict: {
+            'assignments': client_id, bank, payment, best_emisora, expected_profit
+                and the catalog columns of the best emisora,
+            'probabilities': client_id, idEmisora, NombreEmisora, probability,
+            'profits': client_id, idEmisora, NombreEmisora, profit,
+            'hit_costs': client_id, idEmisora, NombreEmisora, Costo_Hit_Miss,
+                Costo_Hit_Win for the emisoras with non-zero probability,
+            'cube_cells', 'cube_sketches': the (bank, emisora) summary, see
+                cube.build_cube
+        } as pyarrow Tables.
+    """
+    client_ids = rows["idCredito"].to_numpy()
+    emisora_ids = np.asarray(result["emisora_ids"], dtype=np.int64)
+    n, m = result["probabilities"].shape
+    names = _names(catalog, emisora_ids)
+
+    # Long tables: credit i, emisora j -> row i * m + j
+    column_codes = np.tile(np.arange(m, dtype=np.int32), n)
+    long_columns = {
+        "client_id": pa.array(np.repeat(client_ids, m)),
+        "idEmisora": pa.array(emisora_ids[column_codes]),
+        "NombreEmisora": _name_array(column_codes, names),
+    }
+    probabilities = pa.table({**long_columns, "probability": result["probabilities"].ravel()})
+    profits = pa.table({**long_columns, "profit": result["profits"].ravel()})
+
+    charged = np.flatnonzero(result["probabilities"].ravel() != 0)
+    hit_costs = pa.table({
+        "client_id": pa.array(client_ids[charged // m]),
+        "idEmisora": pa.array(emisora_ids[charged % m]),
+        "NombreEmisora": _name_array(column_codes[charged], names),
+        "Costo_Hit_Miss": result["costo_hit_miss"].ravel()[charged],
+        "Costo_Hit_Win": result["costo_hit_win"].ravel()[charged],
+    })
+
+    best = pd.DataFrame({
+        "client_id": client_ids,
+        "bank": rows["IdBanco_Credito"].to_numpy(),
+        "payment": rows["montoCobrar"].to_numpy(dtype=float),
+        "best_emisora": result["best_emisora"].astype(np.int64),
+        "expected_profit": result["profits"][np.arange(n), result["best"]],
+    })
+    best_catalog = catalog.drop_duplicates("idEmisora").set_index("idEmisora")[ASSIGNMENT_CATALOG_COLS].astype({"IdBanco": "Int64"})
+    # Left join: a credit whose emisora is not in the catalog (possible when
+    # none of its probabilities is charged) keeps its row, with null catalog columns
+    best = best.join(best_catalog, on="best_emisora", how="left")
+    assignments = pa.Table.from_pandas(best, preserve_index=False)
+    cells, sketches = build_cube(rows, result, catalog)
+
+    return {
+        "assignments": assignments,
+        "probabilities": probabilities,
+        "profits": profits,
+        "hit_costs": hit_costs,
+        "cube_cells": pa.Table.from_pandas(cells, preserve_index=False),
+        "cube_sketches": pa.Table.from_pandas(sketches, preserve_index=False),
+    }
+
+
+def write_store(rows: pd.DataFrame, result: dict, catalog: pd.DataFrame, store_dir: str = STORE_DIR) -> None:
+    """
+    Writes the assignment as uncompressed Arrow IPC files, which read_table can
+    memory-map. All the tables are written into a new generation directory
+    that replaces the current one at once, so readers never see tables of
+    two different writes; concurrent writers each write their own.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    # Under a temporary name, so pruning never takes a generation still being written
+    tmp = os.path.join(store_dir, f"tmp-{os.getpid()}-{uuid.uuid4().hex[:6]}")
+    os.makedirs(tmp)
+    try:
+        for name, table in build_tables(rows, result, catalog).items():
+            with pa.OSFile(os.path.join(tmp, f"{name}.arrow"), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        generation = f"gen-{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        os.rename(tmp, os.path.join(store_dir, generation))
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(store_dir, f"{CURRENT}.{os.getpid()}.{uuid.uuid4().hex[:6]}.tmp")
+    with open(pointer, "w") as f:
+        f.write(generation)
+    os.replace(pointer, os.path.join(store_dir, CURRENT))
+
+    current = os.path.basename(current_dir(store_dir))
+    generations = sorted(os.path.basename(path) for path in glob.glob(os.path.join(store_dir, "gen-*")))
+    for old in generations[:-KEEP_GENERATIONS]:
+        if old != current:
+            shutil.rmtree(os.path.join(store_dir, old), ignore_errors=True)
+    # Tables of a store written before generations
+    for name in TABLES:
+        try:
+            os.remove(os.path.join(store_dir, f"{name}.arrow"))
+        except FileNotFoundError:
+            pass
+
+
+def read_table(name: str, columns: list = None, store_dir: str = STORE_DIR) -> pd.DataFrame:
+    """
+    Reads one store table through a memory map, materializing only the
+    requested columns.
+
+    Parameters:
+        name (str): One of TABLES.
+        columns (list): Columns to load, all of them if None.
+        store_dir (str): The store, or a generation of it from current_dir
+            to read several tables of the same write.
+
+    Returns:
+        pd.DataFrame: The table; emisora names come back as categoricals.
+    """
+    with pa.memory_map(table_path(name, store_dir), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas()
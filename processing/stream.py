@@ -0,0 +1,89 @@
+import argparse
+import sys
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from processing.paths import data_path
+from processing.pipeline import run_assignment
+from processing.prediction_cache import PredictionCache
+from processing.preprocessing import FEATURES, load_preprocessing
+from processing.sinks import FORMATS, open_sink
+from processing.telemetry import Telemetry, peak_rss_mb
+
+
+CATALOG_PATH = data_path("EmisoraBancoPrecios.csv")
+
+
+def stream_assignment(input_path: str, output_path: str, batch_size: int = 50_000, detail: bool = True, catalog: pd.DataFrame = None, output_format: str = "parquet", cache: PredictionCache = None) -> dict:
+    """
+    Scores and assigns a Parquet file of credits batch by batch, appending each
+    result to output_path. Only one batch is held in memory at a time.
+
+    Parameters:
+        input_path (str): Parquet with the 2025Test.parquet columns.
+        output_path (str): File to write, '-' for stdout with ndjson and csv.
+        batch_size (int): Rows read per record batch.
+        detail (bool): Write the per-emisora probability and profit columns.
+        catalog (pd.DataFrame): EmisoraBancoPrecios.csv, read if not given.
+        output_format (str): 'parquet', 'ndjson' or 'csv', see sinks.open_sink.
+        cache (PredictionCache): Reuse cached probabilities of unchanged credits.
+
+    Returns:
+        dict: {'rows_in', 'rows_out', 'batches', 'seconds', 'rows_per_sec',
+            'peak_rss_mb', 'cache_hits'}
+    """
+    catalog = catalog if catalog is not None else pd.read_csv(CATALOG_PATH)
+    artifact = load_preprocessing()
+    # One record per stage and batch; memory tracing would slow large streams
+    telemetry = Telemetry("stream")
+    source = pq.ParquetFile(input_path)
+
+    start = time.perf_counter()
+    rows_in = rows_out = batches = cache_hits = 0
+    sink = open_sink(output_format, output_path, detail)
+    try:
+        for batch in source.iter_batches(batch_size=batch_size, columns=FEATURES + ["idCredito"]):
+            rows, result = run_assignment(batch.to_pandas(), catalog, artifact, telemetry, cache)
+            if cache is not None and cache.last_stats is not None:
+                cache_hits += cache.last_stats["hits"]
+            sink.write(rows, result)
+            rows_in += batch.num_rows
+            rows_out += len(rows)
+            batches += 1
+    finally:
+        sink.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "batches": batches,
+        "seconds": seconds,
+        "rows_per_sec": rows_in / seconds if seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "cache_hits": cache_hits,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assign emisoras to a Parquet of credits, batch by batch.")
+    parser.add_argument("input", help="input Parquet")
+    parser.add_argument("output", help="output path, '-' for stdout with ndjson and csv")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--no-detail", action="store_true", help="write only the assignment, without per-emisora columns")
+    parser.add_argument("--cache", action="store_true", help="reuse cached probabilities of unchanged credits")
+    args = parser.parse_args()
+
+    cache = PredictionCache() if args.cache else None
+    stats = stream_assignment(args.input, args.output, args.batch_size, not args.no_detail, output_format=args.format, cache=cache)
+    # stderr, so it does not mix with results written to stdout
+    print(
+        f"{stats['rows_in']:,} rows in {stats['batches']} batches, {stats['seconds']:.2f} s "
+        f"({stats['rows_per_sec']:,.0f} rows/s), peak RSS {stats['peak_rss_mb']:.0f} MB",
+        file=sys.stderr,
+    )
+    if cache is not None:
+        print(f"Prediction cache: {stats['cache_hits']:,} of {stats['rows_out']:,} rows", file=sys.stderr)
@@ -0,0 +1,127 @@
+import json
+import os
+import resource
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from processing.paths import state_path
+
+
+RUN_LOG_PATH = state_path("runs.jsonl")
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process in MB (ru_maxrss is in KB on Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rss_mb() -> float:
+    """
+    Current resident set size of this process in MB, None where
+    /proc/self/statm does not exist. Unlike peak_rss_mb it goes down when
+    memory is returned to the system.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+class Telemetry:
+    """
+    Records wall time, rows/sec, memory and row counts of each stage of one
+    pipeline run. Every stage is appended as one JSON line to the run log as
+    soon as it finishes; the log is never rewritten.
+
+    Each stage records the RSS of the process when it ends and how much it
+    changed during the stage, which points at the stage that grew even in
+    the long-lived Streamlit and pool processes. With trace_memory the
+    memory it allocated is traced too; tracemalloc is process-wide and
+    slows every allocation, so only turn it on in a process that runs one
+    pipeline at a time, never in the Streamlit server.
+
+    Usage:
+        telemetry = Telemetry("preprocess_data")
+        with telemetry.stage("score", rows_in=len(X)) as record:
+            ...
+            record["rows_out"] = len(probabilities)
+    """
+
+    def __init__(self, source: str, log_path: str = RUN_LOG_PATH, trace_memory: bool = False):
+        self.source = source
+        self.log_path = log_path
+        self.trace_memory = trace_memory
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+        self.records = []
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int):
+        record = {"rows_out": rows_in}
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        rss_before = rss_mb()
+        started = datetime.now()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            rss_after = rss_mb()
+            allocated = None
+            if self.trace_memory:
+                allocated = (tracemalloc.get_traced_memory()[1] - baseline) / 2 ** 20
+                if started_tracing:
+                    tracemalloc.stop()
+            self._append({
+                "run_id": self.run_id,
+                "source": self.source,
+                "stage": name,
+                "started": started.strftime("%Y-%m-%d %H:%M:%S"),
+                "seconds": seconds,
+                "rows_in": rows_in,
+                "rows_out": record["rows_out"],
+                "rows_per_sec": rows_in / seconds if seconds else None,
+                "allocated_mb": allocated,
+                "rss_mb": rss_after,
+                "rss_delta_mb": rss_after - rss_before if rss_after is not None else None,
+                # Anything else the stage put in its record, e.g. cache hits
+                **{key: value for key, value in record.items() if key != "rows_out"},
+            })
+
+    def _append(self, entry: dict) -> None:
+        self.records.append(entry)
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+def stage(telemetry: Telemetry, name: str, rows_in: int):
+    """
+    telemetry.stage(name, rows_in), or a no-op when telemetry is None.
+    """
+    if telemetry is None:
+        return nullcontext({})
+    return telemetry.stage(name, rows_in)
+
+
+def read_run_log(log_path: str = RUN_LOG_PATH) -> list:
+    """
+    Returns:
+        list: Every stage record in the run log, oldest first.
+    """
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,244 @@
+"""
+Training of the emisora GaussianNB models on the frozen preprocessing layout.
+
+Full training reads each emisora's partitions of the history dataset in its
+own worker process. An update feeds only new rows (an upload) to
+GaussianNB.partial_fit of the emisoras they touch. Either way every model
+file and metadata.json are first written to a temporary file and then moved
+into place, so the registry never loads a half-written model.
+
+    python -m processing.train full --workers 4
+    python -m processing.train update upload.parquet
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.naive_bayes import GaussianNB
+
+from processing.history import HISTORY_DIR, read_history
+from processing.preprocessing import FEATURES, load_preprocessing, transform, valid_rows
+from processing.registry import MODEL_DIR, file_hash, model_files, model_path
+from processing.scorer import CLASSES
+
+
+METADATA_FILE = "metadata.json"
+
+# Label of model.ipynb: 1 when the row has a fechaEnvioCobro
+TARGET_COLUMN = "fechaEnvioCobro"
+TRAINING_COLUMNS = FEATURES + [TARGET_COLUMN]
+
+
+def training_matrix(df: pd.DataFrame, artifact: dict) -> tuple:
+    """
+    Returns:
+        tuple: (X, y) with X as a DataFrame in the artifact's feature layout,
+            so the fitted model's feature_names_in_ match the scoring stack.
+    """
+    df = df[valid_rows(df)]
+    X = pd.DataFrame(transform(artifact, df), columns=artifact["feature_names"])
+    y = df[TARGET_COLUMN].notna().to_numpy(dtype=np.int64)
+    return X, y
+
+
+def fit_model(X: pd.DataFrame, y: np.ndarray, model: GaussianNB = None) -> GaussianNB:
+    """
+    Fits a new model, or extends a fitted one with partial_fit.
+    """
+    if model is None:
+        model = GaussianNB()
+        return model.partial_fit(X, y, classes=list(CLASSES))
+    return model.partial_fit(X, y)
+
+
+def _save_model(model: GaussianNB, path: str) -> None:
+    joblib.dump(model, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def read_metadata(model_dir: str = MODEL_DIR) -> dict:
+    """
+    Returns:
+        dict: {idEmisora: {'rows', 'positives', 'trained', 'updated',
+            'preprocessing_created', 'mode', 'sha256'}, ...}, empty before the first
+            training.
+    """
+    path = os.path.join(model_dir, METADATA_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {int(em_id): entry for em_id, entry in json.load(f).items()}
+
+
+def _write_metadata(metadata: dict, model_dir: str) -> None:
+    path = os.path.join(model_dir, METADATA_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({str(em_id): entry for em_id, entry in sorted(metadata.items())}, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def _entry(model: GaussianNB, y: np.ndarray, path: str, previous: dict, artifact: dict, mode: str) -> dict:
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    previous = previous if mode == "update" else {}
+    return {
+        "rows": int(model.class_count_.sum()),
+        "positives": int(previous.get("positives", 0) + y.sum()),
+        "trained": previous.get("trained", now),
+        "updated": now,
+        "preprocessing_created": artifact["created"],
+        "mode": mode,
+        "sha256": file_hash(path),
+    }
+
+
+def _train_emisora(args: tuple) -> tuple:
+    # Worker: reads only this emisora's partitions and writes the model to a temporary path
+    em_id, years, history_dir, artifact, model_dir = args
+    df = read_history(TRAINING_COLUMNS, years, [em_id], history_dir=history_dir)
+    df["idEmisora"] = em_id
+    X, y = training_matrix(df, artifact)
+    if len(X) < 2:
+        return em_id, None, y
+    model = fit_model(X, y)
+    joblib.dump(model, model_path(em_id, model_dir) + ".tmp")
+    return em_id, model, y
+
+
+def train_models(emisoras: list = None, years: list = None, workers: int = None, history_dir: str = HISTORY_DIR, model_dir: str = MODEL_DIR) -> dict:
+    """
+    Trains the emisora models from scratch on the history dataset, one
+    emisora per task in a process pool.
+
+    Parameters:
+        emisoras (list): idEmisora values to train, every emisora in the
+            history if None.
+        years (list): History years to train on, all if None.
+        workers (int): Worker processes, os.cpu_count() by default.
+
+    Returns:
+        dict: {'models', 'skipped' (emisoras with fewer than 2 rows), 'rows', 'seconds'}
+    """
+    start = time.perf_counter()
+    artifact = load_preprocessing()
+    if emisoras is None:
+        emisoras = sorted(read_history(["idEmisora"], years, history_dir=history_dir)["idEmisora"].unique().tolist())
+    tasks = [(int(em_id), years, history_dir, artifact, model_dir) for em_id in emisoras]
+
+    os.makedirs(model_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        results = list(pool.map(_train_emisora, tasks))
+
+    # Every model is complete on disk before any of them replaces the old one
+    metadata = read_metadata(model_dir)
+    trained, skipped, rows = [], [], 0
+    for em_id, model, y in results:
+        if model is None:
+            skipped.append(em_id)
+            continue
+        path = model_path(em_id, model_dir)
+        os.replace(path + ".tmp", path)
+        metadata[em_id] = _entry(model, y, path, {}, artifact, "full")
+        trained.append(em_id)
+        rows += len(y)
+    _write_metadata(metadata, model_dir)
+    return {"models": trained, "skipped": skipped, "rows": rows, "seconds": time.perf_counter() - start}
+
+
+def _update_emisora(args: tuple) -> tuple:
+    em_id, X, y, path = args
+    model = joblib.load(path) if path else None
+    if model is not None and list(model.feature_names_in_) != list(X.columns):
+        # Models from model.ipynb use their own feature subset and scaler
+        return em_id, None, y
+    return em_id, fit_model(X, y, model), y
+
+
+def update_models(df: pd.DataFrame, workers: int = None, model_dir: str = MODEL_DIR) -> dict:
+    """
+    Extends the models with new rows only: each emisora present in df gets
+    one partial_fit call with its rows. Emisoras without a model get a new
+    one, unless they have fewer than 2 rows (as in train_models, a one-row
+    fit has zero variance).
+
+    Parameters:
+        df (pd.DataFrame): New rows with FEATURES and fechaEnvioCobro, e.g.
+            an upload.
+        workers (int): Worker processes; 1 runs in this process, which is
+            faster for a biweekly upload.
+
+    Returns:
+        dict: {'models', 'needs_full' (emisoras whose model does not use the
+            artifact layout and must be trained with train_models), 'skipped'
+            (new emisoras with fewer than 2 rows), 'rows', 'seconds'}
+    """
+    start = time.perf_counter()
+    artifact = load_preprocessing()
+    X, y = training_matrix(df, artifact)
+    emisora_of_row = df.loc[valid_rows(df), "idEmisora"].to_numpy()
+    existing = model_files(model_dir) if os.path.isdir(model_dir) else {}
+
+    tasks, skipped = [], []
+    for em_id in np.unique(emisora_of_row):
+        rows = emisora_of_row == em_id
+        path = existing.get(int(em_id))
+        if path is None and rows.sum() < 2:
+            skipped.append(int(em_id))
+            continue
+        tasks.append((int(em_id), X[rows], y[rows], path))
+
+    if workers == 1:
+        results = [_update_emisora(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            results = list(pool.map(_update_emisora, tasks))
+
+    os.makedirs(model_dir, exist_ok=True)
+    metadata = read_metadata(model_dir)
+    updated, needs_full, rows = [], [], 0
+    for em_id, model, y_em in results:
+        if model is None:
+            needs_full.append(em_id)
+            continue
+        path = model_path(em_id, model_dir)
+        _save_model(model, path)
+        metadata[em_id] = _entry(model, y_em, path, metadata.get(em_id, {}), artifact, "update")
+        updated.append(em_id)
+        rows += len(y_em)
+    _write_metadata(metadata, model_dir)
+    return {"models": updated, "needs_full": needs_full, "skipped": skipped, "rows": rows, "seconds": time.perf_counter() - start}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the emisora models.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    full_parser = commands.add_parser("full", help="train from the history dataset")
+    full_parser.add_argument("--years", type=int, nargs="+")
+    full_parser.add_argument("--emisoras", type=int, nargs="+")
+    full_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    full_parser.add_argument("--history-dir", default=HISTORY_DIR)
+    update_parser = commands.add_parser("update", help="partial_fit the models with new rows")
+    update_parser.add_argument("path", help="CSV or Parquet with the upload columns")
+    update_parser.add_argument("--workers", type=int, default=1)
+    for command_parser in (full_parser, update_parser):
+        command_parser.add_argument("--model-dir", default=MODEL_DIR)
+    args = parser.parse_args()
+
+    if args.command == "full":
+        summary = train_models(args.emisoras, args.years, args.workers, args.history_dir, args.model_dir)
+        print(f"Trained {len(summary['models'])} models on {summary['rows']:,} rows in {summary['seconds']:.2f} s")
+        if summary["skipped"]:
+            print("Skipped (fewer than 2 rows):", summary["skipped"])
+    else:
+        df = pd.read_csv(args.path) if args.path.endswith(".csv") else pd.read_parquet(args.path)
+        summary = update_models(df, args.workers, args.model_dir)
+        print(f"Updated {len(summary['models'])} models with {summary['rows']:,} rows in {summary['seconds']:.2f} s")
+        if summary["needs_full"]:
+            print("Need a full training first:", summary["needs_full"])
+        if summary["skipped"]:
+            print("Skipped new emisoras (fewer than 2 rows):", summary["skipped"])
@@ -0,0 +1,223 @@
+"""
+Chunked validation of uploaded CSVs against schema.UPLOAD_SCHEMA.
+
+Every column is parsed as text, one block at a time, and checked value by
+value: a non-nullable column may not be empty and every value must parse as
+its Arrow type. A row that breaks the CSV structure (e.g. an extra field)
+stops the check and is reported as such. Memory is bounded by the block
+size, not the file size.
+
+    python -m processing.validation upload.csv
+"""
+import argparse
+import csv
+import io
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+
+from processing.schema import UPLOAD_SCHEMA
+
+
+BLOCK_SIZE = 1 << 20  # bytes of CSV parsed per chunk
+MAX_EXAMPLES = 5  # offending rows kept per column
+
+# What Arrow's string casts accept, checked value by value when a cast fails;
+# integers are also checked against the int64 range, see _int64_range
+_INTEGER = r"^-?\d+$"
+_INT64_MAX = str(np.iinfo(np.int64).max)
+_INT64_MIN = str(np.iinfo(np.int64).min)[1:]
+_FLOAT = r"^[-+]?((\d+\.?\d*|\.\d+)([eE][-+]?\d+)?|(?i:nan|inf))$"
+
+
+class ValidationError(ValueError):
+    """
+    Raised for an upload that does not match the schema; report holds the
+    output of validate_csv.
+    """
+
+    def __init__(self, report: dict):
+        self.report = report
+        if report["missing_columns"]:
+            message = f"Missing columns: {', '.join(report['missing_columns'])}"
+        elif report["structure"]:
+            message = f"Malformed CSV after row {report['rows']:,}: {report['structure']}"
+        else:
+            message = "Invalid values: " + ", ".join(f"{column} ({count:,})" for column, count in report["violations"].items())
+        super().__init__(message)
+
+
+def _source(data):
+    # Arrow reads a header-only file as empty unless its one line is ended
+    if isinstance(data, bytes):
+        return io.BytesIO(data if data.endswith(b"\n") else data + b"\n")
+    with open(data, "rb") as f:
+        first_line = f.readline()
+    return data if first_line.endswith(b"\n") else io.BytesIO(first_line + b"\n")
+
+
+def _header(data) -> list:
+    if isinstance(data, bytes):
+        # A header-only file may have no newline at all
+        end = data.find(b"\n")
+        first_line = data if end == -1 else data[:end]
+    else:
+        with open(data, "rb") as f:
+            first_line = f.readline()
+    return next(csv.reader([first_line.decode("utf-8-sig").rstrip("\r\n")]), [])
+
+
+def _int64_range(values: pa.Array) -> pa.Array:
+    # Compares the digits as text, so values past int64 never reach a cast
+    negative = pc.starts_with(values, "-")
+    digits = pc.utf8_ltrim(pc.utf8_ltrim(values, "-"), "0")
+    length = pc.utf8_length(digits)
+    limit = pc.if_else(negative, pa.scalar(_INT64_MIN), pa.scalar(_INT64_MAX))
+    return pc.or_(
+        pc.less(length, len(_INT64_MAX)),
+        pc.and_(pc.equal(length, len(_INT64_MAX)), pc.less_equal(digits, limit)),
+    )
+
+
+def _parse_column(values: pa.Array, field: pa.Field) -> tuple:
+    """
+    Returns:
+        tuple: (typed, bad) with the column cast to field.type (invalid
+            values as null) and a boolean numpy mask of the invalid values.
+    """
+    try:
+        # Fast path: the whole chunk parses
+        typed = values.cast(field.type)
+        bad = pc.is_null(values) if not field.nullable else pa.array(np.zeros(len(values), dtype=bool))
+        return typed, bad.to_numpy(zero_copy_only=False)
+    except pa.ArrowInvalid:
+        pass
+
+    if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+        pattern = _INTEGER if pa.types.is_integer(field.type) else _FLOAT
+        parses = pc.match_substring_regex(values, pattern)
+        if pa.types.is_integer(field.type):
+            parses = pc.and_(parses, _int64_range(values))
+        parses = pc.fill_null(parses, False)
+        bad = pc.and_(pc.is_valid(values), pc.invert(parses))
+        typed = pc.if_else(parses, values, pa.scalar(None, pa.string())).cast(pa.int64() if pa.types.is_integer(field.type) else field.type)
+        if pa.types.is_integer(field.type) and field.type != pa.int64():
+            info = np.iinfo(field.type.to_pandas_dtype())
+            out_of_range = pc.fill_null(pc.or_(pc.less(typed, info.min), pc.greater(typed, info.max)), False)
+            bad = pc.or_(bad, out_of_range)
+            typed = pc.if_else(out_of_range, pa.scalar(None, pa.int64()), typed).cast(field.type)
+    else:
+        # Other types (dates, booleans, ...): find the distinct values that
+        # do not cast, one at a time, and null them out
+        failing = []
+        for value in pc.unique(pc.drop_null(values)).to_pylist():
+            try:
+                pa.array([value], pa.string()).cast(field.type)
+            except pa.ArrowInvalid:
+                failing.append(value)
+        bad = pc.fill_null(pc.is_in(values, value_set=pa.array(failing, pa.string())), False)
+        typed = pc.if_else(bad, pa.scalar(None, pa.string()), values).cast(field.type)
+    if not field.nullable:
+        bad = pc.or_(bad, pc.is_null(values))
+    return typed, bad.to_numpy(zero_copy_only=False)
+
+
+def _check_batch(batch: pa.RecordBatch, schema: pa.Schema, report: dict, violations: dict, examples: list, on_batch, max_examples: int) -> None:
+    columns = []
+    for field in schema:
+        values = batch.column(field.name)
+        typed, bad = _parse_column(values, field)
+        columns.append(typed)
+        count = int(bad.sum())
+        if count:
+            kept = sum(1 for example in examples if example["column"] == field.name)
+            for i in np.flatnonzero(bad)[:max_examples - kept]:
+                examples.append({"row": report["rows"] + int(i) + 1, "column": field.name, "value": values[int(i)].as_py()})
+            violations[field.name] += count
+    if on_batch is not None and not any(violations.values()):
+        on_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+    report["rows"] += batch.num_rows
+
+
+def validate_csv(data, schema: pa.Schema = UPLOAD_SCHEMA, on_batch=None, block_size: int = BLOCK_SIZE, max_examples: int = MAX_EXAMPLES) -> dict:
+    """
+    Checks a CSV against schema in chunks of block_size bytes.
+
+    Parameters:
+        data (bytes or str): CSV contents, or a path to read from.
+        schema (pa.Schema): Expected columns, types and nullability; other
+            columns of the file are ignored.
+        on_batch (callable): Called with each chunk as a RecordBatch of
+            schema while no violation has been found, e.g. a Parquet
+            writer's write_batch.
+        block_size (int): Bytes parsed per chunk.
+        max_examples (int): Offending rows kept per column.
+
+    Returns:
+        dict: {
+            'valid': bool,
+            'rows': rows checked,
+            'missing_columns': schema columns absent from the header,
+            'structure': message of the CSV parse error that stopped the
+                check (e.g. a row with too many fields), None if none,
+            'violations': {column: invalid values} for the columns with any,
+            'examples': pd.DataFrame of the first offending rows (row, the
+                1-based data row; column; value),
+            'seconds': float,
+        }
+    """
+    start = time.perf_counter()
+    report = {"valid": False, "rows": 0, "missing_columns": [], "structure": None, "violations": {}, "examples": pd.DataFrame(columns=["row", "column", "value"]), "seconds": 0.0}
+
+    header = _header(data)
+    report["missing_columns"] = [name for name in schema.names if name not in header]
+    if report["missing_columns"]:
+        report["seconds"] = time.perf_counter() - start
+        return report
+
+    violations = dict.fromkeys(schema.names, 0)
+    examples = []
+    try:
+        reader = pv.open_csv(
+            _source(data),
+            read_options=pv.ReadOptions(block_size=block_size),
+            convert_options=pv.ConvertOptions(
+                column_types={name: pa.string() for name in schema.names},
+                include_columns=schema.names,
+                strings_can_be_null=True,
+            ),
+        )
+        for batch in reader:
+            _check_batch(batch, schema, report, violations, examples, on_batch, max_examples)
+    except pa.ArrowInvalid as e:
+        # The reader cannot go past a malformed row
+        report["structure"] = str(e)
+
+    report["violations"] = {name: count for name, count in violations.items() if count}
+    report["valid"] = not report["violations"] and report["structure"] is None
+    if examples:
+        report["examples"] = pd.DataFrame(examples).sort_values(["row", "column"], ignore_index=True)
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate an upload CSV against the upload schema.")
+    parser.add_argument("path")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    args = parser.parse_args()
+
+    report = validate_csv(args.path, block_size=args.block_size)
+    print(f"{report['rows']:,} rows in {report['seconds']:.2f} s: {'valid' if report['valid'] else 'INVALID'}")
+    if report["missing_columns"]:
+        print("Missing columns:", ", ".join(report["missing_columns"]))
+    if report["structure"]:
+        print(f"Malformed CSV after row {report['rows']:,}: {report['structure']}")
+    for column, count in report["violations"].items():
+        print(f"  {column}: {count:,} invalid values")
+    if len(report["examples"]):
+        print(report["examples"].to_string(index=False))
@@ -0,0 +1,26 @@
+import os
+
+import pandas as pd
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True, scope="session")
+def repo_root():
+    # Data, models and artifacts are addressed relative to the repo root
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    yield ROOT
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope="session")
+def catalog(repo_root):
+    return pd.read_csv("data/EmisoraBancoPrecios.csv")
+
+
+@pytest.fixture(scope="session")
+def batch(repo_root):
+    return pd.read_parquet("processing/2025Test.parquet")
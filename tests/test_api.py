@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from processing.api import ScoringService, handle_connection
+from processing.pipeline import run_assignment
+from processing.preprocessing import FEATURES
+
+
+@pytest.fixture(scope="module")
+def service():
+    return ScoringService()
+
+
+def _strict(text):
+    # json.loads takes NaN and Infinity, which are not JSON
+    return json.loads(text, parse_constant=lambda constant: pytest.fail(f"{constant} in response"))
+
+
+def test_score_batch_matches_run_assignment(service, batch, catalog):
+    # Through JSON, as the credits of a request arrive
+    credits = json.loads(batch[FEATURES + ["idCredito"]].to_json(orient="records"))
+    responses = service._score_batch(credits)
+    rows, result = run_assignment(batch, catalog)
+
+    scored = [response for response in responses if "error" not in response]
+    assert [response["idCredito"] for response in scored] == rows["idCredito"].tolist()
+    assert len(responses) - len(scored) == len(batch) - len(rows)
+    np.testing.assert_array_equal([response["best_emisora"] for response in scored], result["best_emisora"])
+    np.testing.assert_array_equal(
+        [response["expected_profit"] for response in scored],
+        result["profits"][np.arange(len(rows)), result["best"]],
+    )
+    emisora_ids = [int(em_id) for em_id in result["emisora_ids"]]
+    np.testing.assert_array_equal([[response["probabilities"][em_id] for em_id in emisora_ids] for response in scored], result["probabilities"])
+
+
+async def _post(port: int, body: bytes) -> tuple:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"POST /score HTTP/1.1\r\nConnection: close\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), payload.decode()
+
+
+def test_empty_and_non_finite_requests(service, batch):
+    credit = json.loads(batch[FEATURES + ["idCredito"]].iloc[:1].to_json(orient="records"))[0]
+    overflow = json.dumps({**credit, "montoCobrar": 1}, separators=(",", ":")).replace('"montoCobrar":1', '"montoCobrar":1e400')
+
+    async def run():
+        await service.start()
+        server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            # Alone in its micro-batch, then batched with another request
+            alone = await _post(port, b"[]")
+            together = await asyncio.gather(_post(port, b"[]"), _post(port, json.dumps([credit]).encode()))
+            non_finite = await _post(port, overflow.encode())
+        service._batcher.cancel()
+        return alone, together, non_finite
+
+    alone, together, non_finite = asyncio.run(run())
+    assert alone == (200, '{"credits":[]}')
+    assert together[0] == (200, '{"credits":[]}')
+    assert together[1][0] == 200 and "best_emisora" in _strict(together[1][1])["credits"][0]
+    status, payload = non_finite
+    assert status == 200
+    assert "error" in _strict(payload)["credits"][0]
+
+
+def test_non_integer_bank_is_rejected_per_credit(service, batch):
+    credit = json.loads(batch[FEATURES + ["idCredito"]].iloc[:1].to_json(orient="records"))[0]
+    responses = service._score_batch([
+        {**credit, "IdBanco_Credito": credit["IdBanco_Credito"] + 0.7},
+        {**credit, "IdBanco_Credito": float(credit["IdBanco_Credito"])},
+        {**credit, "IdBanco_Credito": 1e300},
+    ])
+
+    assert responses[0]["error"] == "IdBanco_Credito must be an integer"
+    assert responses[1] == service._score_batch([credit])[0]
+    assert responses[2]["error"] == "IdBanco_Credito must be an integer"
+
+
+def test_failing_request_does_not_fail_its_batch(service, batch, monkeypatch):
+    credits = json.loads(batch[FEATURES + ["idCredito"]].iloc[:3].to_json(orient="records"))
+    score_batch, sizes = service._score_batch, []
+
+    def failing(batch_credits):
+        sizes.append(len(batch_credits))
+        if any(credit["idCredito"] == credits[1]["idCredito"] for credit in batch_credits):
+            raise KeyError("emisora missing from the catalog")
+        return score_batch(batch_credits)
+
+    monkeypatch.setattr(service, "_score_batch", failing)
+
+    async def run():
+        await service.start()
+        results = await asyncio.gather(*(service.score([credit]) for credit in credits), return_exceptions=True)
+        service._batcher.cancel()
+        return results
+
+    first, second, third = asyncio.run(run())
+    assert sizes == [3, 1, 1, 1]
+    assert first == score_batch(credits[:1]) and third == score_batch(credits[2:])
+    assert isinstance(second, KeyError)
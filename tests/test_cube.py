@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from processing.cube import MAX_KEY, MAX_VALUE, MIN_VALUE, key_values, sketch_keys
+
+
+def test_keys_fit_the_packing_span():
+    values = np.array([-MAX_VALUE, -1.0, -MIN_VALUE, 0.0, MIN_VALUE, 1.0, MAX_VALUE])
+    keys = sketch_keys(values)
+
+    assert np.abs(keys).max() <= MAX_KEY
+    assert (np.diff(keys) > 0).all()
+    np.testing.assert_allclose(key_values(keys[[0, 5, 6]]), values[[0, 5, 6]], rtol=0.01)
+
+
+@pytest.mark.parametrize("value", [1e300, -1e300, np.inf])
+def test_out_of_range_values_are_rejected(value):
+    with pytest.raises(ValueError):
+        sketch_keys(np.array([1.0, value]))
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from processing.feature_state import FEATURE_COLUMNS, FeatureState, check_consistency, replay_features
+
+
+def _history(seed=0, credits=40, attempts=6):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for credit in range(1, credits + 1):
+        for consecutivo in range(1, rng.integers(1, attempts + 1) + 1):
+            cobrar = float(rng.choice([0, 500, 1200, 3000]))
+            paid = rng.random() < 0.4
+            rows.append({
+                "idCredito": credit,
+                "consecutivoCobro": consecutivo,
+                "montoCobrar": cobrar,
+                "montoCobrado": cobrar * rng.choice([0.5, 1.0]) if paid else 0.0,
+                "fechaCobroBanco": "2025-06-02" if paid else None,
+                "Status": "reintento" if rng.random() < 0.85 else "primer_intento",
+            })
+    return pd.DataFrame(rows).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def test_two_uploads_match_full_replay():
+    history = _history()
+    split = history["consecutivoCobro"] <= 3
+    first, second = history[split], history[~split]
+
+    with FeatureState(":memory:") as state:
+        features = pd.concat([state.update(first), state.update(second)])
+        # Re-sending an upload only adds stale rows
+        assert len(state.update(second)) == 0
+
+    replay = replay_features(history)
+    assert len(features) == len(replay)
+    pd.testing.assert_frame_equal(
+        features.reindex(replay.index)[FEATURE_COLUMNS].astype(float),
+        replay[FEATURE_COLUMNS].astype(float),
+    )
+
+
+def test_check_consistency_reports_no_mismatches():
+    report = check_consistency(_history(seed=1), chunks=5)
+
+    assert report["consistent"]
+    assert report["mismatches"] == {column: 0 for column in FEATURE_COLUMNS}
+    assert report["rows"] == len(replay_features(_history(seed=1)))
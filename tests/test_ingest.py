@@ -0,0 +1,87 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from benchmarks.synthetic import synthetic_credits
+from processing.ingest import UPLOAD_LOG, convert_csv, ingest_upload, upload_path
+from processing.schema import UPLOAD_SCHEMA
+from processing.validation import ValidationError, validate_csv
+
+
+@pytest.fixture(scope="module")
+def upload():
+    return synthetic_credits(6_000, layout="csv").to_csv(index=False).encode()
+
+
+def _log(upload_dir):
+    with open(os.path.join(upload_dir, UPLOAD_LOG)) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_store_and_duplicate(upload, tmp_path):
+    first = ingest_upload(upload, "upload.csv", upload_dir=str(tmp_path))
+    second = ingest_upload(upload, "upload.csv", upload_dir=str(tmp_path))
+
+    assert (first["status"], second["status"]) == ("stored", "duplicate")
+    assert first["rows"] == second["rows"] == 6_000
+
+
+def test_concurrent_uploads_of_the_same_content(upload, tmp_path):
+    path = upload_path("same", str(tmp_path))
+    with ThreadPoolExecutor(4) as pool:
+        rows = list(pool.map(lambda _: convert_csv(upload, path), range(4)))
+
+    assert rows == [6_000] * 4
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    assert pq.ParquetFile(path).metadata.num_rows == 6_000
+
+
+def test_row_with_extra_field_is_rejected(upload, tmp_path):
+    lines = upload.split(b"\n")
+    lines[5_001] += b",extra"
+    data = b"\n".join(lines)
+
+    report = validate_csv(data, block_size=1 << 16)
+    assert not report["valid"]
+    assert "Expected 24 columns, got 25" in report["structure"]
+
+    with pytest.raises(ValidationError, match="Malformed CSV"):
+        ingest_upload(data, "bad.csv", upload_dir=str(tmp_path))
+    assert [name for name in os.listdir(tmp_path) if name != UPLOAD_LOG] == []
+    assert _log(str(tmp_path))[-1]["status"] == "rejected"
+
+
+def test_int64_range_is_checked_not_digit_count():
+    header = "idListaCobro,idCredito"
+    rows = ["1,9223372036854775807", "2,-9223372036854775808", "3,abc", "4,9223372036854775808", "5,0009"]
+    data = "\n".join([header] + rows).encode()
+
+    schema = pa.schema([("idListaCobro", pa.int64()), ("idCredito", pa.int64())])
+    report = validate_csv(data, schema)
+
+    assert report["violations"] == {"idCredito": 2}
+    assert report["examples"]["row"].tolist() == [3, 4]
+
+
+def test_header_only_file_without_newline(tmp_path):
+    header = ",".join(UPLOAD_SCHEMA.names)
+    (tmp_path / "header.csv").write_text(header)
+
+    for data in (header.encode(), str(tmp_path / "header.csv")):
+        report = validate_csv(data)
+        assert report["valid"] and report["rows"] == 0, report
+
+
+def test_type_errors_of_other_columns_are_per_value():
+    schema = pa.schema([("id", pa.int64()), ("fecha", pa.date32()), ("ok", pa.bool_())])
+    data = b"id,fecha,ok\n1,2025-01-02,true\n2,02/01/2025,maybe\n3,,false\n4,2025-13-01,true\n"
+
+    report = validate_csv(data, schema)
+
+    assert report["structure"] is None
+    assert report["violations"] == {"fecha": 2, "ok": 1}
+    assert report["examples"][["row", "column"]].values.tolist() == [[2, "fecha"], [2, "ok"], [4, "fecha"]]
@@ -0,0 +1,70 @@
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from processing import jobs
+
+
+def _crash(status, batch_path, catalog_path, runs_dir):
+    # A worker killed in the middle of a run, e.g. by the OOM killer
+    os._exit(1)
+
+
+def _finish(status, batch_path, catalog_path, runs_dir):
+    status.update(state="done", stage=None, progress=1.0, rows=0, finished=datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+    jobs._write_status(status, runs_dir)
+    return status
+
+
+def _wait(run_id, runs_dir, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = jobs.read_status(run_id, runs_dir)
+        if status["state"] != "running":
+            return status
+        time.sleep(0.1)
+    raise AssertionError(f"run {run_id} still running")
+
+
+@pytest.fixture
+def own_pool(monkeypatch):
+    monkeypatch.setattr(jobs, "_pool", None)
+    monkeypatch.setattr(jobs, "_active", {})
+    yield
+    if jobs._pool is not None:
+        jobs._pool.shutdown()
+
+
+def test_crashed_worker_fails_the_run_and_the_next_run_gets_a_new_pool(tmp_path, monkeypatch, own_pool):
+    runs_dir = str(tmp_path)
+    monkeypatch.setattr(jobs, "execute", _crash)
+    crashed = jobs.submit(runs_dir=runs_dir)
+
+    status = _wait(crashed, runs_dir)
+    assert status["state"] == "failed" and "BrokenProcessPool" in status["error"]
+    assert status["finished"] is not None
+    assert jobs._pool is None
+
+    monkeypatch.setattr(jobs, "execute", _finish)
+    run_id = jobs.submit(runs_dir=runs_dir)
+    assert run_id != crashed
+    assert _wait(run_id, runs_dir)["state"] == "done"
+
+
+def test_prune_keeps_recent_running_and_latest_runs(tmp_path):
+    runs_dir = str(tmp_path)
+    states = ["done", "running", "failed", "done", "failed", "failed"]
+    run_ids = []
+    for i, state in enumerate(states):
+        status = jobs._new_run(f"key{i}", runs_dir)
+        status.update(state=state, submitted=f"2025-01-0{i + 1} 00:00:00.000000", finished=f"2025-01-0{i + 1} 00:00:01.000000" if state != "running" else None)
+        jobs._write_status(status, runs_dir)
+        run_ids.append(status["run_id"])
+
+    removed = jobs.prune_runs(runs_dir, keep=2)
+
+    # Newest first: 5, 4 are kept, 3 is the latest done, 1 is running
+    assert sorted(removed) == sorted([run_ids[0], run_ids[2]])
+    assert sorted(os.listdir(runs_dir)) == sorted([run_ids[1], run_ids[3], run_ids[4], run_ids[5]])
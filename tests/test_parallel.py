@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from processing.parallel import parallel_assignment, shard_positions
+from processing.pipeline import assignment_frame, run_assignment
+
+
+@pytest.mark.parametrize("shard_by", ["hash", "bank"])
+def test_sharded_matches_single_process(batch, catalog, shard_by):
+    df = batch.head(3_000)
+    expected = assignment_frame(*run_assignment(df, catalog))
+
+    frame = parallel_assignment(df, workers=2, shard_size=700, shard_by=shard_by)
+
+    assert frame.equals(expected)
+
+
+def test_empty_input(batch, catalog):
+    expected = assignment_frame(*run_assignment(batch.head(0), catalog))
+
+    frame = parallel_assignment(batch.head(0), workers=1)
+
+    assert frame.empty
+    assert frame.dtypes.equals(expected.dtypes)
+
+
+def test_no_valid_rows(batch, catalog):
+    df = batch.head(50).assign(montoCobrar=np.nan)
+    expected = assignment_frame(*run_assignment(df, catalog))
+
+    frame = parallel_assignment(df, workers=1)
+
+    assert frame.empty
+    assert frame.dtypes.equals(expected.dtypes)
+
+
+def test_bank_shards_pack_whole_banks(batch):
+    shards = shard_positions(batch, 2_000, "bank")
+    banks = [set(batch["IdBanco_Credito"].iloc[shard]) for shard in shards]
+
+    # Every bank in exactly one shard, every row in exactly one shard
+    assert sum(len(b) for b in banks) == batch["IdBanco_Credito"].nunique()
+    assert np.array_equal(np.sort(np.concatenate(shards)), np.arange(len(batch)))
+    # Shards only exceed shard_size when they hold a single larger bank
+    assert all(len(shard) <= 2_000 or len(b) == 1 for shard, b in zip(shards, banks))
+    # Small banks share shards
+    assert len(shards) < batch["IdBanco_Credito"].nunique()
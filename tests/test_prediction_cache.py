@@ -0,0 +1,79 @@
+import glob
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from processing.pipeline import run_assignment
+from processing.prediction_cache import PredictionCache
+
+
+def _score(X):
+    return np.column_stack([X.sum(axis=1), X.prod(axis=1)])
+
+
+def _fill(cache_dir: str, seed: int, batches: int) -> None:
+    # One worker of the concurrent test: distinct keys per seed
+    cache = PredictionCache(cache_dir)
+    for b in range(batches):
+        X = np.random.default_rng([seed, b]).random((200, 3))
+        cache.score("models", X, X, _score)
+
+
+def _segments(cache_dir: str) -> list:
+    return glob.glob(os.path.join(cache_dir, "models", "*.npy"))
+
+
+def test_cached_matches_fresh(batch, catalog, tmp_path):
+    cache = PredictionCache(str(tmp_path))
+    _, fresh = run_assignment(batch, catalog)
+    _, first = run_assignment(batch, catalog, cache=cache)
+    assert cache.last_stats["hits"] == 0
+    _, second = run_assignment(batch, catalog, cache=cache)
+    assert cache.last_stats["misses"] == 0
+
+    for name in ("probabilities", "profits", "best"):
+        np.testing.assert_array_equal(first[name], fresh[name])
+        np.testing.assert_array_equal(second[name], fresh[name])
+
+
+def test_misses_are_appended_and_merged(tmp_path):
+    cache = PredictionCache(str(tmp_path), max_segments=4)
+    rng = np.random.default_rng(0)
+    seen = []
+    for _ in range(10):
+        X = rng.random((100, 3))
+        seen.append(X)
+        # Half of each batch was already scored
+        X = np.concatenate([X, seen[0][:50]]) if len(seen) > 1 else X
+        np.testing.assert_array_equal(cache.score("models", X, X, _score), _score(X))
+        assert len(_segments(str(tmp_path))) <= 4
+    assert len(cache) == 1_000
+
+    X = np.concatenate(seen)
+    np.testing.assert_array_equal(cache.score("models", X, X, _score), _score(X))
+    assert cache.last_stats["misses"] == 0
+
+
+def test_eviction_keeps_recent_entries(tmp_path):
+    cache = PredictionCache(str(tmp_path), max_entries=500)
+    rng = np.random.default_rng(1)
+    old = rng.random((400, 3))
+    cache.score("old", old, old, _score)
+    for _ in range(3):
+        X = rng.random((200, 3))
+        cache.score("models", X, X, _score)
+        assert len(cache) <= 500
+
+    assert [models_hash for models_hash, _ in cache.info()] == ["models"]
+    cache.score("models", X, X, _score)
+    assert cache.last_stats["misses"] == 0
+
+
+def test_concurrent_writers_keep_every_entry(tmp_path):
+    with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("spawn")) as pool:
+        list(pool.map(_fill, [str(tmp_path)] * 4, range(4), [15] * 4))
+
+    assert len(PredictionCache(str(tmp_path))) == 4 * 15 * 200
+    assert not glob.glob(os.path.join(str(tmp_path), "models", "*.tmp"))
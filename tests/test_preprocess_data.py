@@ -0,0 +1,19 @@
+import json
+import os
+
+from processing.preprocess_data import main
+
+
+def test_assign_runs_outside_the_project(tmp_path, monkeypatch):
+    cwd, state_dir = tmp_path / "cwd", tmp_path / "state"
+    cwd.mkdir()
+    monkeypatch.chdir(cwd)
+
+    main(["--output", str(tmp_path / "out.ndjson"), "--no-detail", "--state-dir", str(state_dir)])
+
+    with open(tmp_path / "out.ndjson") as f:
+        first = json.loads(f.readline())
+    assert "best_emisora" in first
+    # Nothing is written to the working directory, the state goes to --state-dir
+    assert os.listdir(cwd) == []
+    assert {"runs.jsonl", "prediction_cache", "store"} <= set(os.listdir(state_dir))
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from processing.process import (
+    append_hit_costs,
+    append_profits,
+    assign,
+    calculate_best_emisora,
+    compute_profits_for_client,
+    mask_client_probabilities,
+    to_client_dicts,
+)
+
+
+def _reference(catalog, clients):
+    # The per-client loops the matrix engine replaced
+    bank_to_ids = catalog.groupby("IdBanco")["idEmisora"].apply(set).to_dict()
+    interbancario_ids = set(catalog[catalog["TipoEnvio"] == "INTERBANCARIO"]["idEmisora"])
+    cost_mapping = catalog.set_index("idEmisora")[["Costo_Hit_Miss", "Costo_Hit_Win"]].to_dict(orient="index")
+    for data in clients.values():
+        keep = bank_to_ids.get(data["bank"], set()) | interbancario_ids
+        data["probabilities"] = {em_id: prob if em_id in keep else 0 for em_id, prob in data["probabilities"].items()}
+        data["hit_costs"] = {em_id: cost_mapping[em_id] for em_id, prob in data["probabilities"].items() if prob != 0}
+        data["profits"] = compute_profits_for_client(data)
+        data["best_emisora"] = max(data["profits"], key=data["profits"].get)
+    return clients
+
+
+@pytest.fixture
+def inputs(catalog):
+    rng = np.random.default_rng(0)
+    n = 2_000
+    emisora_ids = catalog["idEmisora"].tolist()
+    probabilities = rng.random((n, len(emisora_ids)))
+    probabilities[rng.random(probabilities.shape) < 0.2] = 0.0
+    banks = rng.choice(catalog["IdBanco"].unique().tolist() + [999], n).astype(object)
+    # Credits without a bank may only use INTERBANCARIO emisoras
+    banks[rng.random(n) < 0.02] = None
+    banks[rng.random(n) < 0.02] = np.nan
+    payments = np.round(rng.lognormal(6.4, 0.9, n), 2)
+    return probabilities, banks, payments, emisora_ids
+
+
+def _clients(probabilities, banks, payments, emisora_ids):
+    return {
+        i: {"bank": bank, "payment": payment, "probabilities": dict(zip(emisora_ids, row))}
+        for i, (bank, payment, row) in enumerate(zip(banks.tolist(), payments.tolist(), probabilities.tolist()))
+    }
+
+
+def test_assign_matches_per_client_loops(catalog, inputs):
+    probabilities, banks, payments, emisora_ids = inputs
+    result = assign(catalog, probabilities, banks, payments, emisora_ids)
+    expected = _reference(catalog, _clients(*inputs))
+
+    assert to_client_dicts(result, list(expected), banks.tolist(), payments.tolist()) == expected
+
+
+def test_dict_api_matches_per_client_loops(catalog, inputs):
+    clients = _clients(*inputs)
+    mask_client_probabilities(catalog, clients)
+    append_hit_costs(catalog, clients)
+    append_profits(clients)
+    calculate_best_emisora(clients)
+
+    assert clients == _reference(catalog, _clients(*inputs))
+
+
+def test_missing_bank_gets_only_interbancario(catalog):
+    emisora_ids = catalog["idEmisora"].tolist()
+    interbancario = catalog.drop_duplicates("idEmisora").set_index("idEmisora").loc[emisora_ids, "TipoEnvio"].eq("INTERBANCARIO").to_numpy()
+    probabilities = np.full((3, len(emisora_ids)), 0.5)
+    # The last unique bank comes right before the missing ones
+    result = assign(catalog, probabilities, [None, np.nan, catalog["IdBanco"].iloc[0]], [100.0] * 3, emisora_ids)
+
+    np.testing.assert_array_equal(result["probabilities"][:2] != 0, [interbancario, interbancario])
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+
+from processing import registry
+
+
+def _stack():
+    return {
+        "emisora_ids": [1],
+        "feature_names": ["montoCobrar"],
+        "theta": np.zeros((1, 2, 1)),
+        "var": np.ones((1, 2, 1)),
+        "log_prior": np.log([[0.5, 0.5]]),
+        "feature_mask": np.ones((1, 1), dtype=bool),
+        "n_classes": np.array([2]),
+    }
+
+
+def test_pruning_tolerates_files_removed_by_another_process(tmp_path, monkeypatch):
+    for i in range(registry.STACK_CACHE_FILES + 2):
+        registry._write_stack(_stack(), str(tmp_path / f"{i}.npz"))
+        os.utime(tmp_path / f"{i}.npz", (i, i))
+
+    # Another worker prunes the same files in between our listing and our
+    # stat or remove
+    real_getmtime, real_remove = os.path.getmtime, os.remove
+
+    def getmtime(path):
+        if path.endswith("0.npz"):
+            real_remove(path)
+        return real_getmtime(path)
+
+    def remove(path):
+        real_remove(path)
+        real_remove(path)
+
+    monkeypatch.setattr(registry.os.path, "getmtime", getmtime)
+    monkeypatch.setattr(registry.os, "remove", remove)
+    registry._write_stack(_stack(), str(tmp_path / "new.npz"))
+
+    files = sorted(os.listdir(tmp_path))
+    assert "new.npz" in files
+    assert len(files) == registry.STACK_CACHE_FILES
+
+
+def test_stack_file_round_trip(tmp_path):
+    registry._write_stack(_stack(), str(tmp_path / "stack.npz"))
+    stack = registry._read_stack(str(tmp_path / "stack.npz"))
+    for name, value in _stack().items():
+        np.testing.assert_array_equal(stack[name], value)
@@ -0,0 +1,31 @@
+import numpy as np
+
+from processing.pipeline import run_assignment
+from processing.process import assign, reprice
+
+
+def test_reprice_matches_full_assign(batch, catalog):
+    rows, result = run_assignment(batch, catalog)
+    banks = rows["IdBanco_Credito"].to_numpy()
+    payments = rows["montoCobrar"].to_numpy(dtype=float)
+    probabilities = np.where(result["probabilities"] != 0, result["probabilities"], 0.0)
+
+    # Free, equal and differing hit/miss prices, one large enough to move
+    # credits, plus an idEmisora without a model
+    charged = (result["probabilities"] != 0).sum(axis=0)
+    busiest = result["emisora_ids"][int(np.argmax(charged))]
+    costs = {busiest: (500.0, 520.0), 2: (0.0, 0.0), 12: (3.1, 3.1), 99_999: (1.0, 1.0)}
+    repriced = catalog.copy()
+    for em_id, (chm, chw) in costs.items():
+        repriced.loc[repriced["idEmisora"] == em_id, ["Costo_Hit_Miss", "Costo_Hit_Win"]] = [chm, chw]
+
+    expected = assign(repriced, probabilities, banks, payments, result["emisora_ids"])
+    actual = reprice(result, payments, costs)
+
+    for name in ("costo_hit_miss", "costo_hit_win", "profits", "best", "best_emisora"):
+        np.testing.assert_array_equal(actual[name], expected[name], err_msg=name)
+    np.testing.assert_array_equal(actual["reassigned"], expected["best"] != result["best"])
+    assert actual["reassigned"].any()
+    assert actual["expected_profit"] == expected["profits"][np.arange(len(payments)), expected["best"]].sum()
+    # The input result is left as it was
+    np.testing.assert_array_equal(result["profits"], run_assignment(batch, catalog)[1]["profits"])
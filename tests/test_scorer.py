@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from processing.pipeline import preprocess
+from processing.preprocessing import load_preprocessing
+from processing.registry import load_models
+from processing.scorer import CLASSES, predict_proba, stack_models
+
+
+@pytest.fixture(scope="module")
+def scored(batch):
+    artifact = load_preprocessing()
+    models = load_models()
+    _, X = preprocess(batch, artifact)
+    return models, stack_models(models, artifact["feature_names"]), X
+
+
+def test_stacked_matches_each_model(scored):
+    models, stack, X = scored
+    proba = predict_proba(stack, X)
+    for m, (em_id, model) in enumerate(models.items()):
+        columns = [stack["feature_names"].index(name) for name in model.feature_names_in_]
+        # GaussianNB warns on the zero variances of the single-class model
+        with np.errstate(divide="ignore", invalid="ignore"):
+            expected = model.predict_proba(pd.DataFrame(X[:, columns], columns=model.feature_names_in_))
+        classes = [CLASSES.index(label) for label in model.classes_]
+        np.testing.assert_allclose(proba[:, m, classes], expected, rtol=0, atol=1e-12, err_msg=f"emisora {em_id}")
+
+
+def test_batching_does_not_change_probabilities(scored):
+    _, stack, X = scored
+    X = X[:600]
+    full = predict_proba(stack, X)
+    for size in (1, 7, 300):
+        parts = np.concatenate([predict_proba(stack, X[i:i + size]) for i in range(0, len(X), size)])
+        np.testing.assert_array_equal(parts, full)
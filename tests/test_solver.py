@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+from processing.solver import expected_hit_costs, solve_assignment
+
+
+EMISORA_IDS = [1, 2, 3, 4, 5]
+CATALOG = pd.DataFrame({"idEmisora": EMISORA_IDS, "IdBanco": [2, 2, 12, 12, 6]})
+
+
+def _result(seed, n=80):
+    rng = np.random.default_rng(seed)
+    m = len(EMISORA_IDS)
+    probabilities = np.where(rng.random((n, m)) < 0.7, rng.uniform(0.05, 0.95, (n, m)), 0.0)
+    probabilities[np.arange(n), rng.integers(0, m, n)] = rng.uniform(0.05, 0.95, n)
+    hit_miss = np.broadcast_to(rng.uniform(1, 6, m), (n, m)).copy()
+    hit_win = np.broadcast_to(rng.uniform(2, 9, m), (n, m)).copy()
+    profits = np.where(probabilities != 0, rng.normal(40, 30, (n, m)), 0.0)
+    return {
+        "emisora_ids": EMISORA_IDS,
+        "probabilities": probabilities,
+        "costo_hit_miss": hit_miss,
+        "costo_hit_win": hit_win,
+        "profits": profits,
+    }
+
+
+def _full_milp(result, capacity, budget, bank_minimums):
+    # The whole problem at once, one binary per eligible pair
+    eligible = result["probabilities"] != 0
+    I, J = np.nonzero(eligible)
+    n, m = eligible.shape
+    costs = expected_hit_costs(result["probabilities"], result["costo_hit_miss"], result["costo_hit_win"])
+    constraints = [LinearConstraint((I[None, :] == np.arange(n)[:, None]).astype(float), -np.inf, 1)]
+    for em_id, limit in (capacity or {}).items():
+        constraints.append(LinearConstraint((J == EMISORA_IDS.index(em_id)).astype(float)[None, :], -np.inf, limit))
+    if budget is not None:
+        constraints.append(LinearConstraint(costs[I, J][None, :], -np.inf, budget))
+    bank = CATALOG.set_index("idEmisora")["IdBanco"].to_numpy()
+    for bank_id, minimum in (bank_minimums or {}).items():
+        constraints.append(LinearConstraint((bank[J] == bank_id).astype(float)[None, :], minimum, np.inf))
+    solution = milp(-result["profits"][I, J], constraints=constraints, integrality=np.ones(len(I)), bounds=Bounds(0, 1), options={"mip_rel_gap": 1e-9})
+    assert solution.success
+    return -solution.fun
+
+
+def _check_feasible(result, solution, capacity, budget, bank_minimums):
+    best = solution["best"]
+    sent = best >= 0
+    assert (result["probabilities"][sent, best[sent]] != 0).all()
+    load = np.bincount(best[sent], minlength=len(EMISORA_IDS))
+    for em_id, limit in (capacity or {}).items():
+        assert load[EMISORA_IDS.index(em_id)] <= limit
+    if budget is not None:
+        costs = expected_hit_costs(result["probabilities"], result["costo_hit_miss"], result["costo_hit_win"])
+        assert costs[sent, best[sent]].sum() <= budget + 1e-6
+    bank = CATALOG["IdBanco"].to_numpy()
+    for bank_id, minimum in (bank_minimums or {}).items():
+        assert load[bank == bank_id].sum() >= minimum
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("limits", [
+    {"capacity": {1: 8, 3: 5, 4: 10}},
+    {"budget": 120.0},
+    {"bank_minimums": {6: 40}},
+    {"capacity": {5: 20}, "budget": 200.0, "bank_minimums": {2: 30, 12: 25}},
+], ids=["capacity", "budget", "bank_minimum", "all"])
+def test_matches_full_milp(seed, limits):
+    result = _result(seed)
+    capacity, budget, bank_minimums = limits.get("capacity"), limits.get("budget"), limits.get("bank_minimums")
+
+    solution = solve_assignment(result, capacity, budget, bank_minimums, CATALOG)
+
+    _check_feasible(result, solution, capacity, budget, bank_minimums)
+    optimum = _full_milp(result, capacity, budget, bank_minimums)
+    assert solution["objective"] == pytest.approx(optimum, rel=1e-7)
+    assert solution["bound"] >= optimum - 1e-6 * abs(optimum)
+    assert solution["objective"] == pytest.approx(result["profits"][solution["best"] >= 0, solution["best"][solution["best"] >= 0]].sum())
+
+
+def test_infeasible_bank_minimum():
+    result = _result(0)
+    reachable = int(((result["probabilities"][:, CATALOG["IdBanco"] == 6]) != 0).any(axis=1).sum())
+
+    with pytest.raises(ValueError, match="No assignment"):
+        solve_assignment(result, bank_minimums={6: reachable + 1}, catalog=CATALOG)
@@ -0,0 +1,44 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from processing.sql_source import COLUMNS, DATE_COLUMN, TABLE, read_chunks, sql_assignment
+
+
+@pytest.fixture
+def connection(batch, tmp_path):
+    # fechaEnvioCobro is stored as 'yyyy-mm-dd hh:mm:ss', as in the uploads;
+    # the first rows were never sent
+    table = batch[COLUMNS + [DATE_COLUMN]].copy()
+    table.loc[:99, DATE_COLUMN] = pd.NaT
+    connection = sqlite3.connect(tmp_path / "cobros.db")
+    table.to_sql(TABLE, connection, index=False)
+    yield connection
+    connection.close()
+
+
+def _rows(connection, **filters) -> int:
+    return sum(len(chunk) for chunk in read_chunks(connection, chunk_size=5_000, **filters))
+
+
+def test_until_includes_the_whole_last_day(batch, connection):
+    dated = len(batch) - 100
+    assert _rows(connection, until="2025-12-05") == dated
+    assert _rows(connection, since="2025-12-05", until="2025-12-05") == dated
+    assert _rows(connection, until="2025-12-04") == 0
+    assert _rows(connection, since="2025-12-06") == 0
+
+
+def test_include_undated(batch, connection):
+    assert _rows(connection, until="2025-12-05", include_undated=True) == len(batch)
+    assert _rows(connection, until="2025-12-04", include_undated=True) == 100
+    assert _rows(connection) == len(batch)
+
+
+def test_no_matching_rows_writes_no_file(connection, tmp_path):
+    output_path = tmp_path / "out.parquet"
+    stats = sql_assignment(connection, str(output_path), banks=[99_999], detail=False)
+    assert stats["rows_in"] == stats["rows_out"] == 0
+    assert not os.path.exists(output_path)
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pytest
+
+from processing.pipeline import run_assignment
+from processing.store import CURRENT, KEEP_GENERATIONS, current_dir, read_table, write_store
+
+
+@pytest.fixture(scope="module")
+def assigned(batch, catalog):
+    return run_assignment(batch.head(2_000), catalog)
+
+
+def test_write_swaps_whole_generations(tmp_path, assigned, catalog):
+    rows, result = assigned
+    store_dir = str(tmp_path)
+    write_store(rows, result, catalog, store_dir)
+    first = current_dir(store_dir)
+    write_store(rows.head(500), {**result, **{name: result[name][:500] for name in ("probabilities", "costo_hit_miss", "costo_hit_win", "profits", "best", "best_emisora")}}, catalog, store_dir)
+
+    # A reader that resolved the store before the swap keeps reading its generation
+    assert len(read_table("assignments", store_dir=first)) == len(rows)
+    assert len(read_table("assignments", store_dir=store_dir)) == 500
+    assert len(read_table("probabilities", store_dir=store_dir)) == 500 * len(result["emisora_ids"])
+
+    for _ in range(3):
+        write_store(rows, result, catalog, store_dir)
+    generations = [name for name in os.listdir(store_dir) if name.startswith("gen-")]
+    assert len(generations) == KEEP_GENERATIONS
+    assert os.path.basename(current_dir(store_dir)) == max(generations)
+    assert sorted(os.listdir(store_dir)) == sorted(generations + [CURRENT])
+
+
+def test_store_without_generations_still_reads(tmp_path, assigned, catalog):
+    rows, result = assigned
+    write_store(rows, result, catalog, str(tmp_path))
+    # The layout of earlier stores: the tables directly in store_dir
+    for name in os.listdir(current_dir(str(tmp_path))):
+        os.replace(os.path.join(current_dir(str(tmp_path)), name), tmp_path / name)
+    os.remove(tmp_path / CURRENT)
+
+    assert len(read_table("assignments", store_dir=str(tmp_path))) == len(rows)
+
+
+def test_assignments_keep_emisoras_missing_from_catalog(tmp_path, assigned, catalog):
+    rows, result = assigned
+    missing = int(np.bincount(result["best"]).argmax())
+    em_id = result["emisora_ids"][missing]
+    partial = catalog[catalog["idEmisora"] != em_id]
+
+    write_store(rows, result, partial, str(tmp_path))
+    assignments = read_table("assignments", store_dir=str(tmp_path))
+    probabilities = read_table("probabilities", store_dir=str(tmp_path))
+
+    assert len(assignments) == len(rows)
+    lost = assignments["best_emisora"] == em_id
+    assert lost.any()
+    assert assignments.loc[lost, "NombreEmisora"].isna().all()
+    assert assignments.loc[~lost, "NombreEmisora"].notna().all()
+    assert probabilities.loc[probabilities["idEmisora"] == em_id, "NombreEmisora"].isna().all()
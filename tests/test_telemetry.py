@@ -0,0 +1,35 @@
+import tracemalloc
+
+import numpy as np
+
+from processing.telemetry import Telemetry, read_run_log
+
+
+def test_memory_tracing_is_opt_in(tmp_path):
+    log_path = str(tmp_path / "runs.jsonl")
+    telemetry = Telemetry("test", log_path=log_path)
+    with telemetry.stage("score", 10):
+        assert not tracemalloc.is_tracing()
+
+    traced = Telemetry("test", log_path=log_path, trace_memory=True)
+    with traced.stage("score", 10):
+        assert tracemalloc.is_tracing()
+    assert not tracemalloc.is_tracing()
+
+    first, second = read_run_log(log_path)
+    assert first["allocated_mb"] is None and first["rss_mb"] > 0
+    assert second["allocated_mb"] is not None
+
+
+def test_rss_delta_per_stage(tmp_path):
+    telemetry = Telemetry("test", log_path=str(tmp_path / "runs.jsonl"))
+    with telemetry.stage("allocate", 1):
+        kept = np.ones(64 * 2 ** 20 // 8)
+    with telemetry.stage("free", 1):
+        del kept
+
+    allocate, free = telemetry.records
+    # Unlike the process high-water mark, the delta shows which stage grew
+    assert allocate["rss_delta_mb"] > 48
+    assert free["rss_delta_mb"] < -48
+    assert free["rss_mb"] < allocate["rss_mb"]
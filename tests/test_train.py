@@ -0,0 +1,45 @@
+import joblib
+import numpy as np
+import pytest
+from sklearn.naive_bayes import GaussianNB
+
+from processing.preprocessing import load_preprocessing
+from processing.registry import model_files, model_path
+from processing.train import read_metadata, training_matrix, update_models
+
+
+@pytest.fixture(scope="module")
+def upload(batch):
+    # The test batch only has sent credits; unsend some so both classes appear
+    df = batch[batch["idEmisora"].isin([1, 10])].copy()
+    unsent = np.random.default_rng(0).random(len(df)) < 0.3
+    df.loc[unsent, "fechaEnvioCobro"] = None
+    return df.sample(frac=1, random_state=0)
+
+
+def test_partial_fit_updates_match_a_full_fit(tmp_path, upload):
+    halves = np.array_split(np.arange(len(upload)), 2)
+    for positions in halves:
+        summary = update_models(upload.iloc[positions], workers=1, model_dir=str(tmp_path))
+        assert summary["models"] == [1, 10]
+
+    artifact = load_preprocessing()
+    metadata = read_metadata(str(tmp_path))
+    for em_id in (1, 10):
+        X, y = training_matrix(upload[upload["idEmisora"] == em_id], artifact)
+        full = GaussianNB().fit(X, y)
+        updated = joblib.load(model_path(em_id, str(tmp_path)))
+
+        np.testing.assert_array_equal(updated.class_count_, full.class_count_)
+        np.testing.assert_allclose(updated.theta_, full.theta_, rtol=1e-9, atol=1e-9)
+        # epsilon_ is taken from the first batch only, so compare the variances without it
+        np.testing.assert_allclose(updated.var_ - updated.epsilon_, full.var_ - full.epsilon_, rtol=1e-9, atol=1e-9)
+        assert metadata[em_id]["rows"] == len(y)
+        assert metadata[em_id]["positives"] == y.sum()
+
+
+def test_new_emisora_needs_two_rows(tmp_path, upload):
+    summary = update_models(upload.head(1), workers=1, model_dir=str(tmp_path))
+
+    assert summary["models"] == [] and summary["skipped"] == [int(upload["idEmisora"].iloc[0])]
+    assert model_files(str(tmp_path)) == {}